@@ -36,24 +36,144 @@ CREATE TABLE additives (
     additives_classes TEXT,
     sources TEXT,
     last_updated TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    e_key TEXT NOT NULL DEFAULT '',
+    e_variant TEXT NOT NULL DEFAULT '',
+    content_hash TEXT NOT NULL DEFAULT '',
+    revision INTEGER NOT NULL DEFAULT 0
 );
 
+-- Tombstones for additives removed by incremental updates
+CREATE TABLE deleted_additives (
+    taxonomy_id TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- Names and descriptions per language (built with --languages)
+CREATE TABLE localized_names (
+    additive_id INTEGER NOT NULL REFERENCES additives(id),
+    lang TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    PRIMARY KEY (additive_id, lang)
+) WITHOUT ROWID;
+
+-- Additive classes (one row per additives_classes tag, e.g. 'en:stabiliser') and the category each maps to
+CREATE TABLE classes (
+    id INTEGER PRIMARY KEY,
+    tag TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL
+);
+
+-- Additive <-> class links (position: order in additives_classes)
+CREATE TABLE additive_classes (
+    additive_id INTEGER NOT NULL REFERENCES additives(id),
+    class_id INTEGER NOT NULL REFERENCES classes(id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (additive_id, class_id)
+) WITHOUT ROWID;
+
+-- Precomputed aggregates, rebuilt by every build (dashboards never scan additives);
+-- categories are the primary category (additives.category), so counts add up to the total
+CREATE TABLE risk_stats (
+    risk_level TEXT PRIMARY KEY,
+    risk_color TEXT NOT NULL,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE category_risk_stats (
+    category TEXT NOT NULL,
+    risk_level TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (category, risk_level)
+) WITHOUT ROWID;
+
+-- diet: 'vegetarian' or 'vegan'; status: 'yes', 'no', 'maybe' or ''
+CREATE TABLE diet_stats (
+    diet TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (diet, status)
+) WITHOUT ROWID;
+
+-- Merged sources, and the source each field of an additive was taken from
+CREATE TABLE sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE field_sources (
+    additive_id INTEGER NOT NULL REFERENCES additives(id),
+    field TEXT NOT NULL,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    PRIMARY KEY (additive_id, field)
+) WITHOUT ROWID;
+
+-- Word-level Aho-Corasick automaton over additive names in the built languages
+-- (not in compact exports, which ship it as a binary file instead).
+-- Words are casefolded without diacritics; state 0 is the root, and a state with
+-- an additive_id ends a full name of that additive
+CREATE TABLE synonym_words (
+    word TEXT PRIMARY KEY,
+    id INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE synonym_trie (
+    parent INTEGER NOT NULL,
+    word_id INTEGER NOT NULL,
+    state INTEGER NOT NULL,
+    fail INTEGER NOT NULL,
+    additive_id INTEGER REFERENCES additives(id),
+    PRIMARY KEY (parent, word_id)
+) WITHOUT ROWID;
+
+-- Folded spellings (lowercase alphanumerics) -> normalized E-number key
+CREATE TABLE e_number_aliases (
+    alias TEXT PRIMARY KEY,
+    e_key TEXT NOT NULL,
+    e_variant TEXT NOT NULL,
+    kind TEXT NOT NULL
+) WITHOUT ROWID;
+
 -- Indexes for better performance
 CREATE INDEX idx_e_number ON additives(e_number);
 CREATE INDEX idx_risk_level ON additives(risk_level);
 CREATE INDEX idx_category ON additives(category);
 CREATE INDEX idx_name ON additives(name);
+CREATE INDEX idx_e_key_scan ON additives(e_key, e_variant, name, risk_level, risk_color, category);
+CREATE INDEX idx_localized_lang_name ON localized_names(lang, name);
+CREATE INDEX idx_revision ON additives(revision);
+CREATE INDEX idx_additive_classes_class ON additive_classes(class_id, additive_id);
+CREATE INDEX idx_classes_category ON classes(category);
+CREATE INDEX idx_field_sources_source ON field_sources(source_id, field);
+
+-- Full-text search index (FTS5, external content over additives)
+CREATE VIRTUAL TABLE additives_fts USING fts5(
+    name, description, additives_classes, e_number,
+    content='additives', content_rowid='id',
+    prefix='2 3',
+    tokenize='unicode61 remove_diacritics 2'
+);
 
 -- Sample Queries
 selectAll:
 SELECT * FROM additives;
 
 selectByENumber:
-SELECT * FROM additives WHERE e_number = ?;
+SELECT additives.* FROM e_number_aliases
+JOIN additives ON additives.e_key = e_number_aliases.e_key
+    AND additives.e_variant = e_number_aliases.e_variant
+WHERE e_number_aliases.alias = ?
+ORDER BY additives.id
+LIMIT 1;
 
 searchByName:
-SELECT * FROM additives WHERE LOWER(name) LIKE LOWER('%' || ? || '%');
+SELECT additives.* FROM additives_fts
+JOIN additives ON additives.id = additives_fts.rowid
+WHERE additives_fts MATCH ?
+ORDER BY bm25(additives_fts, 10.0, 1.0, 2.0, 5.0)
+LIMIT ?;
 
 selectByRiskLevel:
 SELECT * FROM additives WHERE risk_level = ?;
@@ -67,11 +187,59 @@ SELECT * FROM additives WHERE vegan = 'yes';
 selectByCategory:
 SELECT * FROM additives WHERE category = ?;
 
+selectByClassCategory:
+SELECT * FROM additives WHERE id IN (
+    SELECT additive_classes.additive_id FROM classes
+    JOIN additive_classes ON additive_classes.class_id = classes.id
+    WHERE classes.category = ?
+)
+ORDER BY e_key, e_variant;
+
+selectByClass:
+SELECT additives.* FROM classes
+JOIN additive_classes ON additive_classes.class_id = classes.id
+JOIN additives ON additives.id = additive_classes.additive_id
+WHERE classes.tag = ?
+ORDER BY additives.e_key, additives.e_variant;
+
+selectClassesOfAdditive:
+SELECT classes.tag, classes.name, classes.category FROM additive_classes
+JOIN classes ON classes.id = additive_classes.class_id
+WHERE additive_classes.additive_id = ?
+ORDER BY additive_classes.position;
+
+selectChangedSince:
+SELECT * FROM additives WHERE revision > ? ORDER BY revision;
+
+selectDeletedSince:
+SELECT taxonomy_id FROM deleted_additives WHERE revision > ?;
+
+selectLocalizedName:
+SELECT name, description FROM localized_names WHERE additive_id = ? AND lang = ?;
+
+countAdditives:
+SELECT COALESCE(SUM(count), 0) FROM risk_stats;
+
 getRiskLevelStats:
-SELECT risk_level, COUNT(*) as count FROM additives GROUP BY risk_level;
+SELECT risk_level, count FROM risk_stats ORDER BY count DESC;
 
 getCategoryStats:
-SELECT category, COUNT(*) as count FROM additives GROUP BY category ORDER BY count DESC;
+SELECT category, SUM(count) AS count FROM category_risk_stats GROUP BY category ORDER BY count DESC;
+
+getCategoryRiskStats:
+SELECT risk_level, count FROM category_risk_stats WHERE category = ?;
+
+getDietStats:
+SELECT status, count FROM diet_stats WHERE diet = ?;
+
+selectById:
+SELECT * FROM additives WHERE id = ?;
+
+selectSynonymWords:
+SELECT word, id FROM synonym_words;
+
+selectSynonymTrie:
+SELECT parent, word_id, state, fail, additive_id FROM synonym_trie;
 */
 
 // Data Models
@@ -94,6 +262,12 @@ data class Additive(
     val createdAt: String?
 )
 
+data class AdditiveClass(
+    val tag: String,
+    val name: String,
+    val category: String
+)
+
 data class RiskLevelStat(
     val riskLevel: String,
     val count: Long,
@@ -146,6 +320,10 @@ class DesktopDatabaseDriverFactory : DatabaseDriverFactory {
     }
 }
 
+// Strip diacritics (NFKD, then drop combining marks); on JVM/Android:
+// Normalizer.normalize(text, Normalizer.Form.NFKD).replace(Regex("\\p{Mn}+"), "")
+expect fun foldDiacritics(text: String): String
+
 // Repository Pattern Implementation
 class AdditivesRepository(databaseDriverFactory: DatabaseDriverFactory) {
     private val database = Database(databaseDriverFactory.createDriver())
@@ -156,14 +334,16 @@ class AdditivesRepository(databaseDriverFactory: DatabaseDriverFactory) {
         return queries.selectAll().executeAsList().map { it.toAdditive() }
     }
     
-    // Search by E-number
+    // Search by E-number or name, in any spelling ("E 160a (ii)", "e160aii", "INS 330")
     fun getAdditiveByENumber(eNumber: String): Additive? {
-        return queries.selectByENumber(eNumber).executeAsOneOrNull()?.toAdditive()
+        return queries.selectByENumber(foldAlias(eNumber)).executeAsOneOrNull()?.toAdditive()
     }
     
-    // Search by name
-    fun searchAdditivesByName(query: String): List<Additive> {
-        return queries.searchByName(query).executeAsList().map { it.toAdditive() }
+    // Search by name (ranked, prefix-matched full-text search)
+    fun searchAdditivesByName(query: String, limit: Long = 20): List<Additive> {
+        val matchQuery = toFtsPrefixQuery(query)
+        if (matchQuery.isEmpty()) return emptyList()
+        return queries.searchByName(matchQuery, limit).executeAsList().map { it.toAdditive() }
     }
     
     // Filter by risk level
@@ -181,34 +361,104 @@ class AdditivesRepository(databaseDriverFactory: DatabaseDriverFactory) {
         return queries.selectVegan().executeAsList().map { it.toAdditive() }
     }
     
-    // Filter by category
+    // Filter by primary category (the category counted by getCategoryStats)
     fun getAdditivesByCategory(category: String): List<Additive> {
         return queries.selectByCategory(category).executeAsList().map { it.toAdditive() }
     }
     
+    // Additives with any class in the category (an emulsifier that is also a
+    // stabiliser is listed under both; additives without classes under none)
+    fun getAdditivesByClassCategory(category: String): List<Additive> {
+        return queries.selectByClassCategory(category).executeAsList().map { it.toAdditive() }
+    }
+    
+    // Filter by class tag, e.g. "en:stabiliser"
+    fun getAdditivesByClass(tag: String): List<Additive> {
+        return queries.selectByClass(tag).executeAsList().map { it.toAdditive() }
+    }
+    
+    // Classes of an additive, in taxonomy order
+    fun getClassesOfAdditive(additiveId: Long): List<AdditiveClass> {
+        return queries.selectClassesOfAdditive(additiveId).executeAsList().map {
+            AdditiveClass(tag = it.tag, name = it.name, category = it.category)
+        }
+    }
+    
+    // Show an additive with its name and description in the given language, if available
+    fun localize(additive: Additive, lang: String): Additive {
+        val localized = queries.selectLocalizedName(additive.id, lang).executeAsOneOrNull() ?: return additive
+        return additive.copy(name = localized.name, description = localized.description ?: additive.description)
+    }
+    
     // Get risk level statistics
     fun getRiskLevelStats(): List<RiskLevelStat> {
-        val total = queries.selectAll().executeAsList().size.toDouble()
+        val total = queries.countAdditives().executeAsOne().toDouble()
         return queries.getRiskLevelStats().executeAsList().map { 
             RiskLevelStat(
                 riskLevel = it.risk_level,
-                count = it.count_,
-                percentage = (it.count_.toDouble() / total) * 100
+                count = it.count,
+                percentage = (it.count.toDouble() / total) * 100
             )
         }
     }
     
     // Get category statistics
     fun getCategoryStats(): List<CategoryStat> {
-        val total = queries.selectAll().executeAsList().size.toDouble()
+        val total = queries.countAdditives().executeAsOne().toDouble()
         return queries.getCategoryStats().executeAsList().map {
             CategoryStat(
-                category = it.category ?: "Unknown",
-                count = it.count_,
-                percentage = (it.count_.toDouble() / total) * 100
+                category = it.category,
+                count = it.count ?: 0,
+                percentage = ((it.count ?: 0).toDouble() / total) * 100
             )
         }
     }
+    
+    // Vegetarian or vegan status counts ("yes", "no", "maybe", "")
+    fun getDietStats(diet: String): Map<String, Long> {
+        return queries.getDietStats(diet).executeAsList().associate { it.status to it.count }
+    }
+    
+    // Synonym automaton, loaded once: word ids, edges by (state, word id), and the
+    // fail link and additive of every state
+    private val synonymWords by lazy {
+        queries.selectSynonymWords().executeAsList().associate { it.word to it.id }
+    }
+    private val synonymTrie by lazy {
+        queries.selectSynonymTrie().executeAsList()
+    }
+    private val synonymEdges by lazy {
+        synonymTrie.associate { (it.parent to it.word_id) to it.state }
+    }
+    private val synonymStates by lazy {
+        synonymTrie.associate { it.state to (it.fail to it.additive_id) }
+    }
+    
+    // Additives named anywhere in an ingredient list, in one pass over its words,
+    // e.g. "Zucker, Citronensäure, Natriumbenzoat" -> E330, E211
+    fun findAdditivesInLabel(text: String): List<Additive> {
+        val additiveIds = linkedSetOf<Long>()
+        var state = 0L
+        for (word in foldWords(text)) {
+            val wordId = synonymWords[word]
+            if (wordId == null) {
+                state = 0L
+                continue
+            }
+            while (state != 0L && (state to wordId) !in synonymEdges) {
+                state = synonymStates.getValue(state).first
+            }
+            state = synonymEdges[state to wordId] ?: 0L
+            // Report the names ending here, following the fail links to shorter ones
+            var match = state
+            while (match != 0L) {
+                val (fail, additiveId) = synonymStates.getValue(match)
+                additiveId?.let { additiveIds.add(it) }
+                match = fail
+            }
+        }
+        return additiveIds.mapNotNull { queries.selectById(it).executeAsOneOrNull()?.toAdditive() }
+    }
 }
 
 // Use Cases for Business Logic
@@ -242,6 +492,53 @@ class GetVegetarianFriendlyAdditivesUseCase(private val repository: AdditivesRep
     }
 }
 
+// Delta updates: apply an additives_delta_r<base>_r<target>.sql.gz patch (written by the
+// builder with --delta-dir) instead of downloading the whole database. Every statement is
+// on its own line; the header must match the installed revision.
+class DeltaPatchApplier(private val driver: SqlDriver) {
+    fun apply(patchLines: List<String>) {
+        require(patchLines.firstOrNull() == "-- additives delta patch") { "Not an additives delta patch" }
+        val header = patchLines.drop(1)
+            .takeWhile { it.startsWith("-- ") }
+            .associate { it.removePrefix("-- ").substringBefore(": ") to it.substringAfter(": ") }
+        val installed = driver.executeQuery(null, "SELECT value FROM metadata WHERE key = 'revision'", { cursor ->
+            QueryResult.Value(if (cursor.next().value) cursor.getString(0) else "0")
+        }, 0).value
+        require(installed == header["base_revision"]) {
+            "Patch applies to revision ${header["base_revision"]}, database is at revision $installed"
+        }
+        // The script carries its own BEGIN/COMMIT; roll back if any statement fails
+        try {
+            patchLines.filter { it.isNotBlank() && !it.startsWith("--") }
+                .forEach { driver.execute(null, it.removeSuffix(";"), 0) }
+        } catch (e: Exception) {
+            driver.execute(null, "ROLLBACK", 0)
+            throw e
+        }
+    }
+}
+
+// Fold a scanned spelling into its e_number_aliases key: lowercase alphanumerics only,
+// e.g. "E 160a (ii)" -> "e160aii"
+private fun foldAlias(text: String): String {
+    return text.lowercase().filter { it.isLetterOrDigit() }
+}
+
+// Words of a label in synonym_words form: casefolded, without diacritics
+// ("Citronensäure" -> "citronensaure")
+private fun foldWords(text: String): List<String> {
+    return Regex("[\\p{L}\\p{N}_]+").findAll(text).map { foldDiacritics(it.value.lowercase()) }.toList()
+}
+
+// Build an FTS5 prefix query: quote every term and prefix-match it,
+// e.g. "tartra yell" -> "\"tartra\"* \"yell\"*"
+private fun toFtsPrefixQuery(query: String): String {
+    return query.trim()
+        .split(Regex("\\s+"))
+        .filter { it.isNotEmpty() }
+        .joinToString(" ") { "\"${it.replace("\"", "\"\"")}\"*" }
+}
+
 // Extension function to convert database model to domain model
 private fun SelectAll.toAdditive(): Additive {
     return Additive(
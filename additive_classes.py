@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Additive Classes
+
+The additives_classes field of an additive is a comma-separated list of
+Open Food Facts class tags ("en:emulsifier, en:stabiliser, en:thickener").
+It is normalized into a class dimension table (classes: one row per class tag
+with its English label and the category it maps to) and a many-to-many
+additive_classes table, so clients can look up additives by class or
+category with indexed joins instead of substring matches on the text column.
+
+Class labels come from the additives_classes taxonomy when it was fetched
+(--taxonomies additives_classes); otherwise they are derived from the tag.
+"""
+
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from additive_rules import CompiledRuleset
+
+logger = logging.getLogger(__name__)
+
+
+def parse_class_tags(additives_classes: Optional[str]) -> List[str]:
+    """Class tags of an additives_classes value, lowercased and in order ("en:Colour, en:x" -> ["en:colour", "en:x"])."""
+    tags: List[str] = []
+    for tag in str(additives_classes or "").lower().split(","):
+        tag = tag.strip()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def class_label(tag: str, labels: Optional[Dict[str, str]] = None) -> str:
+    """English label of a class: from the taxonomy labels, else derived from the tag ("en:flavour-enhancer" -> "Flavour enhancer")."""
+    if labels and tag in labels:
+        return labels[tag]
+    name = tag.split(":", 1)[-1].replace("-", " ").strip()
+    return name[:1].upper() + name[1:]
+
+
+def load_class_labels(path: Optional[str]) -> Dict[str, str]:
+    """English labels by class tag from an additives_classes taxonomy JSON file ({} if unavailable)."""
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            taxonomy = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read class labels from {path}: {e}")
+        return {}
+    return {
+        tag.lower(): entry["name"]["en"]
+        for tag, entry in taxonomy.items()
+        if isinstance(entry, dict) and isinstance(entry.get("name"), dict) and entry["name"].get("en")
+    }
+
+
+def class_category_rank(tag: str, rules: CompiledRuleset) -> Tuple[int, str]:
+    """
+    (position in the category mapping, category) of the first mapping keyword found in
+    the tag; (len(mapping), default category) if none matches.
+    """
+    for rank, (keyword, category) in enumerate(rules.category_mapping.items()):
+        if keyword in tag:
+            return rank, category
+    return len(rules.category_mapping), rules.default_category
+
+
+def build_class_rows(rows: Iterable[tuple], rules: CompiledRuleset,
+                     labels: Optional[Dict[str, str]] = None) -> Tuple[List[tuple], List[tuple]]:
+    """
+    Normalize the additives_classes column of additive rows.
+    Returns (class rows (tag, name, category) sorted by tag,
+    links (taxonomy_id, tag, position)).
+    """
+    tags = set()
+    links = []
+    for row in rows:
+        for position, tag in enumerate(parse_class_tags(row[12])):
+            tags.add(tag)
+            links.append((row[0], tag, position))
+    class_rows = [(tag, class_label(tag, labels), class_category_rank(tag, rules)[1]) for tag in sorted(tags)]
+    return class_rows, links
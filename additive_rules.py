@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Rule Set for Food Additives
+
+Risk tiers, keyword rules, categories, description and usage texts live in a
+versioned ruleset file (additive_rules.json; YAML is accepted when PyYAML is
+installed). A ruleset is compiled once into lookup structures, including its
+RiskClassifier, and the compiled form is cached as a pickle keyed by the SHA-256
+of the file (and of the compiler code), so later loads skip parsing and
+compiling. RulesetReloader serves the current ruleset to long-running
+processes and picks up file edits without a restart.
+
+Ordered tables are evaluated top to bottom and the first match wins; JSON
+object order is significant for the category mapping.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from risk_classifier import RISK_ORDER, RiskClassifier
+
+logger = logging.getLogger(__name__)
+
+RULESET_FORMAT = 1
+DEFAULT_RULESET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "additive_rules.json")
+
+# Modules whose code determines the compiled form (part of the pickle cache key)
+_COMPILER_MODULES = ("additive_rules.py", "risk_classifier.py")
+_compiler_sha256: Optional[str] = None
+
+
+class CompiledRuleset:
+    """A validated ruleset compiled into the lookup structures used by the builders."""
+
+    def __init__(self, data: Dict[str, Any], sha256: str = ""):
+        if data.get("format") != RULESET_FORMAT:
+            raise ValueError(f"Unsupported ruleset format {data.get('format')!r} (expected {RULESET_FORMAT})")
+        self.version = str(data.get("version", ""))
+        self.sha256 = sha256
+
+        try:
+            risk = data["risk"]
+            tiers = [
+                (tier["risk_level"], [e_number for group in tier["groups"] for e_number in group["e_numbers"]])
+                for tier in risk["e_number_tiers"]
+            ]
+            keyword_rules = [
+                (rule["field"], tuple(rule["keywords"]), rule["risk_level"],
+                 (rule["escalation"]["field"], tuple(rule["escalation"]["keywords"]), rule["escalation"]["risk_level"])
+                 if rule.get("escalation") else None)
+                for rule in risk["keyword_rules"]
+            ]
+            default_risk_level = risk["default_risk_level"]
+
+            categories = data["categories"]
+            self.category_mapping: Dict[str, str] = dict(categories["mapping"])
+            self.default_category: str = categories["default"]
+
+            descriptions = data["descriptions"]
+            self.function_descriptions: Dict[str, str] = dict(descriptions["function_descriptions"])
+            self.default_function_description: str = descriptions["default_function_description"]
+            self.base_function_rules: Tuple[tuple, ...] = tuple(
+                (tuple(rule["class_keywords"]),
+                 tuple((tuple(refinement["keywords"]), refinement["description"]) for refinement in rule["refinements"]),
+                 rule["fallback"])
+                for rule in descriptions["function_rules"]
+            )
+            self.risk_descriptions: Dict[str, str] = dict(descriptions["risk_descriptions"])
+
+            usage = data["usage"]
+            self.specific_usage_info: Dict[str, str] = dict(usage["by_e_number"])
+            self.name_usage_patterns: Tuple[Tuple[str, str], ...] = tuple(
+                (pattern["pattern"], pattern["usage"]) for pattern in usage["name_patterns"]
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed ruleset: missing or invalid {e}") from e
+
+        levels = [level for level, _ in tiers] + [rule[2] for rule in keyword_rules] + [default_risk_level]
+        levels += [rule[3][2] for rule in keyword_rules if rule[3]] + list(self.risk_descriptions)
+        unknown = sorted(set(levels) - set(RISK_ORDER))
+        if unknown:
+            raise ValueError(f"Unknown risk levels in ruleset: {', '.join(unknown)}")
+
+        self.classifier = RiskClassifier(tiers, keyword_rules, default_risk_level)
+
+
+def compiler_fingerprint() -> str:
+    """SHA-256 of the compiler modules, so code changes invalidate cached compiled rulesets."""
+    global _compiler_sha256
+    if _compiler_sha256 is None:
+        digest = hashlib.sha256()
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        for module_name in _COMPILER_MODULES:
+            with open(os.path.join(module_dir, module_name), "rb") as f:
+                digest.update(f.read())
+        _compiler_sha256 = digest.hexdigest()
+    return _compiler_sha256
+
+
+def parse_ruleset(content: bytes, path: str) -> Dict[str, Any]:
+    """Parse ruleset file content: YAML for .yaml/.yml files, JSON otherwise."""
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ValueError(f"PyYAML is required to read {path}") from e
+        try:
+            return yaml.safe_load(content)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML in {path}: {e}") from e
+    return json.loads(content)
+
+
+def cache_path(path: str, cache_key: str) -> str:
+    """Pickle cache location for a ruleset file: __pycache__ next to the file."""
+    directory = os.path.join(os.path.dirname(os.path.abspath(path)), "__pycache__")
+    return os.path.join(directory, f"{os.path.basename(path)}.{cache_key[:16]}.pickle")
+
+
+def load_ruleset(path: str = DEFAULT_RULESET_PATH, use_cache: bool = True) -> CompiledRuleset:
+    """
+    Load and compile a ruleset file.
+    The compiled ruleset is cached as a pickle keyed by the file and compiler
+    hashes; cache misses and unreadable caches fall back to compiling the file.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    sha256 = hashlib.sha256(content).hexdigest()
+    cache_key = hashlib.sha256((sha256 + compiler_fingerprint()).encode("ascii")).hexdigest()
+    cached = cache_path(path, cache_key)
+
+    if use_cache and os.path.exists(cached):
+        try:
+            with open(cached, "rb") as f:
+                ruleset = pickle.load(f)
+            if isinstance(ruleset, CompiledRuleset) and ruleset.sha256 == sha256:
+                return ruleset
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable ruleset cache {cached}: {e}")
+
+    ruleset = CompiledRuleset(parse_ruleset(content, path), sha256)
+
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            handle, temporary = tempfile.mkstemp(dir=os.path.dirname(cached), suffix=".tmp")
+            with os.fdopen(handle, "wb") as f:
+                pickle.dump(ruleset, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, cached)
+        except OSError as e:
+            logger.debug(f"Could not cache compiled ruleset at {cached}: {e}")
+
+    return ruleset
+
+
+_default_ruleset: Optional[CompiledRuleset] = None
+
+
+def default_ruleset() -> CompiledRuleset:
+    """The compiled default ruleset (additive_rules.json), loaded on first use."""
+    global _default_ruleset
+    if _default_ruleset is None:
+        _default_ruleset = load_ruleset(DEFAULT_RULESET_PATH)
+    return _default_ruleset
+
+
+class RulesetReloader:
+    """
+    Serves the compiled ruleset of a file and reloads it when the file changes.
+    The file is checked at most every check_interval seconds; a ruleset that fails
+    to load is logged and the previous one stays in service.
+    """
+
+    def __init__(self, path: str = DEFAULT_RULESET_PATH, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stat = self._file_stat()
+        self._checked_at = time.monotonic()
+        self.ruleset = load_ruleset(path)
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self) -> CompiledRuleset:
+        """The current ruleset, reloading first if the file changed."""
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload_if_changed()
+        return self.ruleset
+
+    def reload_if_changed(self) -> bool:
+        """Reload the ruleset if the file changed; returns True if a new ruleset was swapped in."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stat = self._file_stat()
+            if stat == self._stat:
+                return False
+            self._stat = stat
+
+            try:
+                ruleset = load_ruleset(self.path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Keeping ruleset {self.ruleset.version}: could not reload {self.path}: {e}")
+                return False
+
+            if ruleset.sha256 == self.ruleset.sha256:
+                return False
+            logger.info(f"Reloaded ruleset {self.path}: version {self.ruleset.version} -> {ruleset.version}")
+            self.ruleset = ruleset
+            return True
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Additive Sources and Merging
+
+Additive records come from several sources: the Open Food Facts taxonomy, the
+manually curated list (built in, or a CSV file), and EFSA or Codex (JECFA/INS)
+exports saved as local CSV or JSON files. Each source is an adapter with a
+name and a load() method yielding additive records (the dicts of
+process_openfoodfacts_data).
+
+merge_sources() folds the records of all sources into one record per
+normalized E-number (e_key, e_variant). Records are matched through a dict
+keyed on the E-number, so merging is linear in the number of records whatever
+the number of sources. Each field is taken from the highest-priority source
+that has a value for it: sources listed for the field in the field priorities
+first, then the others in source order. The chosen source of every field is
+kept in the record's field_sources, for the sources provenance tables.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from e_numbers import additive_e_key, fold_alias, normalize_e_number
+
+logger = logging.getLogger(__name__)
+
+OPENFOODFACTS_SOURCE = "Open Food Facts"
+MANUAL_SOURCE = "Manual"
+
+# Source kinds accepted by open_source: kind -> (source name, taxonomy id prefix)
+SOURCE_KINDS = {
+    "manual": (MANUAL_SOURCE, "manual"),
+    "efsa": ("EFSA", "efsa"),
+    "codex": ("Codex", "codex"),
+}
+
+# Fields merged across sources, in row order
+MERGED_FIELDS = (
+    "taxonomy_id", "e_number", "name", "vegetarian", "vegan", "efsa_evaluation",
+    "efsa_url", "efsa_date", "additives_classes", "localized_names",
+)
+
+# Sources preferred for a field over the source order
+DEFAULT_FIELD_PRIORITIES: Dict[str, Tuple[str, ...]] = {
+    "efsa_evaluation": ("EFSA",),
+    "efsa_url": ("EFSA",),
+    "efsa_date": ("EFSA",),
+}
+
+# Column names of CSV/JSON exports (folded with fold_alias) -> record field
+FIELD_ALIASES = {
+    "taxonomyid": "taxonomy_id",
+    "enumber": "e_number", "e": "e_number", "ins": "e_number", "insnumber": "e_number",
+    "insno": "e_number", "code": "e_number",
+    "name": "name", "additive": "name", "substance": "name", "additivename": "name",
+    "vegetarian": "vegetarian",
+    "vegan": "vegan",
+    "efsaevaluation": "efsa_evaluation", "evaluation": "efsa_evaluation", "opinion": "efsa_evaluation",
+    "efsaurl": "efsa_url", "url": "efsa_url", "link": "efsa_url",
+    "efsadate": "efsa_date", "date": "efsa_date", "evaluationdate": "efsa_date",
+    "additivesclasses": "additives_classes", "classes": "additives_classes",
+    "functionalclass": "additives_classes", "functionalclasses": "additives_classes",
+    "technologicalpurpose": "additives_classes",
+}
+
+
+class SourceAdapter(ABC):
+    """A source of additive records. Subclasses implement load()."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    def load(self) -> Iterable[Dict[str, Any]]:
+        """Additive records of this source."""
+
+    def fingerprint(self) -> Optional[str]:
+        """SHA-256 of the source's input file, for the build cache (None for built-in data)."""
+        return None
+
+
+class RecordsSource(SourceAdapter):
+    """Records already in memory: the processed OFF taxonomy or the built-in manual list."""
+
+    def __init__(self, name: str, records: Iterable[Dict[str, Any]]):
+        super().__init__(name)
+        self.records = records
+
+    def load(self) -> Iterable[Dict[str, Any]]:
+        return self.records
+
+
+class FileSource(SourceAdapter):
+    """
+    A local CSV (comma, semicolon or tab separated) or JSON export. JSON is a list of
+    objects or an object of objects by id. Columns are matched through FIELD_ALIASES;
+    records without a parsable E-number are skipped.
+    """
+
+    def __init__(self, name: str, path: str, id_prefix: str):
+        super().__init__(name)
+        self.path = path
+        self.id_prefix = id_prefix
+
+    def read_entries(self) -> Iterator[Dict[str, Any]]:
+        """Raw entries of the file, by original column name."""
+        if self.path.lower().endswith(".json"):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entries = data.values() if isinstance(data, dict) else data
+            yield from (entry for entry in entries if isinstance(entry, dict))
+            return
+        with open(self.path, "r", encoding="utf-8-sig", newline="") as f:
+            header = f.readline()
+            delimiter = max("\t;,", key=header.count)
+            f.seek(0)
+            yield from csv.DictReader(f, delimiter=delimiter)
+
+    def load(self) -> Iterator[Dict[str, Any]]:
+        skipped = 0
+        for entry in self.read_entries():
+            record = {}
+            for column, value in entry.items():
+                field = FIELD_ALIASES.get(fold_alias(column or ""))
+                if field and field not in record and value not in (None, ""):
+                    record[field] = str(value).strip()
+            key = normalize_e_number(record.get("e_number", ""))
+            if not key:
+                skipped += 1
+                continue
+            record.setdefault("taxonomy_id", f"{self.id_prefix}_e{key[0]}{key[1]}".lower())
+            record.setdefault("name", "")
+            record["source"] = self.name
+            yield record
+        if skipped:
+            logger.warning(f"{self.path}: skipped {skipped} entries without an E-number")
+
+    def fingerprint(self) -> Optional[str]:
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+def open_source(spec: str) -> FileSource:
+    """Source of a KIND=PATH specification, e.g. "efsa=efsa_opinions.csv" (kinds: SOURCE_KINDS)."""
+    kind, _, path = spec.partition("=")
+    kind = kind.strip().lower()
+    if kind not in SOURCE_KINDS or not path:
+        raise ValueError(f"Invalid source {spec!r}: expected KIND=PATH with KIND one of {', '.join(SOURCE_KINDS)}")
+    name, id_prefix = SOURCE_KINDS[kind]
+    return FileSource(name, path, id_prefix)
+
+
+def merge_sources(sources: Sequence[SourceAdapter],
+                  field_priorities: Optional[Mapping[str, Sequence[str]]] = None) -> List[Dict[str, Any]]:
+    """
+    Merge the records of sources into one record per normalized E-number, in order of
+    first appearance. A merged record's field_sources maps each non-empty field to the
+    source it was taken from, and its source lists those sources in source order.
+    """
+    if field_priorities is None:
+        field_priorities = DEFAULT_FIELD_PRIORITIES
+
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    # Priority rank of the source each field was taken from (lower wins)
+    ranks: Dict[Tuple[str, str], Dict[str, int]] = {}
+    total = 0
+
+    for order, source in enumerate(sources):
+        field_ranks = {}
+        for field in MERGED_FIELDS:
+            preferred = list(field_priorities.get(field, ()))
+            field_ranks[field] = preferred.index(source.name) if source.name in preferred else len(preferred) + order
+
+        for record in source.load():
+            total += 1
+            key = additive_e_key(record)
+            target = merged.get(key)
+            if target is None:
+                target = merged[key] = dict(record)
+                target["field_sources"] = {field: source.name for field in MERGED_FIELDS if record.get(field)}
+                ranks[key] = {field: field_ranks[field] for field in target["field_sources"]}
+                continue
+
+            # Same E-number seen before: take the fields this source ranks higher for
+            target_ranks = ranks[key]
+            for field in MERGED_FIELDS:
+                if record.get(field) and (field not in target_ranks or field_ranks[field] < target_ranks[field]):
+                    target[field] = record[field]
+                    target["field_sources"][field] = source.name
+                    target_ranks[field] = field_ranks[field]
+
+    source_order = {source.name: order for order, source in reversed(list(enumerate(sources)))}
+    for record in merged.values():
+        record["source"] = ", ".join(sorted(set(record["field_sources"].values()), key=source_order.get))
+
+    logger.info(f"Merged {total} records from {len(sources)} sources into {len(merged)} additives "
+                f"({total - len(merged)} duplicates)")
+    return list(merged.values())
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Food Additives Database Build and Client Queries
+
+Measures each stage of a database build (parse, process, classify, describe,
+insert, validate, stats: wall/CPU time, peak RSS and rows/sec, see
+build_metrics) on the bundled Open Food Facts taxonomy and on
+synthetic taxonomies scaled up from it, then times every query from
+sample_queries.sql and the KMP .sq queries in KMP_Integration_Example.kt
+against the built database. Results are written as JSON so runs of different
+versions can be compared.
+
+--check-imports only checks module import times.
+
+Synthetic taxonomies repeat every en:e* entry of the source with a new, valid
+E-number key and a numbered English name, so row and alias counts scale with
+the factor while classification and validation follow the real entries. Use --stream for large factors to keep parsing memory bounded.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import logging
+import os
+import platform
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from build_metrics import BuildMetrics
+from create_additives_sqlite import AdditivesSQLiteCreator
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_QUERIES_PATH = os.path.join(MODULE_DIR, "sample_queries.sql")
+KMP_EXAMPLE_PATH = os.path.join(MODULE_DIR, "KMP_Integration_Example.kt")
+
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_QUERY_REPEAT = 20
+
+# Modules imported by CLIs, workers and serverless functions: they must import quickly,
+# without heavy optional dependencies and without touching the working directory
+IMPORT_CHECKED_MODULES = ("create_additives_sqlite", "additive_rules", "risk_classifier", "label_scan",
+                          "product_scoring", "lookup_service")
+HEAVY_MODULES = ("requests", "pandas", "numpy")
+DEFAULT_IMPORT_BUDGET_MS = 75.0
+DEFAULT_IMPORT_REPEAT = 5
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+# Bound values for parameterized queries, by sample query number or .sq label
+SAMPLE_QUERY_PARAMETERS: Dict[str, tuple] = {
+    "7": ("e330",),
+    "9": ("en:e420i",),
+    "13": ('"tartra"*',),
+    "14": ("colour",),
+    "15": ("de",),
+    "16": ("de", "E10", "E10"),
+    "17": (0,),
+    "18": (0,),
+    "19": ("Stabilizers",),
+}
+KMP_QUERY_PARAMETERS: Dict[str, tuple] = {
+    "selectByENumber": ("e330",),
+    "searchByName": ('"sweet"*', 20),
+    "selectByRiskLevel": ("RED",),
+    "selectByCategory": ("Food Colors",),
+    "selectByClassCategory": ("Stabilizers",),
+    "selectByClass": ("en:stabiliser",),
+    "selectClassesOfAdditive": (1,),
+    "selectChangedSince": (0,),
+    "selectDeletedSince": (0,),
+    "selectLocalizedName": (1, "de"),
+    "getCategoryRiskStats": ("Other",),
+    "getDietStats": ("vegan",),
+    "selectById": (1,),
+}
+
+_SAMPLE_QUERY_HEADER = re.compile(r"^-- (\d+)\. (.*)$", re.MULTILINE)
+_KMP_QUERY = re.compile(r"^(\w+):\n(.*?;)", re.MULTILINE | re.DOTALL)
+
+
+def default_source() -> Optional[str]:
+    """The newest bundled openfoodfacts_raw_*.json taxonomy, if any."""
+    candidates = sorted(glob.glob(os.path.join(MODULE_DIR, "openfoodfacts_raw_*.json")))
+    return candidates[-1] if candidates else None
+
+
+# Synthetic E-number keys: unused 4-digit numbers (real ones end at 1521), each with
+# every letter sub-class and roman-numeral variant normalize_e_number accepts
+SYNTHETIC_E_DIGITS = range(2000, 10000)
+SYNTHETIC_E_LETTERS = ("", "a", "b", "c", "d", "e", "f", "g", "h", "j")
+SYNTHETIC_E_VARIANTS = ("", "i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x")
+
+
+def synthetic_e_number(index: int) -> str:
+    """The index-th synthetic E-number body, e.g. 0 -> "2000", 12 -> "2000ai"."""
+    per_number = len(SYNTHETIC_E_LETTERS) * len(SYNTHETIC_E_VARIANTS)
+    if index >= len(SYNTHETIC_E_DIGITS) * per_number:
+        raise ValueError(f"Too many synthetic copies: {index + 1}")
+    digits, rest = divmod(index, per_number)
+    letter, variant = divmod(rest, len(SYNTHETIC_E_VARIANTS))
+    return f"{SYNTHETIC_E_DIGITS[digits]}{SYNTHETIC_E_LETTERS[letter]}{SYNTHETIC_E_VARIANTS[variant]}"
+
+
+def write_synthetic_taxonomy(source: str, scale: int, output_path: str) -> int:
+    """
+    Write a taxonomy with every en:e* entry of source repeated scale times.
+    Copies get a valid, distinct synthetic taxonomy key ("en:e2000", "en:e2000ai", ...),
+    which is their normalized E-number, so merging keeps them apart, and a numbered
+    English name. They keep the original e_number, so they are classified, described
+    and validated like the entry they copy.
+    Returns the number of en:e* entries written.
+    """
+    with open(source, "r", encoding="utf-8") as f:
+        taxonomy = json.load(f)
+    entries = [(key, value) for key, value in taxonomy.items() if key.startswith("en:e")]
+
+    count = 0
+    copies = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for copy in range(scale):
+            for key, value in entries:
+                if copy:
+                    names = dict(value.get("name", {}))
+                    names["en"] = f"{names.get('en', key)} {copy + 1}"
+                    key, value = f"en:e{synthetic_e_number(copies)}", dict(value, name=names)
+                    copies += 1
+                f.write("," if count else "")
+                f.write(f"{json.dumps(key)}:{json.dumps(value, ensure_ascii=False)}")
+                count += 1
+        f.write("}")
+    return count
+
+
+def time_build_stages(source: str, db_path: str, streaming: bool = False,
+                      trace_memory: bool = False) -> Dict[str, Any]:
+    """
+    Build db_path from source stage by stage and measure each stage (see BuildMetrics).
+    Rows are built between the describe and insert stages (unmeasured), so insert
+    measures the database load only.
+    """
+    metrics = BuildMetrics(trace_memory=trace_memory)
+    creator = AdditivesSQLiteCreator(db_path, streaming=streaming, metrics=metrics)
+    stage = metrics.stage
+    metrics.start()
+
+    with stage("parse"):
+        if streaming:
+            raw_data = list(creator.stream_openfoodfacts_data(source))
+        else:
+            with open(source, "r", encoding="utf-8") as f:
+                raw_data = json.load(f)
+
+    with stage("process") as process_stage:
+        additives = creator.merge_additive_sources(creator.process_openfoodfacts_data(raw_data))
+        process_stage.rows = len(additives)
+    del raw_data
+
+    with stage("classify") as classify_stage:
+        classified = [
+            (creator.classify_risk_level(additive)[0], creator.get_additive_category(additive))
+            for additive in additives
+        ]
+        classify_stage.rows = len(additives)
+
+    creator.description_template.cache_clear()
+    with stage("describe") as describe_stage:
+        for additive, (risk_level, category) in zip(additives, classified):
+            creator.create_detailed_description(additive, risk_level, category)
+        describe_stage.rows = len(additives)
+    cache = creator.description_template.cache_info()
+
+    rows = creator.build_rows(additives)
+    with stage("insert") as insert_stage:
+        creator.create_database_schema()
+        creator.insert_additives_data(additives, rows)
+        insert_stage.rows = len(rows)
+
+    with stage("validate"):
+        creator.validate_database()
+
+    # generate_statistics prints its report; keep the benchmark output clean
+    with stage("stats"), contextlib.redirect_stdout(io.StringIO()):
+        creator.generate_statistics()
+    metrics.finish(True)
+
+    return {
+        "additives": len(additives),
+        "rows": len(rows),
+        "db_bytes": os.path.getsize(db_path),
+        **metrics.to_dict(),
+        "description_templates": {"hits": cache.hits, "misses": cache.misses},
+    }
+
+
+def load_sample_queries(path: str = SAMPLE_QUERIES_PATH) -> List[Tuple[str, str]]:
+    """(label, sql) for every numbered query in sample_queries.sql."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    headers = list(_SAMPLE_QUERY_HEADER.finditer(text))
+    queries = []
+    for header, following in zip(headers, headers[1:] + [None]):
+        block = text[header.end():following.start() if following else len(text)]
+        sql = block[:block.rfind(";") + 1].strip()
+        if sql:
+            queries.append((header.group(1), sql))
+    return queries
+
+
+def load_kmp_queries(path: str = KMP_EXAMPLE_PATH) -> List[Tuple[str, str]]:
+    """(label, sql) for every labeled .sq query in the schema comment of the KMP example."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    start = text.index("-- Sample Queries")
+    section = text[start:text.index("*/", start)]
+    return [(label, sql.strip()) for label, sql in _KMP_QUERY.findall(section)]
+
+
+def time_queries(db_path: str, queries: List[Tuple[str, str]], parameters: Dict[str, tuple],
+                 repeat: int = DEFAULT_QUERY_REPEAT) -> List[Dict[str, Any]]:
+    """Run each query repeat times on a read-only connection; timings are in milliseconds."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    results = []
+    try:
+        for label, sql in queries:
+            result: Dict[str, Any] = {"query": label}
+            try:
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    rows = conn.execute(sql, parameters.get(label, ())).fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+                result.update({
+                    "rows": len(rows),
+                    "min_ms": round(min(timings), 4),
+                    "median_ms": round(statistics.median(timings), 4),
+                    "mean_ms": round(statistics.mean(timings), 4),
+                })
+            except sqlite3.Error as e:
+                result["error"] = str(e)
+            results.append(result)
+    finally:
+        conn.close()
+    return results
+
+
+def time_imports(modules: Tuple[str, ...] = IMPORT_CHECKED_MODULES, budget_ms: float = DEFAULT_IMPORT_BUDGET_MS,
+                 repeat: int = DEFAULT_IMPORT_REPEAT) -> List[Dict[str, Any]]:
+    """
+    Time a cold import of each module in fresh interpreters (best of repeat) and check
+    it against budget_ms. Also reports heavy modules pulled in and files created in
+    the working directory by the import.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [MODULE_DIR, os.environ.get("PYTHONPATH")])))
+    results = []
+    for module in modules:
+        timings, heavy, created = [], set(), set()
+        with tempfile.TemporaryDirectory(prefix="additives_import_") as cwd:
+            for _ in range(repeat):
+                output = subprocess.run(
+                    [sys.executable, "-c", _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                    cwd=cwd, env=env, capture_output=True, text=True, check=True
+                ).stdout
+                probe = json.loads(output.strip().splitlines()[-1])
+                timings.append(probe["ms"])
+                heavy.update(probe["heavy"])
+            created.update(os.listdir(cwd))
+        results.append({
+            "module": module,
+            "min_ms": round(min(timings), 2),
+            "median_ms": round(statistics.median(timings), 2),
+            "budget_ms": budget_ms,
+            "heavy_modules": sorted(heavy),
+            "created_files": sorted(created),
+            "ok": min(timings) <= budget_ms and not heavy and not created,
+        })
+    return results
+
+
+def run_benchmarks(source: str, scales: List[int], workdir: str, query_repeat: int = DEFAULT_QUERY_REPEAT,
+                   streaming: bool = False, trace_memory: bool = False) -> Dict[str, Any]:
+    """Benchmark the build and the queries at every scale; returns the JSON-ready report."""
+    sample_queries = load_sample_queries()
+    kmp_queries = load_kmp_queries()
+
+    runs = []
+    for scale in scales:
+        taxonomy = source
+        if scale != 1:
+            taxonomy = os.path.join(workdir, f"taxonomy_x{scale}.json")
+            write_synthetic_taxonomy(source, scale, taxonomy)
+
+        db_path = os.path.join(workdir, f"additives_x{scale}.db")
+        run = {"scale": scale, **time_build_stages(taxonomy, db_path, streaming, trace_memory)}
+        run["queries"] = {
+            "sample_queries": time_queries(db_path, sample_queries, SAMPLE_QUERY_PARAMETERS, query_repeat),
+            "kmp": time_queries(db_path, kmp_queries, KMP_QUERY_PARAMETERS, query_repeat),
+        }
+        runs.append(run)
+
+        for path in (db_path, taxonomy if taxonomy != source else None):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    return {
+        "created": datetime.now().isoformat(),
+        "imports": time_imports(),
+        "builder_sha256": AdditivesSQLiteCreator(os.path.join(workdir, "unused.db")).builder_fingerprint(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "source": os.path.basename(source),
+        "streaming": streaming,
+        "query_repeat": query_repeat,
+        "runs": runs,
+    }
+
+
+def main():
+    """Run the benchmarks and write the JSON report."""
+    parser = argparse.ArgumentParser(description="Benchmark the additives database build and client queries")
+    parser.add_argument("--source", metavar="PATH", default=default_source(),
+                        help="Taxonomy JSON to build from (default: newest bundled openfoodfacts_raw_*.json)")
+    parser.add_argument("--scales", default=",".join(str(scale) for scale in DEFAULT_SCALES),
+                        help="Comma-separated taxonomy scale factors, e.g. 1,10,100,1000 (default: 1,10,100)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_QUERY_REPEAT,
+                        help=f"Runs per query (default: {DEFAULT_QUERY_REPEAT})")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse taxonomies incrementally (bounded memory for large scales)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record the peak Python allocations of each stage with tracemalloc")
+    parser.add_argument("--output", metavar="PATH",
+                        help="Write the JSON report to PATH instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Keep the builder's log output")
+    parser.add_argument("--check-imports", action="store_true",
+                        help="Only check module import times against the budget; exit 1 if any fails")
+    parser.add_argument("--import-budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                        help=f"Import time budget per module for --check-imports (default: {DEFAULT_IMPORT_BUDGET_MS:g})")
+    args = parser.parse_args()
+
+    if args.check_imports:
+        results = time_imports(budget_ms=args.import_budget_ms)
+        print(json.dumps(results, indent=2))
+        for result in results:
+            if not result["ok"]:
+                print(f"Import check failed for {result['module']}: {result['min_ms']} ms, "
+                      f"heavy modules {result['heavy_modules']}, created files {result['created_files']}",
+                      file=sys.stderr)
+        sys.exit(0 if all(result["ok"] for result in results) else 1)
+
+    if not args.source:
+        parser.error("no bundled openfoodfacts_raw_*.json found; pass --source")
+
+    scales = [int(scale) for scale in args.scales.split(",") if scale.strip()]
+    if not scales or min(scales) < 1:
+        parser.error("scales must be positive integers")
+
+    # The JSON report goes to stdout, log output to stderr
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with tempfile.TemporaryDirectory(prefix="additives_bench_") as workdir:
+        report = run_benchmarks(args.source, scales, workdir, args.repeat, args.stream, args.trace_memory)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Build Metrics for the Food Additives Database
+
+BuildMetrics records, for each stage of a build, the wall and CPU time, the
+process peak RSS when the stage ended, and rows/sec for stages that report a
+row count. With trace_memory, the tracemalloc peak of each stage is recorded
+too, and with profile, the whole build runs under cProfile.
+
+Metrics can be written as JSON or as a Prometheus textfile (for the
+node_exporter textfile collector). Anything with the same stage(), start()
+and finish() methods can be passed to AdditivesSQLiteCreator instead, to
+forward stages to another metrics system.
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROMETHEUS_PREFIX = "additives_build"
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far, in bytes (None where unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMetrics:
+    """Measurements of one build stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss_bytes: Optional[int] = None
+        self.traced_peak_bytes: Optional[int] = None
+        self.rows: Optional[int] = None
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        if self.rows is None or not self.wall_seconds:
+            return None
+        return self.rows / self.wall_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "peak_rss_bytes": self.peak_rss_bytes,
+        }
+        if self.traced_peak_bytes is not None:
+            result["traced_peak_bytes"] = self.traced_peak_bytes
+        if self.rows is not None:
+            result["rows"] = self.rows
+            result["rows_per_second"] = round(self.rows_per_second or 0.0, 1)
+        return result
+
+
+class BuildMetrics:
+    """Per-stage timings and resource usage of a database build."""
+
+    def __init__(self, profile: bool = False, trace_memory: bool = False):
+        self.stages: Dict[str, StageMetrics] = {}
+        self.success: Optional[bool] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.profiler = cProfile.Profile() if profile else None
+        self.trace_memory = trace_memory
+
+    def start(self):
+        """Mark the start of the build (and start profiling/tracing if enabled)."""
+        self.started_at = time.time()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profiler:
+            self.profiler.enable()
+
+    def finish(self, success: bool):
+        """Mark the end of the build."""
+        if self.profiler:
+            self.profiler.disable()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.finished_at = time.time()
+        self.success = success
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[StageMetrics]:
+        """
+        Measure the block as stage name. The block can set .rows on the yielded
+        StageMetrics to get rows/sec. A stage entered again accumulates.
+        """
+        metrics = self.stages.setdefault(name, StageMetrics(name))
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield metrics
+        finally:
+            metrics.wall_seconds += time.perf_counter() - wall_start
+            metrics.cpu_seconds += time.process_time() - cpu_start
+            metrics.peak_rss_bytes = peak_rss_bytes()
+            if tracing:
+                traced_peak = tracemalloc.get_traced_memory()[1]
+                metrics.traced_peak_bytes = max(metrics.traced_peak_bytes or 0, traced_peak)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """All metrics as a JSON-ready dict."""
+        return {
+            "success": self.success,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wall_seconds": round(sum(stage.wall_seconds for stage in self.stages.values()), 6),
+            "cpu_seconds": round(sum(stage.cpu_seconds for stage in self.stages.values()), 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+        }
+
+    def prometheus_lines(self) -> List[str]:
+        """Metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def metric(name: str, help_text: str, samples: List[tuple]):
+            samples = [(labels, value) for labels, value in samples if value is not None]
+            if not samples:
+                return
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+            for labels, value in samples:
+                label_text = "{" + ",".join(f'{key}="{val}"' for key, val in labels.items()) + "}" if labels else ""
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{label_text} {float(value)!r}")
+
+        stages = list(self.stages.values())
+        metric("stage_wall_seconds", "Wall time of each build stage.",
+               [({"stage": stage.name}, stage.wall_seconds) for stage in stages])
+        metric("stage_cpu_seconds", "CPU time of each build stage.",
+               [({"stage": stage.name}, stage.cpu_seconds) for stage in stages])
+        metric("stage_peak_rss_bytes", "Process peak RSS at the end of each build stage.",
+               [({"stage": stage.name}, stage.peak_rss_bytes) for stage in stages])
+        metric("stage_traced_peak_bytes", "Peak Python allocations (tracemalloc) during each build stage.",
+               [({"stage": stage.name}, stage.traced_peak_bytes) for stage in stages])
+        metric("stage_rows", "Rows processed by each build stage.",
+               [({"stage": stage.name}, stage.rows) for stage in stages])
+        metric("stage_rows_per_second", "Throughput of each build stage.",
+               [({"stage": stage.name}, stage.rows_per_second) for stage in stages])
+        metric("peak_rss_bytes", "Process peak RSS of the build.", [({}, peak_rss_bytes())])
+        metric("success", "1 if the last build succeeded, 0 if it failed.",
+               [({}, None if self.success is None else int(self.success))])
+        metric("last_run_timestamp_seconds", "Unix time the last build finished.", [({}, self.finished_at)])
+        return lines
+
+    def write_json(self, path: str):
+        """Write the metrics as JSON."""
+        write_atomically(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def write_prometheus(self, path: str):
+        """Write the metrics as a Prometheus textfile (replaced atomically, as the collector expects)."""
+        write_atomically(path, "\n".join(self.prometheus_lines()) + "\n")
+
+    def write_profile(self, path: str):
+        """Write the cProfile stats of the build (readable with pstats or snakeviz)."""
+        if self.profiler:
+            self.profiler.dump_stats(path)
+
+
+def write_atomically(path: str, content: str):
+    """Write a text file through a temporary file and rename, so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8") as f:
+            f.write(content)
+        # mkstemp files are private; metrics are read by other users (e.g. node_exporter)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Columnar (pandas/NumPy) Build Mode for the Food Additives Database
+
+Computes risk level, category and description for all processed additives at
+once with vectorized string operations and np.select, evaluating the same rule
+tables as the row-by-row builder. Produces row tuples in the column order used
+by AdditivesSQLiteCreator.insert_additives_data.
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from additive_rules import CompiledRuleset, default_ruleset
+from e_numbers import additive_e_key
+from risk_classifier import RISK_COLORS, RiskClassifier
+
+TEXT_COLUMNS = (
+    "taxonomy_id", "e_number", "name", "vegetarian", "vegan", "efsa_evaluation",
+    "efsa_url", "efsa_date", "additives_classes", "source", "last_updated"
+)
+
+
+class TextColumn:
+    """
+    A text column factorized once into codes and unique values.
+    Substring tests run over the unique values only and are broadcast back to
+    rows through the codes, so repeated values (class lists, flags) cost nothing.
+    """
+
+    def __init__(self, series: pd.Series, lower: bool = False):
+        self.codes, uniques = pd.factorize(series, sort=False)
+        self.uniques = [str(value).lower() if lower else str(value) for value in uniques]
+
+    def map(self, func: Callable[[str], Any], dtype: Any = object) -> np.ndarray:
+        """Apply func to each unique value and broadcast the results to rows."""
+        values = np.fromiter((func(value) for value in self.uniques), dtype=dtype, count=len(self.uniques))
+        return values[self.codes]
+
+    def contains_any(self, keywords: Iterable[str]) -> np.ndarray:
+        """True where any keyword occurs in the row value."""
+        pattern = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+        return self.map(lambda value: pattern.search(value) is not None, dtype=bool)
+
+    def equals(self, text: str) -> np.ndarray:
+        """True where the row value equals text."""
+        return self.map(lambda value: value == text, dtype=bool)
+
+
+def select(conditions: List[np.ndarray], choices: List[Any], default: Any, length: int) -> np.ndarray:
+    """
+    First-match selection over string choices.
+    np.select runs on choice indices; scalar choices are then gathered from a
+    small lookup table and per-row (Series/array) choices are filled in by mask.
+    """
+    per_row = (pd.Series, np.ndarray)
+    table = np.empty(len(choices) + 1, dtype=object)
+    for i, choice in enumerate(choices):
+        table[i] = None if isinstance(choice, per_row) else choice
+    table[len(choices)] = default
+
+    if conditions:
+        index = np.select(conditions, list(range(len(choices))), default=len(choices))
+    else:
+        index = np.full(length, len(choices))
+    result = table[index]
+
+    for i, choice in enumerate(choices):
+        if isinstance(choice, per_row):
+            mask = index == i
+            result[mask] = np.asarray(choice, dtype=object)[mask]
+    return result
+
+
+def load_additives_frame(additives_list: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Load processed additive records into a DataFrame of text columns."""
+    df = pd.DataFrame.from_records(additives_list, columns=list(TEXT_COLUMNS))
+    df["taxonomy_id"] = df["taxonomy_id"].fillna("manual_" + df["e_number"].astype(str))
+    df["last_updated"] = df["last_updated"].fillna(datetime.now().isoformat())
+    # Plain object columns: cheaper than the pandas string dtype for concatenation and compares
+    return df.fillna("").astype(str).astype(object)
+
+
+def classify_frame(df: pd.DataFrame, classifier: RiskClassifier) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized RiskClassifier: returns (risk_level, risk_color) arrays."""
+    length = len(df)
+    fields = {field: TextColumn(df[field], lower=True) for field in classifier.matchers}
+
+    # Exact E-number matches take precedence over keyword rules
+    exact = TextColumn(df["e_number"]).map(
+        lambda value: classifier.e_number_risks.get(classifier.e_number_lookup_key(value)))
+    conditions = [exact != None]  # noqa: E711 (elementwise comparison)
+    choices: List[Any] = [exact]
+
+    for field, keywords, risk_level, escalation in classifier.rules:
+        hit = fields[field].contains_any(keywords)
+        if escalation:
+            escalation_field, escalation_keywords, escalation_level = escalation
+            conditions.append(hit & fields[escalation_field].contains_any(escalation_keywords))
+            choices.append(escalation_level)
+        conditions.append(hit)
+        choices.append(risk_level)
+
+    risk_level = select(conditions, choices, classifier.default_risk_level, length)
+    risk_color = pd.Series(risk_level).map(RISK_COLORS).to_numpy(dtype=object)
+    return risk_level, risk_color
+
+
+def categorize_frame(df: pd.DataFrame, rules: CompiledRuleset) -> np.ndarray:
+    """Vectorized get_additive_category."""
+    classes = TextColumn(df["additives_classes"], lower=True)
+    conditions = [classes.contains_any((keyword,)) for keyword in rules.category_mapping]
+    return select(conditions, list(rules.category_mapping.values()), rules.default_category, len(df))
+
+
+def describe_frame(df: pd.DataFrame, risk_level: np.ndarray, category: np.ndarray,
+                   rules: CompiledRuleset) -> np.ndarray:
+    """Vectorized create_detailed_description."""
+    length = len(df)
+    name = df["name"].str.strip().to_numpy(dtype=object)
+    e_number = df["e_number"].to_numpy(dtype=object)
+    classes = TextColumn(df["additives_classes"], lower=True)
+
+    # Function description: class rules first, then the category fallback
+    conditions, choices = [], []
+    for keywords, refinements, fallback in rules.base_function_rules:
+        hit = classes.contains_any(keywords)
+        for refining_keywords, refined in refinements:
+            conditions.append(hit & classes.contains_any(refining_keywords))
+            choices.append(refined)
+        conditions.append(hit)
+        choices.append(fallback)
+    category_function = TextColumn(pd.Series(category)).map(
+        lambda value: rules.function_descriptions.get(value, rules.default_function_description))
+    conditions.append(np.ones(length, dtype=bool))
+    choices.append(category_function)
+    base_function = select(conditions, choices, rules.default_function_description, length)
+
+    main_part = name + " (" + e_number + ") is a " + base_function
+
+    risk_part = TextColumn(pd.Series(risk_level)).map(
+        lambda value: f"It is {rules.risk_descriptions[value]}" if value in rules.risk_descriptions else "")
+
+    vegetarian = TextColumn(df["vegetarian"], lower=True).equals("yes")
+    vegan = TextColumn(df["vegan"], lower=True).equals("yes")
+    dietary_part = select(
+        [vegetarian & vegan, vegetarian & ~vegan, vegan],
+        [
+            "This additive is vegetarian-friendly and vegan-friendly",
+            "This additive is vegetarian-friendly and vegetarian-friendly but not vegan",
+            "This additive is vegan-friendly",
+        ],
+        "", length
+    )
+
+    efsa = TextColumn(df["efsa_evaluation"], lower=True)
+    efsa_part = select(
+        [efsa.contains_any(("safe",)), ~(efsa.equals("") | efsa.equals("unknown"))],
+        ["EFSA has evaluated this additive as safe for consumption",
+         efsa.map(lambda value: f"EFSA evaluation: {value}")],
+        "", length
+    )
+
+    usage_by_e_number = df["e_number"].map(rules.specific_usage_info)
+    name_lower = TextColumn(pd.Series(name), lower=True)
+    usage_part = select(
+        [usage_by_e_number.notna().to_numpy(dtype=bool)]
+        + [name_lower.contains_any((pattern,)) for pattern, _ in rules.name_usage_patterns],
+        [usage_by_e_number] + [usage for _, usage in rules.name_usage_patterns],
+        "", length
+    )
+
+    description = main_part
+    for part in (risk_part, dietary_part, efsa_part, usage_part):
+        description = description + np.where(part != "", ". " + part, "")
+    return description + "."
+
+
+def build_additive_rows(additives_list: List[Dict[str, Any]], classifier: Optional[RiskClassifier] = None,
+                        rules: Optional[CompiledRuleset] = None) -> List[tuple]:
+    """Build insert-ready row tuples for all additives in one columnar pass (default ruleset if not given)."""
+    if not additives_list:
+        return []
+
+    rules = rules or default_ruleset()
+    df = load_additives_frame(additives_list)
+    risk_level, risk_color = classify_frame(df, classifier or rules.classifier)
+    category = categorize_frame(df, rules)
+    description = describe_frame(df, risk_level, category, rules)
+    e_keys, e_variants = zip(*(additive_e_key(additive) for additive in additives_list))
+
+    columns = [
+        df["taxonomy_id"],
+        df["e_number"],
+        df["name"],
+        risk_level,
+        risk_color,
+        category,
+        description,
+        df["vegetarian"],
+        df["vegan"],
+        df["efsa_evaluation"],
+        df["efsa_url"],
+        df["efsa_date"],
+        df["additives_classes"],
+        df["source"],
+        df["last_updated"],
+        e_keys,
+        e_variants,
+    ]
+    return list(zip(*(list(column) if isinstance(column, tuple) else column.tolist() for column in columns)))
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Compact Read-Only Exports of the Additives Database
+
+Two artifacts for app bundles, both derived from a built additives.db:
+
+- A compact SQLite file: the additives table is rewritten WITHOUT ROWID and
+  keyed by the normalized E-number (e_key, e_variant, taxonomy_id), without the
+  build/sync-only columns (risk_color is derived from risk_level, created_at,
+  last_updated, content_hash, revision) and without sync tables and triggers.
+  The per-field provenance tables (field_sources, sources) are dropped too;
+  the sources column still names the sources of each additive.
+  The synonym index tables are left out as well: apps load the binary synonym
+  index (synonym_index.py, written with --synonym-index) instead.
+  Descriptions are interned here: the text after "<name> (<e_number>) is a " is
+  stored once in description_templates, additives_text is a view with the
+  reassembled descriptions, and the search index reads from it.
+  The search index has no prefix indexes (prefix queries still work) and is
+  optimized, ANALYZE statistics are included, and the file is written with
+  VACUUM INTO at the smallest of several page sizes.
+
+- A flat binary index that clients can mmap and binary-search without parsing:
+
+    header   magic "ADDX", format version u16, reserved u16, record count u32,
+             category count u32, categories offset u32, strings offset u32
+    records  fixed-size, sorted by key (see RECORD_FORMAT)
+    categories  u32 offset + u16 length pairs into the string table
+    strings  UTF-8 names and categories
+
+  Keys are the folded E-number without prefix ("160aii"), NUL-padded.
+  All integers are little-endian.
+"""
+
+import argparse
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+from e_numbers import normalize_e_number
+from risk_classifier import RISK_COLORS, RISK_ORDER
+
+PAGE_SIZES = (1024, 2048, 4096)
+
+BINARY_INDEX_MAGIC = b"ADDX"
+BINARY_INDEX_VERSION = 1
+HEADER_FORMAT = struct.Struct("<4sHHIIII")
+# key[12], risk level (index into RISK_ORDER), category index, flags, reserved,
+# name offset, name length, reserved
+RECORD_FORMAT = struct.Struct("<12sBBBBIHH")
+CATEGORY_FORMAT = struct.Struct("<IH")
+KEY_SIZE = 12
+
+FLAG_VEGETARIAN = 1
+FLAG_VEGAN = 2
+
+# Columns kept in the compact additives table, in order
+COMPACT_COLUMNS = (
+    "e_key", "e_variant", "taxonomy_id", "id", "e_number", "name", "risk_level", "category",
+    "description_template_id", "vegetarian", "vegan", "efsa_evaluation", "efsa_url", "efsa_date",
+    "additives_classes", "sources"
+)
+
+# Part of a description after "<name> (<e_number>) is a ", or NULL if it does not have that form
+TEMPLATE_EXPRESSION = """CASE
+    WHEN substr(description, 1, length(trim(name) || ' (' || e_number || ') is a '))
+         = trim(name) || ' (' || e_number || ') is a '
+    THEN substr(description, length(trim(name) || ' (' || e_number || ') is a ') + 1)
+END"""
+
+# Description of an additive row: stored when the template does not reproduce it
+DESCRIPTION_EXPRESSION = """COALESCE({additive}.description, (
+    SELECT trim({additive}.name) || ' (' || {additive}.e_number || ') is a ' || t.template
+    FROM description_templates t WHERE t.id = {additive}.description_template_id
+))"""
+
+
+def compact_schema(conn: sqlite3.Connection):
+    """Rewrite a scratch copy of the database into the compact read-only layout."""
+    column_list = ", ".join(COMPACT_COLUMNS)
+    cursor = conn.cursor()
+
+    for (trigger,) in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        cursor.execute(f'DROP TRIGGER "{trigger}"')
+    cursor.execute("DROP TABLE IF EXISTS deleted_additives")
+    cursor.execute("DROP TABLE IF EXISTS synonym_trie")
+    cursor.execute("DROP TABLE IF EXISTS synonym_words")
+    # Per-field provenance is build-only; the sources column keeps each additive's sources
+    cursor.execute("DROP TABLE IF EXISTS field_sources")
+    cursor.execute("DROP TABLE IF EXISTS sources")
+    # Databases from older builders have their own templates: intern them again below
+    cursor.execute("DROP TABLE IF EXISTS description_templates")
+
+    # Intern the shared description text, numbered in order of first use
+    cursor.execute(f"CREATE TEMP TABLE row_templates AS SELECT id, {TEMPLATE_EXPRESSION} AS template FROM additives")
+    cursor.execute("CREATE TEMP TABLE template_ids (template TEXT PRIMARY KEY, id INTEGER NOT NULL)")
+    cursor.execute('''
+    INSERT INTO template_ids (template, id)
+    SELECT template, ROW_NUMBER() OVER (ORDER BY MIN(id)) FROM row_templates
+    WHERE template IS NOT NULL
+    GROUP BY template
+    ''')
+    cursor.execute('''
+    CREATE TABLE description_templates (
+        id INTEGER PRIMARY KEY,
+        template TEXT NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT INTO description_templates (id, template) SELECT id, template FROM template_ids")
+
+    cursor.execute('''
+    CREATE TABLE additives_compact (
+        e_key TEXT NOT NULL,
+        e_variant TEXT NOT NULL,
+        taxonomy_id TEXT NOT NULL,
+        id INTEGER NOT NULL UNIQUE,
+        e_number TEXT NOT NULL,
+        name TEXT NOT NULL,
+        risk_level TEXT NOT NULL,
+        category TEXT,
+        description_template_id INTEGER,
+        description TEXT,
+        vegetarian TEXT,
+        vegan TEXT,
+        efsa_evaluation TEXT,
+        efsa_url TEXT,
+        efsa_date TEXT,
+        additives_classes TEXT,
+        sources TEXT,
+        PRIMARY KEY (e_key, e_variant, taxonomy_id)
+    ) WITHOUT ROWID
+    ''')
+    select_list = ", ".join(f"a.{column}" for column in COMPACT_COLUMNS).replace("a.description_template_id", "t.id")
+    cursor.execute(f'''
+    INSERT INTO additives_compact ({column_list})
+    SELECT {select_list}
+    FROM additives a
+    JOIN row_templates r ON r.id = a.id
+    LEFT JOIN template_ids t ON t.template = r.template
+    ''')
+    cursor.execute("DROP TABLE row_templates")
+    cursor.execute("DROP TABLE template_ids")
+    # Keep only descriptions the template does not reproduce
+    cursor.execute(f'''
+    UPDATE additives_compact SET description = (
+        SELECT a.description FROM additives a
+        WHERE a.id = additives_compact.id
+        AND a.description IS NOT ({DESCRIPTION_EXPRESSION.format(additive="additives_compact")})
+    )
+    ''')
+    cursor.execute("DROP TABLE additives")
+    cursor.execute("ALTER TABLE additives_compact RENAME TO additives")
+    cursor.execute("CREATE INDEX idx_risk_level ON additives(risk_level)")
+    cursor.execute("CREATE INDEX idx_category ON additives(category)")
+    cursor.execute("CREATE INDEX idx_name ON additives(name)")
+    cursor.execute(f'''
+    CREATE VIEW additives_text AS
+    SELECT a.id, a.e_key, a.e_variant, a.e_number, a.name, a.additives_classes,
+           {DESCRIPTION_EXPRESSION.format(additive="a")} AS description
+    FROM additives a
+    ''')
+
+    fts = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'additives_fts'"
+    ).fetchone()
+    if fts:
+        # Index the reassembled descriptions: same columns and tokenizer, content from the view.
+        # The prefix indexes are left out: they roughly double the index, and prefix queries
+        # over a few thousand rows are fast without them
+        cursor.execute("DROP TABLE additives_fts")
+        fts_sql = fts[0].replace("content='additives'", "content='additives_text'")
+        cursor.execute(re.sub(r"\s*prefix='[^']*',", "", fts_sql))
+        # External content lookups go through the UNIQUE id column; merge index segments
+        cursor.execute("INSERT INTO additives_fts(additives_fts) VALUES('rebuild')")
+        cursor.execute("INSERT INTO additives_fts(additives_fts) VALUES('optimize')")
+
+    cursor.execute("DELETE FROM metadata WHERE key = 'validation_report'")
+    cursor.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('format', 'compact')")
+    conn.commit()
+    cursor.execute("ANALYZE")
+    conn.commit()
+
+
+def export_compact_db(db_path: str, output_path: str, page_sizes: Iterable[int] = PAGE_SIZES) -> Dict[str, Any]:
+    """
+    Write the compact read-only copy of db_path to output_path.
+    Every page size is tried with VACUUM INTO and the smallest file is kept.
+    Returns {"page_size": ..., "bytes": ...}.
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    handle, scratch = tempfile.mkstemp(suffix=".db", dir=output_dir)
+    os.close(handle)
+    candidates: List[str] = []
+    try:
+        source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        target = sqlite3.connect(scratch)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+
+        try:
+            compact_schema(target)
+            best = None
+            for page_size in page_sizes:
+                candidate = f"{output_path}.{page_size}.tmp"
+                if os.path.exists(candidate):
+                    os.remove(candidate)
+                candidates.append(candidate)
+                # The page size set on the source applies to the VACUUM INTO output
+                target.execute(f"PRAGMA page_size={int(page_size)}")
+                target.execute("VACUUM INTO ?", (candidate,))
+                size = os.path.getsize(candidate)
+                if best is None or size < best["bytes"]:
+                    best = {"page_size": page_size, "bytes": size, "path": candidate}
+        finally:
+            target.close()
+
+        os.replace(best["path"], output_path)
+        return {"page_size": best["page_size"], "bytes": best["bytes"]}
+    finally:
+        for path in candidates + [scratch]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def index_key(e_key: str, e_variant: str) -> bytes:
+    """Binary index key: folded E-number body ("160A", "II" -> b"160aii"), NUL-padded."""
+    key = (e_key + e_variant).lower().encode("ascii")
+    if len(key) > KEY_SIZE:
+        raise ValueError(f"E-number key too long for the binary index: {key!r}")
+    return key.ljust(KEY_SIZE, b"\0")
+
+
+def write_binary_index(db_path: str, output_path: str) -> int:
+    """Write the mmappable binary E-number index for db_path. Returns the record count."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute('''
+        SELECT e_key, e_variant, name, risk_level, category, vegetarian, vegan
+        FROM additives
+        WHERE e_key != ''
+        ORDER BY id
+        ''').fetchall()
+    finally:
+        conn.close()
+
+    # One record per E-number; the first row wins, as in the alias lookups
+    records: Dict[bytes, tuple] = {}
+    for row in rows:
+        key = index_key(row[0], row[1])
+        records.setdefault(key, row)
+
+    categories = sorted({row[4] or "" for row in records.values()})
+    strings = bytearray()
+    category_entries = []
+    for category in categories:
+        encoded = category.encode("utf-8")
+        category_entries.append((len(strings), len(encoded)))
+        strings += encoded
+
+    packed_records = []
+    for key in sorted(records):
+        _, _, name, risk_level, category, vegetarian, vegan = records[key]
+        encoded = name.encode("utf-8")[:0xFFFF]
+        flags = (FLAG_VEGETARIAN if (vegetarian or "").lower() == "yes" else 0) | \
+                (FLAG_VEGAN if (vegan or "").lower() == "yes" else 0)
+        packed_records.append(RECORD_FORMAT.pack(
+            key, RISK_ORDER.index(risk_level), categories.index(category or ""), flags, 0,
+            len(strings), len(encoded), 0
+        ))
+        strings += encoded
+
+    categories_offset = HEADER_FORMAT.size + RECORD_FORMAT.size * len(packed_records)
+    strings_offset = categories_offset + CATEGORY_FORMAT.size * len(category_entries)
+    header = HEADER_FORMAT.pack(
+        BINARY_INDEX_MAGIC, BINARY_INDEX_VERSION, 0, len(packed_records),
+        len(category_entries), categories_offset, strings_offset
+    )
+
+    with open(output_path, "wb") as f:
+        f.write(header)
+        f.writelines(packed_records)
+        f.writelines(CATEGORY_FORMAT.pack(offset, length) for offset, length in category_entries)
+        f.write(strings)
+    return len(packed_records)
+
+
+class BinaryIndex:
+    """Read-only lookups in a binary E-number index via mmap and binary search."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.count, self.category_count,
+         self.categories_offset, self.strings_offset) = HEADER_FORMAT.unpack_from(self.buffer, 0)
+        if magic != BINARY_INDEX_MAGIC or version != BINARY_INDEX_VERSION:
+            raise ValueError(f"{path} is not a version {BINARY_INDEX_VERSION} additives binary index")
+
+    def close(self):
+        """Unmap the index."""
+        self.buffer.close()
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self.strings_offset + offset
+        return self.buffer[start:start + length].decode("utf-8")
+
+    def _key_at(self, i: int) -> bytes:
+        start = HEADER_FORMAT.size + i * RECORD_FORMAT.size
+        return self.buffer[start:start + KEY_SIZE]
+
+    def lookup(self, e_number: str) -> Optional[Dict[str, Any]]:
+        """Look up any E-number spelling ("E 160a (ii)", "INS 330"); None if unknown."""
+        normalized = normalize_e_number(e_number)
+        if not normalized:
+            return None
+        key = index_key(*normalized)
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count or self._key_at(low) != key:
+            return None
+
+        (_, risk_index, category_index, flags, _, name_offset, name_length, _) = RECORD_FORMAT.unpack_from(
+            self.buffer, HEADER_FORMAT.size + low * RECORD_FORMAT.size
+        )
+        category_offset, category_length = CATEGORY_FORMAT.unpack_from(
+            self.buffer, self.categories_offset + category_index * CATEGORY_FORMAT.size
+        )
+        risk_level = RISK_ORDER[risk_index]
+        return {
+            "e_key": normalized[0],
+            "e_variant": normalized[1],
+            "name": self._string(name_offset, name_length),
+            "risk_level": risk_level,
+            "risk_color": RISK_COLORS[risk_level],
+            "category": self._string(category_offset, category_length),
+            "vegetarian": bool(flags & FLAG_VEGETARIAN),
+            "vegan": bool(flags & FLAG_VEGAN),
+        }
+
+
+def main():
+    """Write compact exports of a built additives database."""
+    parser = argparse.ArgumentParser(description="Compact read-only exports of the additives database")
+    parser.add_argument("db_path", nargs="?", default="additives.db",
+                        help="Built additives database (default: additives.db)")
+    parser.add_argument("--output", default="additives_compact.db",
+                        help="Compact SQLite output (default: additives_compact.db)")
+    parser.add_argument("--binary-index", metavar="PATH",
+                        help="Also write the mmappable binary E-number index to PATH")
+    args = parser.parse_args()
+
+    result = export_compact_db(args.db_path, args.output)
+    print(f"{args.output}: {result['bytes']} bytes (page size {result['page_size']})")
+    if args.binary_index:
+        count = write_binary_index(args.db_path, args.binary_index)
+        print(f"{args.binary_index}: {count} E-numbers, {os.path.getsize(args.binary_index)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,63 +6,395 @@ This script creates a SQLite database containing food additives with risk levels
 suitable for import into Kotlin Multiplatform (KMP) projects.
 """
 
-import requests
 import json
 import sqlite3
-import pandas as pd
 import logging
+import argparse
+import functools
+import hashlib
+import re
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple, Union
 import os
+import shutil
 import sys
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f"additives_sqlite_creation_{datetime.now().strftime('%Y%m%d')}.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from additive_classes import build_class_rows, class_category_rank, load_class_labels, parse_class_tags
+from additive_rules import CompiledRuleset, default_ruleset, load_ruleset
+from additive_sources import (MANUAL_SOURCE, OPENFOODFACTS_SOURCE, RecordsSource, SourceAdapter, merge_sources,
+                              open_source)
+from build_metrics import BuildMetrics
+from e_numbers import additive_e_key, e_number_aliases, name_alias
+from fts_query import build_fts_query  # noqa: F401 (re-exported for existing callers)
+from risk_classifier import RISK_COLORS, RiskClassifier
+from row_validation import RowValidator, ValidationReport
+from synonym_index import SynonymAutomaton, build_synonym_automaton
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_LANGUAGES = ("en",)
+# Related OFF taxonomies the build uses (class labels), fetched with --taxonomies all.
+# Only these are fetched and hashed, so an unrelated taxonomy never defeats the "unchanged" check
+RELATED_TAXONOMIES = ("additives_classes",)
+# Distinct (category, classes, risk, vegetarian, vegan, EFSA) description templates kept in memory
+DESCRIPTION_TEMPLATE_CACHE_SIZE = 4096
+
+# FTS5 tokenizer presets for the additives_fts search index
+FTS_TOKENIZERS = {
+    "unicode61": "unicode61 remove_diacritics 2",
+    "trigram": "trigram",
+}
+
+# Modules whose contents determine the build output (see builder_fingerprint)
+BUILDER_MODULES = ("create_additives_sqlite.py", "additive_rules.py", "risk_classifier.py", "columnar_build.py",
+                   "e_numbers.py", "localized_build.py", "additive_classes.py", "additive_sources.py",
+                   "row_validation.py", "synonym_index.py")
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Positions in an additive row tuple (see build_additive_rows) excluded from the
+# content hash: last_updated changes on every build without the content changing
+_UNHASHED_ROW_FIELDS = frozenset({14})
+
+
+def iter_taxonomy_entries(chunks: Iterable[str], key_prefix: str = "en:e",
+                          languages: Optional[Iterable[str]] = DEFAULT_LANGUAGES) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Incrementally parse a taxonomy JSON object from text chunks.
+    Yields (key, entry) pairs for keys starting with key_prefix, with translated
+    fields trimmed to the requested languages (all languages if None).
+    
+    Only the entry being decoded is held in memory, so peak usage stays flat
+    regardless of the taxonomy size.
+    """
+    decoder = json.JSONDecoder()
+    chunk_iter = iter(chunks)
+    wanted = set(languages) if languages is not None else None
+    buf, pos, eof = "", 0, False
+    
+    def read_more() -> bool:
+        nonlocal buf, pos, eof
+        for chunk in chunk_iter:
+            if chunk:
+                buf = buf[pos:] + chunk
+                pos = 0
+                return True
+        eof = True
+        return False
+    
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            pos = _JSON_WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or not read_more():
+                return
+    
+    def expect(chars: str) -> str:
+        nonlocal pos
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of taxonomy data")
+        char = buf[pos]
+        if char not in chars:
+            raise ValueError(f"Unexpected character {char!r} in taxonomy data")
+        pos += 1
+        return char
+    
+    def decode_value() -> Any:
+        nonlocal pos
+        skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # A value ending exactly at the buffer edge may be truncated (e.g. numbers)
+                if end < len(buf) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            read_more()
+    
+    expect("{")
+    skip_whitespace()
+    if pos < len(buf) and buf[pos] == "}":
+        return
+    
+    while True:
+        key = decode_value()
+        expect(":")
+        value = decode_value()
+        
+        if isinstance(key, str) and key.startswith(key_prefix) and isinstance(value, dict):
+            if wanted is not None:
+                value = {
+                    field: ({lang: text for lang, text in content.items() if lang in wanted}
+                            if isinstance(content, dict) else content)
+                    for field, content in value.items()
+                }
+            yield key, value
+        
+        if expect(",}") == "}":
+            return
+
+
+def row_content_hash(row: tuple) -> str:
+    """SHA-256 over the content fields of an additive row tuple, used to detect changed rows."""
+    content = [value for i, value in enumerate(row) if i not in _UNHASHED_ROW_FIELDS]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
 class AdditivesSQLiteCreator:
     """Creates SQLite database for food additives with KMP-compatible structure."""
     
-    def __init__(self, db_path: str = "additives.db"):
+    def __init__(self, db_path: str = "additives.db", streaming: bool = False,
+                 languages: Optional[Iterable[str]] = DEFAULT_LANGUAGES, source: Optional[str] = None,
+                 force: bool = False, risk_classifier: Optional[RiskClassifier] = None,
+                 columnar: bool = False, fts_tokenizer: str = "unicode61", workers: Optional[int] = None,
+                 incremental: bool = False, delta_dir: Optional[str] = None,
+                 compact_path: Optional[str] = None, binary_index_path: Optional[str] = None,
+                 ruleset: Optional[CompiledRuleset] = None, metrics: Optional[BuildMetrics] = None,
+                 metrics_json_path: Optional[str] = None, metrics_prometheus_path: Optional[str] = None,
+                 profile_path: Optional[str] = None, related_taxonomies: Optional[Dict[str, Optional[str]]] = None,
+                 taxonomy_base_url: Optional[str] = None, fetch_concurrency: int = 4,
+                 extra_sources: Optional[Iterable[SourceAdapter]] = None, strict: bool = False,
+                 validation_report_path: Optional[str] = None, synonym_index_path: Optional[str] = None):
         self.db_path = db_path
+        self.streaming = streaming
+        # None means every language in the taxonomy; English is always kept for the main table
+        self.languages = None if languages is None else tuple(dict.fromkeys(("en",) + tuple(languages)))
+        self.source = source
+        self.force = force
+        self.ruleset = ruleset or default_ruleset()
+        self.risk_classifier = risk_classifier or self.ruleset.classifier
+        self.columnar = columnar
+        self.fts_tokenizer = fts_tokenizer
+        self.workers = workers
+        self.incremental = incremental
+        self.delta_dir = delta_dir
+        self.compact_path = compact_path
+        self.binary_index_path = binary_index_path
+        self.synonym_index_path = synonym_index_path
+        # Per-stage timings and resource usage of create_kmp_ready_database
+        self.metrics = metrics or BuildMetrics(profile=bool(profile_path))
+        self.metrics_json_path = metrics_json_path
+        self.metrics_prometheus_path = metrics_prometheus_path
+        self.profile_path = profile_path
+        # Build revision stamped on every written row; set from the previous build's metadata
+        self.revision = 1
+        # Description templates are memoized per creator, since they depend on the ruleset
+        self.description_template = functools.lru_cache(maxsize=DESCRIPTION_TEMPLATE_CACHE_SIZE)(
+            self.build_description_template
+        )
+        # Category mapping rank of each class tag (a few dozen distinct classes)
+        self.class_category = functools.lru_cache(maxsize=None)(
+            functools.partial(class_category_rank, rules=self.ruleset)
+        )
+        # Related OFF taxonomies (name -> local path, or None to download) and their snapshots
+        self.related_taxonomies = dict(related_taxonomies or {})
+        self.taxonomy_base_url = taxonomy_base_url
+        self.fetch_concurrency = fetch_concurrency
+        self.source_snapshot: Dict[str, Any] = {}
+        self.related_snapshots: Dict[str, Dict[str, Any]] = {}
+        # Sources merged with the OFF taxonomy (a Manual one replaces the built-in manual additives)
+        self.extra_sources = list(extra_sources or [])
+        # Rows failing validation are dropped from the load; strict fails the build instead
+        self.strict = strict
+        self.validation_report_path = validation_report_path
+        self.validation_report = ValidationReport()
         self.additives_data: List[Dict[str, Any]] = []
         
-    def download_openfoodfacts_data(self) -> Optional[Dict]:
-        """Download additives data from Open Food Facts API."""
-        logger.info("Downloading data from Open Food Facts...")
+    @property
+    def localized(self) -> bool:
+        """Whether localized names were requested (any language besides English)."""
+        return self.languages != ("en",)
+    
+    def builder_fingerprint(self) -> str:
+        """
+        SHA-256 of the builder modules and the output-affecting options,
+        so code, rule or option changes invalidate the build cache.
+        """
+        digest = hashlib.sha256()
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        for module_name in BUILDER_MODULES:
+            with open(os.path.join(module_dir, module_name), "rb") as f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        options = {"languages": self.languages, "fts_tokenizer": self.fts_tokenizer,
+                   "ruleset_sha256": self.ruleset.sha256,
+                   "sources": [(source.name, source.fingerprint()) for source in self.extra_sources]}
+        digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+    
+    def read_existing_metadata(self) -> Dict[str, str]:
+        """Read the metadata table of an existing database, if any."""
+        if not os.path.exists(self.db_path):
+            return {}
         
         try:
-            url = "https://static.openfoodfacts.org/data/taxonomies/additives.json"
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # Save raw data for reference
-            timestamp = datetime.now().strftime('%Y%m%d')
-            with open(f"openfoodfacts_raw_{timestamp}.json", "w", encoding="utf-8") as f:
-                f.write(response.text)
-            
-            logger.info("Successfully downloaded Open Food Facts data")
-            return json.loads(response.text)
-            
-        except requests.RequestException as e:
-            logger.error(f"Failed to download Open Food Facts data: {e}")
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return dict(conn.execute("SELECT key, value FROM metadata").fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read metadata from {self.db_path}: {e}")
+            return {}
+    
+    def fetch_taxonomy(self, source: Optional[str] = None,
+                       previous: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the additives taxonomy (and the related taxonomies) to local files and hash them.
+        
+        With a local source path the file is used as-is. Otherwise the taxonomies are
+        downloaded concurrently (see taxonomy_fetch): conditional on the ETag/Last-Modified
+        recorded in previous metadata, retried with backoff, and streamed to disk while
+        hashing, so the body is never held in memory. Related taxonomies are optional:
+        one that cannot be fetched is left out of related_snapshots.
+        
+        Returns a snapshot dict (path, sha256, etag, last_modified, unchanged),
+        or None if the additives taxonomy could not be fetched. unchanged is only
+        true when the related taxonomies are unchanged too.
+        """
+        # Imported lazily: only needed for downloads
+        import taxonomy_fetch
+        
+        previous = previous or {}
+        timestamp = datetime.now().strftime('%Y%m%d')
+        base_url = self.taxonomy_base_url or taxonomy_fetch.OPENFOODFACTS_TAXONOMY_BASE_URL
+        
+        validators = {"additives": {
+            "sha256": previous.get("source_sha256", ""),
+            "etag": previous.get("source_etag", ""),
+            "last_modified": previous.get("source_last_modified", ""),
+        }}
+        for name in self.related_taxonomies:
+            validators[name] = {field: previous.get(f"taxonomy_{name}_{field}", "")
+                                for field in ("sha256", "etag", "last_modified")}
+        
+        snapshots: Dict[str, Optional[Dict[str, Any]]] = {}
+        targets = {}
+        if source:
+            logger.info(f"Using local taxonomy file {source}...")
+            snapshots["additives"] = self.hash_local_taxonomy(source, validators["additives"]["sha256"])
+        else:
+            targets["additives"] = (taxonomy_fetch.taxonomy_url("additives", base_url),
+                                    f"openfoodfacts_raw_{timestamp}.json")
+        for name, path in self.related_taxonomies.items():
+            if path:
+                snapshots[name] = self.hash_local_taxonomy(path, validators[name]["sha256"])
+            else:
+                targets[name] = (taxonomy_fetch.taxonomy_url(name, base_url),
+                                 f"openfoodfacts_{name}_{timestamp}.json")
+        
+        if targets:
+            logger.info(f"Downloading {', '.join(targets)} from Open Food Facts...")
+            snapshots.update(taxonomy_fetch.fetch_taxonomies(
+                targets, validators, concurrency=self.fetch_concurrency
+            ))
+        
+        snapshot = snapshots.pop("additives")
+        if not snapshot:
+            return None
+        
+        self.related_snapshots = {}
+        for name, related in snapshots.items():
+            if related:
+                self.related_snapshots[name] = related
+            else:
+                logger.warning(f"Continuing without the {name} taxonomy")
+        
+        unchanged = snapshot["unchanged"] and all(related["unchanged"] for related in self.related_snapshots.values())
+        if snapshot["unchanged"] and not unchanged and not snapshot["path"]:
+            # A related taxonomy changed: the rebuild needs the additives file after all
+            logger.info("Related taxonomies changed; downloading the unchanged additives taxonomy again")
+            snapshot = taxonomy_fetch.fetch_taxonomies(
+                {"additives": targets["additives"]}, concurrency=1
+            )["additives"]
+            if not snapshot:
+                return None
+        
+        if targets:
+            logger.info(f"Successfully downloaded Open Food Facts data (sha256 {snapshot['sha256'][:12]})")
+        return {
+            "path": snapshot["path"],
+            "sha256": snapshot["sha256"],
+            "etag": snapshot["etag"],
+            "last_modified": snapshot["last_modified"],
+            "unchanged": unchanged,
+        }
+    
+    def hash_local_taxonomy(self, path: str, previous_sha256: str = "") -> Optional[Dict[str, Any]]:
+        """Snapshot of a local taxonomy file (hashed in chunks); None if it cannot be read."""
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        except OSError as e:
+            logger.error(f"Failed to read taxonomy file {path}: {e}")
             return None
+        sha256 = digest.hexdigest()
+        return {
+            "path": path,
+            "sha256": sha256,
+            "etag": "",
+            "last_modified": "",
+            "unchanged": sha256 == previous_sha256,
+        }
+    
+    def record_source_metadata(self):
+        """Store the input snapshot hash and HTTP validators in the metadata table."""
+        snapshot = self.source_snapshot
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            [
+                ("source_sha256", snapshot.get("sha256", "")),
+                ("source_etag", snapshot.get("etag", "")),
+                ("source_last_modified", snapshot.get("last_modified", "")),
+                ("builder_sha256", snapshot.get("builder_sha256", "")),
+                # Kept so a skipped rebuild can still write --validation-report
+                ("validation_report", json.dumps(self.validation_report.to_dict(), ensure_ascii=False)),
+            ] + [
+                (f"taxonomy_{name}_{field}", related.get(field, ""))
+                for name, related in self.related_snapshots.items()
+                for field in ("sha256", "etag", "last_modified")
+            ]
+        )
+        conn.commit()
+        conn.close()
+    
+    def open_taxonomy_chunks(self, path: str) -> Iterator[str]:
+        """
+        Read a taxonomy file as an iterator of decoded text chunks. Downloads are
+        fetched to disk first (see fetch_taxonomy), so this is always a local file.
+        """
+        logger.info(f"Streaming taxonomy from {path}...")
+        with open(path, "r", encoding="utf-8") as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    
+    def stream_openfoodfacts_data(self, path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Stream the additive entries (en:e*) of a taxonomy file, trimmed to the configured languages."""
+        return iter_taxonomy_entries(self.open_taxonomy_chunks(path), key_prefix="en:e", languages=self.languages)
     
-    def process_openfoodfacts_data(self, raw_data: Dict) -> List[Dict[str, Any]]:
-        """Process raw Open Food Facts data into structured format."""
+    def process_openfoodfacts_data(self, raw_data: Union[Dict, Iterable[Tuple[str, Dict]]]) -> List[Dict[str, Any]]:
+        """
+        Process raw Open Food Facts data into structured format.
+        Accepts either the full taxonomy dict or a stream of (key, entry) pairs.
+        """
         logger.info("Processing Open Food Facts data...")
         
         processed_additives = []
+        entries = raw_data.items() if isinstance(raw_data, dict) else raw_data
         
-        for key, value in raw_data.items():
+        for key, value in entries:
             if not key.startswith("en:e"):
                 continue
                 
@@ -72,8 +404,14 @@ class AdditivesSQLiteCreator:
                 if not e_number:
                     continue
                 
-                # Extract names (English only)
-                name_en = value.get("name", {}).get("en", "")
+                # Extract names (English for the main table, plus requested languages;
+                # streamed entries are already trimmed to the same languages)
+                names = {
+                    lang: text for lang, text in value.get("name", {}).items()
+                    if text and (self.languages is None or lang in self.languages)
+                }
+                name_en = names.get("en", "")
+                localized_names = names if self.localized else {}
                 
                 # Extract additional information
                 vegetarian = value.get("vegetarian", {}).get("en", "")
@@ -95,8 +433,12 @@ class AdditivesSQLiteCreator:
                     "efsa_date": efsa_date,
                     "additives_classes": additives_classes,
                     "source": "Open Food Facts",
-                    "last_updated": datetime.now().isoformat()
+                    "last_updated": datetime.now().isoformat(),
+                    # Names in the configured languages, for the synonym index
+                    "names": names
                 }
+                if localized_names:
+                    additive["localized_names"] = localized_names
                 
                 processed_additives.append(additive)
                 
@@ -117,181 +459,18 @@ class AdditivesSQLiteCreator:
         - YELLOW: Limited risk (generally safe but synthetic)
         - ORANGE: Moderate risk (some health concerns documented)
         - RED: High risk (significant health concerns or restrictions)
-        """
-        
-        e_number = additive.get("e_number", "")
-        additives_classes = str(additive.get("additives_classes", "")).lower()
-        name = str(additive.get("name", "")).lower()
-        efsa_eval = str(additive.get("efsa_evaluation", "")).lower()
-        
-        # HIGH RISK (Red) - Additives with documented health concerns
-        high_risk_additives = {
-            # Artificial colors linked to hyperactivity
-            "102", "104", "110", "122", "124", "129", "131", "132", "133",
-            "127", "154", "180",
-            # Controversial sweeteners
-            "951", "954", "955", "961",  # Aspartame, Saccharin, Sucralose, Neotame
-            # Sulfites (allergens)
-            "220", "221", "222", "223", "224", "225", "226", "227", "228",
-            # Nitrates/Nitrites (preservation concerns)
-            "249", "250", "251", "252",
-            # MSG and related (sensitivities)
-            "621", "622", "623", "624", "625",
-            # Controversial preservatives
-            "210", "211", "212", "213", "214", "215", "216", "217", "218", "219",
-            # Trans fat related
-            "441", "442",
-            # Aluminum compounds
-            "173", "541", "554", "555", "556", "559",
-            # Questionable emulsifiers
-            "407a", "425", "466"
-        }
-        
-        if e_number in high_risk_additives:
-            return "RED", "red"
-        
-        # ORANGE (Moderate risk) - Some concerns but widely used
-        moderate_risk_additives = {
-            # Some phosphates (overexposure concerns)
-            "338", "339", "340", "341", "343", "450", "451", "452",
-            # Some carrageenan
-            "407",
-            # Some antioxidants with restrictions
-            "320", "321", "310", "311", "312", "319", "324",
-            # Some synthetic colors (less problematic than red category)
-            "123", "155", "160b", "161g", "163",
-            # Some controversial thickeners
-            "414", "415", "418", "460", "461", "462", "463", "464", "465",
-            "466", "468", "469",
-            # Potassium bromate and similar
-            "924", "925", "926", "927", "928",
-            # Some synthetic flavoring
-            "150c", "150d"  # Caramel colors with ammonia
-        }
-        
-        if e_number in moderate_risk_additives:
-            return "ORANGE", "orange"
-        
-        # GREEN (Safe) - Natural, vitamins, minerals, generally recognized as safe
-        safe_additives = {
-            # Vitamins
-            "101", "101i", "101ii",  # Riboflavin
-            "300", "301", "302", "303", "304", "304i", "304ii",  # Vitamin C compounds
-            "306", "307", "307a", "307b", "307c", "308", "309",  # Tocopherols (Vitamin E)
-            # Natural colors
-            "100",  # Curcumin
-            "140", "140i", "140ii",  # Chlorophylls
-            "160a", "160ai", "160aii",  # Carotenes
-            "160c", "160d", "160e", "160f",  # Natural carotenoids
-            "161a", "161b", "161c", "161d", "161e", "161f", "161h", "161i", "161j",
-            "162",  # Beetroot red
-            "163a", "163b", "163c", "163d", "163e", "163f",  # Anthocyanins
-            # Natural acids and salts
-            "330",  # Citric acid
-            "331", "331i", "331ii", "331iii",  # Sodium citrates
-            "332", "332i", "332ii",  # Potassium citrates
-            "333", "333i", "333ii", "333iii",  # Calcium citrates
-            "334",  # Tartaric acid
-            "335", "335i", "335ii",  # Sodium tartrates
-            "336", "336i", "336ii",  # Potassium tartrates
-            "337",  # Potassium sodium tartrate
-            # Natural extracts
-            "150a",  # Plain caramel
-            "200", "202", "203",  # Sorbic acid and sorbates
-            "270",  # Lactic acid
-            "290",  # Carbon dioxide
-            "322", "322i", "322ii",  # Lecithin
-            "401", "402", "403", "404", "405", "406",  # Natural gums (alginate, agar, etc.)
-            "407",  # Carrageenan (basic form)
-            "410", "412", "413", "415", "416", "417",  # Natural gums
-            "440", "440i", "440ii",  # Pectins
-            "471",  # Mono/diglycerides (when from natural sources)
-            # Natural minerals
-            "500", "500i", "500ii", "500iii",  # Sodium carbonates
-            "501", "501i", "501ii",  # Potassium carbonates
-            "503", "503i", "503ii",  # Ammonium carbonates
-            "504", "504i", "504ii",  # Magnesium carbonates
-            "507",  # Hydrochloric acid
-            "508",  # Potassium chloride
-            "509",  # Calcium chloride
-            "511",  # Magnesium chloride
-            "513",  # Sulfuric acid
-            "514", "514i", "514ii",  # Sodium sulfates
-            "515", "515i", "515ii",  # Potassium sulfates
-            "516",  # Calcium sulfate
-            "517",  # Ammonium sulfate
-            "518",  # Magnesium sulfate
-            # Natural sweeteners
-            "420", "420i", "420ii",  # Sorbitol
-            "965", "965i", "965ii",  # Maltitol
-            "967",  # Xylitol
-            "968",  # Erythritol
-            "960",  # Stevia glycosides
-            # Gases
-            "938", "939", "941", "942", "948", "949",  # Various gases
-        }
         
-        if e_number in safe_additives:
-            return "GREEN", "green"
-        
-        # Check by category for additional classification
-        if "colour" in additives_classes or "color" in additives_classes:
-            if any(danger in name for danger in ["artificial", "synthetic", "azo"]):
-                return "ORANGE", "orange"
-            else:
-                return "YELLOW", "yellow"
-        
-        if "preservative" in additives_classes:
-            if any(concern in name for concern in ["benzoate", "sulfite", "nitrite", "nitrate"]):
-                return "ORANGE", "orange"
-            else:
-                return "YELLOW", "yellow"
-        
-        if "sweetener" in additives_classes:
-            if "artificial" in name or any(sweet in name for sweet in ["aspartame", "saccharin", "acesulfame"]):
-                return "ORANGE", "orange"
-            else:
-                return "YELLOW", "yellow"
-        
-        # Natural categories tend to be safer
-        if any(natural in additives_classes for natural in ["antioxidant", "vitamin", "mineral"]):
-            return "GREEN", "green"
-        
-        if any(natural in name for natural in ["natural", "vitamin", "mineral", "citric", "lactic", "ascorbic"]):
-            return "GREEN", "green"
-        
-        # Emulsifiers and thickeners - mostly yellow unless specifically problematic
-        if any(category in additives_classes for category in ["emulsifier", "thickener", "stabiliser", "stabilizer"]):
-            return "YELLOW", "yellow"
-        
-        # Default to limited risk for unclassified additives
-        return "YELLOW", "yellow"
+        Rules are compiled once in risk_classifier; see RiskClassifier.
+        """
+        return self.risk_classifier.classify(additive)
     
     def get_additive_category(self, additive: Dict[str, Any]) -> str:
-        """Determine additive category based on class information."""
-        classes = str(additive.get("additives_classes", "")).lower()
-        
-        category_mapping = {
-            "colour": "Food Colors",
-            "color": "Food Colors", 
-            "preservative": "Preservatives",
-            "antioxidant": "Antioxidants",
-            "sweetener": "Sweeteners",
-            "emulsifier": "Emulsifiers",
-            "stabiliser": "Stabilizers",
-            "stabilizer": "Stabilizers",
-            "thickener": "Thickeners",
-            "flavour enhancer": "Flavor Enhancers",
-            "flavor enhancer": "Flavor Enhancers",
-            "acidity regulator": "Acidity Regulators",
-            "anti-caking": "Anti-Caking Agents"
-        }
-        
-        for keyword, category in category_mapping.items():
-            if keyword in classes:
-                return category
-        
-        return "Other"
+        """
+        Determine additive category based on class information: the category of the
+        class matching the earliest keyword of the category mapping.
+        """
+        ranks = [self.class_category(tag) for tag in parse_class_tags(additive.get("additives_classes"))]
+        return min(ranks)[1] if ranks else self.ruleset.default_category
     
     def add_manual_additives(self) -> List[Dict[str, Any]]:
         """Add manually curated additives data for completeness."""
@@ -341,102 +520,66 @@ class AdditivesSQLiteCreator:
         
         return manual_additives
     
+    def merge_additive_sources(self, processed_additives: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Merge the processed OFF additives with the manual and extra sources into one
+        record per normalized E-number (OFF first, so its ids and values win by default).
+        """
+        sources: List[SourceAdapter] = [RecordsSource(OPENFOODFACTS_SOURCE, processed_additives)]
+        if not any(source.name == MANUAL_SOURCE for source in self.extra_sources):
+            sources.append(RecordsSource(MANUAL_SOURCE, self.add_manual_additives()))
+        sources.extend(self.extra_sources)
+        return merge_sources(sources)
+    
     def create_detailed_description(self, additive: Dict[str, Any], risk_level: str, category: str) -> str:
         """Create a comprehensive description for the additive."""
         e_number = additive.get("e_number", "")
         name = additive.get("name", "").strip()
-        additives_classes = additive.get("additives_classes", "").lower()
-        efsa_evaluation = additive.get("efsa_evaluation", "").lower()
-        vegetarian = additive.get("vegetarian", "").lower()
-        vegan = additive.get("vegan", "").lower()
-        
-        # Start with basic function description based on category and classes
-        function_descriptions = {
-            "Colors": "food coloring agent",
-            "Preservatives": "food preservative", 
-            "Antioxidants": "antioxidant to prevent spoilage",
-            "Sweeteners": "artificial sweetener",
-            "Emulsifiers": "emulsifier to blend ingredients",
-            "Stabilizers": "stabilizer to maintain texture",
-            "Thickeners": "thickening agent",
-            "Acidity_Regulators": "acidity regulator",
-            "Flavor_Enhancers": "flavor enhancer",
-            "Anti_Caking_Agents": "anti-caking agent to prevent clumping",
-            "Foaming_Agents": "foaming agent",
-            "Glazing_Agents": "glazing agent for surface coating",
-            "Humectants": "humectant to retain moisture",
-            "Bulking_Agents": "bulking agent to add volume",
-            "Sequestrants": "sequestrant to bind metals"
-        }
         
-        # Get base function description
-        base_function = function_descriptions.get(category, "food additive")
+        # Shared part (function, risk, dietary and EFSA sentences) from the template cache
+        template = self.description_template(
+            category,
+            additive.get("additives_classes", "").lower(),
+            risk_level,
+            additive.get("vegetarian", "").lower(),
+            additive.get("vegan", "").lower(),
+            additive.get("efsa_evaluation", "").lower()
+        )
+        
+        # Per-additive parts: name, E-number and specific usage information
+        description = f"{name} ({e_number}) is a {template}"
+        specific_usage = self.get_specific_usage_info(e_number, name.lower())
+        if specific_usage:
+            description += f". {specific_usage}"
+        
+        return description + "."
+    
+    def build_description_template(self, category: str, additives_classes: str, risk_level: str,
+                                   vegetarian: str, vegan: str, efsa_evaluation: str) -> str:
+        """
+        Description text shared by all additives with the same (lowercased) attributes:
+        everything after "<name> (<e_number>) is a ", up to the usage information.
+        """
+        # Start with basic function description based on category
+        rules = self.ruleset
+        base_function = rules.function_descriptions.get(category, rules.default_function_description)
         
         # Enhanced descriptions based on additive classes
-        if "colour" in additives_classes or "color" in additives_classes:
-            if "natural" in additives_classes:
-                base_function = "natural food coloring derived from plants or minerals"
-            elif "synthetic" in additives_classes or "artificial" in additives_classes:
-                base_function = "artificial food coloring"
-            else:
-                base_function = "food coloring agent"
-                
-        elif "preservative" in additives_classes:
-            if "natural" in additives_classes:
-                base_function = "natural preservative to extend shelf life"
-            else:
-                base_function = "preservative to prevent spoilage and extend shelf life"
-                
-        elif "antioxidant" in additives_classes:
-            if "vitamin" in additives_classes:
-                base_function = "vitamin with antioxidant properties"
-            elif "natural" in additives_classes:
-                base_function = "natural antioxidant to prevent rancidity"
-            else:
-                base_function = "antioxidant to prevent oxidation and rancidity"
-                
-        elif "sweetener" in additives_classes:
-            if "artificial" in additives_classes:
-                base_function = "artificial sweetener with high sweetening power"
-            elif "natural" in additives_classes:
-                base_function = "natural sweetening agent"
-            else:
-                base_function = "sweetening agent"
-                
-        elif "emulsifier" in additives_classes:
-            base_function = "emulsifier to help mix oil and water-based ingredients"
-            
-        elif "stabilizer" in additives_classes or "stabiliser" in additives_classes:
-            base_function = "stabilizer to maintain food texture and consistency"
-            
-        elif "thickener" in additives_classes or "thickening" in additives_classes:
-            base_function = "thickening agent to increase viscosity"
-            
-        elif "flavour" in additives_classes or "flavor" in additives_classes:
-            if "enhancer" in additives_classes:
-                base_function = "flavor enhancer to intensify taste"
-            else:
-                base_function = "flavoring agent"
-                
-        elif "acid" in additives_classes:
-            base_function = "acidity regulator to control pH levels"
-            
-        # Build comprehensive description
-        description_parts = []
+        for keywords, refinements, fallback in rules.base_function_rules:
+            if any(keyword in additives_classes for keyword in keywords):
+                base_function = fallback
+                for refining_keywords, refined in refinements:
+                    if any(keyword in additives_classes for keyword in refining_keywords):
+                        base_function = refined
+                        break
+                break
         
-        # Add the main function
-        description_parts.append(f"{name} ({e_number}) is a {base_function}")
+        # Build comprehensive description
+        description_parts = [base_function]
         
         # Add safety/risk information
-        risk_descriptions = {
-            "GREEN": "considered safe with no known health concerns",
-            "YELLOW": "generally safe but may have some limitations or sensitivities", 
-            "ORANGE": "has some documented health concerns or restrictions",
-            "RED": "has significant health concerns and should be consumed with caution"
-        }
-        
-        if risk_level in risk_descriptions:
-            description_parts.append(f"It is {risk_descriptions[risk_level]}")
+        if risk_level in rules.risk_descriptions:
+            description_parts.append(f"It is {rules.risk_descriptions[risk_level]}")
         
         # Add dietary information
         dietary_info = []
@@ -456,81 +599,18 @@ class AdditivesSQLiteCreator:
         elif efsa_evaluation and efsa_evaluation not in ["", "unknown"]:
             description_parts.append(f"EFSA evaluation: {efsa_evaluation}")
         
-        # Add specific usage information for common additives
-        specific_usage = self.get_specific_usage_info(e_number, name.lower())
-        if specific_usage:
-            description_parts.append(specific_usage)
-        
-        return ". ".join(description_parts) + "."
+        return ". ".join(description_parts)
     
     def get_specific_usage_info(self, e_number: str, name: str) -> str:
         """Get specific usage information for well-known additives."""
-        specific_info = {
-            "E100": "Commonly used in curry powders, mustard, and dairy products for its golden yellow color",
-            "E101": "Essential B-vitamin naturally found in milk, eggs, and green vegetables",
-            "E102": "Bright yellow synthetic dye often used in confectionery and beverages",
-            "E104": "Yellow synthetic dye used in processed foods and cosmetics",
-            "E110": "Orange-yellow synthetic dye commonly found in orange-flavored products",
-            "E120": "Natural red dye derived from cochineal insects, used in cosmetics and foods",
-            "E122": "Synthetic red dye used in confectionery, beverages, and desserts",
-            "E124": "Synthetic red dye commonly used in processed foods and beverages",
-            "E129": "Synthetic orange-red dye used in confectionery and beverages",
-            "E131": "Synthetic blue dye used in confectionery and beverages",
-            "E132": "Synthetic blue dye commonly used in processed foods",
-            "E133": "Synthetic blue dye used in confectionery, beverages, and cosmetics",
-            "E140": "Natural green pigment derived from plants, used in food coloring",
-            "E150": "Brown coloring made from heated sugars, commonly used in cola drinks",
-            "E160a": "Natural orange pigment from carrots and other plants",
-            "E160c": "Natural red-orange pigment from paprika",
-            "E162": "Natural purple-red pigment from beetroot",
-            "E163": "Natural purple pigment from grapes and berries",
-            "E200": "Natural preservative found in berries, used to prevent mold and yeast growth",
-            "E202": "Synthetic preservative commonly used in baked goods and beverages",
-            "E210": "Synthetic preservative used in pickled foods and beverages",
-            "E211": "Synthetic preservative commonly used in soft drinks and acidic foods",
-            "E220": "Preservative and antioxidant used in dried fruits and wine",
-            "E249": "Preservative used primarily in processed meats to prevent botulism",
-            "E250": "Preservative used in cured meats to maintain color and prevent bacteria",
-            "E300": "Vitamin C, essential nutrient and powerful antioxidant",
-            "E301": "Sodium salt of Vitamin C, used as antioxidant and preservative",
-            "E306": "Natural Vitamin E, powerful antioxidant found in vegetable oils",
-            "E330": "Natural acid found in citrus fruits, used as preservative and flavor enhancer",
-            "E407": "Natural thickener derived from seaweed, used in dairy products",
-            "E412": "Natural thickener from guar beans, used in gluten-free products",
-            "E414": "Natural thickener from acacia trees, used in confectionery",
-            "E415": "Thickener produced by fermentation, used in gluten-free baking",
-            "E420": "Natural sugar alcohol used as sweetener and humectant",
-            "E421": "Natural sugar alcohol found in fruits, used as sweetener",
-            "E440": "Natural thickener from fruits, used in jams and jellies",
-            "E471": "Emulsifier derived from plant or animal fats, used in baked goods",
-            "E500": "Baking soda, natural mineral used as raising agent",
-            "E621": "Flavor enhancer naturally found in seaweed and aged cheeses",
-            "E950": "Artificial sweetener 200 times sweeter than sugar",
-            "E951": "Artificial sweetener 200 times sweeter than sugar, contains phenylalanine",
-            "E952": "Artificial sweetener used in sugar-free products",
-            "E954": "Artificial sweetener 300 times sweeter than sugar",
-            "E955": "Artificial sweetener 600 times sweeter than sugar"
-        }
-        
         # Check by E-number first
-        if e_number in specific_info:
-            return specific_info[e_number]
+        if e_number in self.ruleset.specific_usage_info:
+            return self.ruleset.specific_usage_info[e_number]
         
         # Check by name patterns
-        if "curcumin" in name:
-            return "Commonly used in curry powders, mustard, and dairy products for its golden yellow color"
-        elif "riboflavin" in name:
-            return "Essential B-vitamin naturally found in milk, eggs, and green vegetables"
-        elif "ascorbic" in name:
-            return "Essential vitamin and powerful antioxidant naturally found in citrus fruits"
-        elif "citric" in name:
-            return "Natural acid found in citrus fruits, widely used as preservative and flavor enhancer"
-        elif "lecithin" in name:
-            return "Natural emulsifier found in egg yolks and soybeans, used in chocolate and baked goods"
-        elif "pectin" in name:
-            return "Natural thickener found in fruits, commonly used in jams and jellies"
-        elif "gellan" in name:
-            return "Thickener produced by fermentation, used in plant-based milk alternatives"
+        for pattern, usage in self.ruleset.name_usage_patterns:
+            if pattern in name:
+                return usage
         
         return ""
     
@@ -545,15 +625,16 @@ class AdditivesSQLiteCreator:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Create main additives table
-        cursor.execute('''
+        # Create main additives table; the constraints mirror the load-time RowValidator rules
+        risk_colors = " ".join(f"WHEN '{level}' THEN '{color}'" for level, color in RISK_COLORS.items())
+        cursor.execute(f'''
         CREATE TABLE additives (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            taxonomy_id TEXT UNIQUE NOT NULL,
-            e_number TEXT NOT NULL,
-            name TEXT NOT NULL,
-            risk_level TEXT NOT NULL,
-            risk_color TEXT NOT NULL,
+            taxonomy_id TEXT UNIQUE NOT NULL CHECK (taxonomy_id <> ''),
+            e_number TEXT NOT NULL CHECK (e_number <> ''),
+            name TEXT NOT NULL CHECK (name <> ''),
+            risk_level TEXT NOT NULL CHECK (risk_level IN ({", ".join(f"'{level}'" for level in RISK_COLORS)})),
+            risk_color TEXT NOT NULL CHECK (risk_color = CASE risk_level {risk_colors} END),
             category TEXT,
             description TEXT,
             vegetarian TEXT,
@@ -564,16 +645,137 @@ class AdditivesSQLiteCreator:
             additives_classes TEXT,
             sources TEXT,
             last_updated TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            e_key TEXT NOT NULL DEFAULT '',
+            e_variant TEXT NOT NULL DEFAULT '',
+            content_hash TEXT NOT NULL DEFAULT '',
+            revision INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (e_key, e_variant)
         )
         ''')
         
-        # Create indexes for better performance in KMP
-        cursor.execute('CREATE INDEX idx_taxonomy_id ON additives(taxonomy_id)')
-        cursor.execute('CREATE INDEX idx_e_number ON additives(e_number)')
-        cursor.execute('CREATE INDEX idx_risk_level ON additives(risk_level)')
-        cursor.execute('CREATE INDEX idx_category ON additives(category)')
-        cursor.execute('CREATE INDEX idx_name_en ON additives(name)')
+        # Tombstones for additives removed by incremental updates, so clients can sync deletes
+        cursor.execute('''
+        CREATE TABLE deleted_additives (
+            taxonomy_id TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        
+        # Every known spelling (folded: lowercase alphanumerics) -> normalized E-number key
+        cursor.execute('''
+        CREATE TABLE e_number_aliases (
+            alias TEXT PRIMARY KEY,
+            e_key TEXT NOT NULL,
+            e_variant TEXT NOT NULL,
+            kind TEXT NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        
+        # Names and descriptions per language (filled from locale shards with --languages)
+        cursor.execute('''
+        CREATE TABLE localized_names (
+            additive_id INTEGER NOT NULL REFERENCES additives(id),
+            lang TEXT NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            PRIMARY KEY (additive_id, lang)
+        ) WITHOUT ROWID
+        ''')
+        
+        # Class dimension (one row per additives_classes tag) and the additive <-> class links
+        cursor.execute('''
+        CREATE TABLE classes (
+            id INTEGER PRIMARY KEY,
+            tag TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE additive_classes (
+            additive_id INTEGER NOT NULL REFERENCES additives(id),
+            class_id INTEGER NOT NULL REFERENCES classes(id),
+            position INTEGER NOT NULL,
+            PRIMARY KEY (additive_id, class_id)
+        ) WITHOUT ROWID
+        ''')
+        
+        # Precomputed aggregates for dashboards and statistics (rebuilt by refresh_stats)
+        cursor.execute('''
+        CREATE TABLE risk_stats (
+            risk_level TEXT PRIMARY KEY,
+            risk_color TEXT NOT NULL,
+            count INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE category_risk_stats (
+            category TEXT NOT NULL,
+            risk_level TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (category, risk_level)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE diet_stats (
+            diet TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (diet, status)
+        ) WITHOUT ROWID
+        ''')
+        
+        # Merged sources and the source each field of an additive was taken from
+        cursor.execute('''
+        CREATE TABLE sources (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE field_sources (
+            additive_id INTEGER NOT NULL REFERENCES additives(id),
+            field TEXT NOT NULL,
+            source_id INTEGER NOT NULL REFERENCES sources(id),
+            PRIMARY KEY (additive_id, field)
+        ) WITHOUT ROWID
+        ''')
+        
+        # Word-level Aho-Corasick automaton over every taxonomy name (see synonym_index):
+        # one row per trie edge, with the target state's failure link and additive
+        cursor.execute('''
+        CREATE TABLE synonym_words (
+            word TEXT PRIMARY KEY,
+            id INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE synonym_trie (
+            parent INTEGER NOT NULL,
+            word_id INTEGER NOT NULL,
+            state INTEGER NOT NULL,
+            fail INTEGER NOT NULL,
+            additive_id INTEGER REFERENCES additives(id),
+            PRIMARY KEY (parent, word_id)
+        ) WITHOUT ROWID
+        ''')
+        
+        # Secondary indexes are created by create_indexes() after the bulk load
+        
+        # Full-text search index over the searchable text columns (external content,
+        # populated and kept in sync by create_search_index() after the bulk load)
+        try:
+            cursor.execute(f'''
+            CREATE VIRTUAL TABLE additives_fts USING fts5(
+                name, description, additives_classes, e_number,
+                content='additives', content_rowid='id',
+                prefix='2 3',
+                tokenize='{FTS_TOKENIZERS[self.fts_tokenizer]}'
+            )
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, skipping full-text search index: {e}")
         
         # Create metadata table for versioning
         cursor.execute('''
@@ -590,6 +792,7 @@ class AdditivesSQLiteCreator:
         ('version', '1.0'),
         ('created_date', ?),
         ('total_additives', '0'),
+        ('revision', '0'),
         ('data_sources', 'Open Food Facts, Manual')
         ''', (datetime.now().isoformat(),))
         
@@ -597,14 +800,60 @@ class AdditivesSQLiteCreator:
         conn.close()
         logger.info("Database schema created successfully")
     
-    def insert_additives_data(self, additives_list: List[Dict[str, Any]]):
-        """Insert additives data into the database."""
-        logger.info(f"Inserting {len(additives_list)} additives into database...")
+    def create_indexes(self, cursor: sqlite3.Cursor):
+        """Create secondary indexes for better performance in KMP."""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_taxonomy_id ON additives(taxonomy_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_e_number ON additives(e_number)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_risk_level ON additives(risk_level)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_category ON additives(category)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_name_en ON additives(name)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_revision ON additives(revision)')
+        # Covering index for ingredient scans: lookups by normalized key never touch the table
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_e_key_scan
+        ON additives(e_key, e_variant, name, risk_level, risk_color, category)
+        ''')
+        # Class joins from either side: additive -> classes is the primary key
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_additive_classes_class ON additive_classes(class_id, additive_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_classes_category ON classes(category)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_field_sources_source ON field_sources(source_id, field)')
+    
+    def create_search_index(self, cursor: sqlite3.Cursor):
+        """Populate the FTS5 index from the loaded rows and keep it in sync with triggers."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='additives_fts'")
+        if not cursor.fetchone():
+            return
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor.execute("INSERT INTO additives_fts(additives_fts) VALUES('rebuild')")
         
-        inserted_count = 0
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS additives_fts_insert AFTER INSERT ON additives BEGIN
+            INSERT INTO additives_fts(rowid, name, description, additives_classes, e_number)
+            VALUES (new.id, new.name, new.description, new.additives_classes, new.e_number);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS additives_fts_delete AFTER DELETE ON additives BEGIN
+            INSERT INTO additives_fts(additives_fts, rowid, name, description, additives_classes, e_number)
+            VALUES ('delete', old.id, old.name, old.description, old.additives_classes, old.e_number);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS additives_fts_update AFTER UPDATE ON additives BEGIN
+            INSERT INTO additives_fts(additives_fts, rowid, name, description, additives_classes, e_number)
+            VALUES ('delete', old.id, old.name, old.description, old.additives_classes, old.e_number);
+            INSERT INTO additives_fts(rowid, name, description, additives_classes, e_number)
+            VALUES (new.id, new.name, new.description, new.additives_classes, new.e_number);
+        END
+        ''')
+    
+    def build_additive_rows(self, additives_list: List[Dict[str, Any]],
+                            validator: Optional[RowValidator] = None) -> List[tuple]:
+        """
+        Classify, categorize and describe additives into insert-ready row tuples.
+        With a validator, each row is checked as it is built and only rows that pass are kept.
+        """
+        rows = []
         error_count = 0
         
         for additive in additives_list:
@@ -618,14 +867,7 @@ class AdditivesSQLiteCreator:
                 # Create comprehensive description
                 description = self.create_detailed_description(additive, risk_level, category)
                 
-                cursor.execute('''
-                INSERT OR REPLACE INTO additives (
-                    taxonomy_id, e_number, name, risk_level, risk_color,
-                    category, description, vegetarian, vegan,
-                    efsa_evaluation, efsa_url, efsa_date, additives_classes,
-                    sources, last_updated
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
+                row = (
                     additive.get('taxonomy_id', f"manual_{additive['e_number']}"),
                     additive['e_number'],
                     additive['name'],
@@ -640,28 +882,419 @@ class AdditivesSQLiteCreator:
                     additive.get('efsa_date', ''),
                     additive.get('additives_classes', ''),
                     additive.get('source', ''),
-                    additive.get('last_updated', datetime.now().isoformat())
-                ))
-                
-                inserted_count += 1
+                    additive.get('last_updated', datetime.now().isoformat()),
+                    *additive_e_key(additive)
+                )
+                if validator is None or validator.check(row):
+                    rows.append(row)
                 
             except Exception as e:
-                logger.error(f"Error inserting additive {additive.get('e_number', 'Unknown')}: {e}")
+                logger.error(f"Error preparing additive {additive.get('e_number', 'Unknown')}: {e}")
                 error_count += 1
                 continue
         
-        # Update metadata
+        if error_count > 0:
+            logger.warning(f"Failed to prepare {error_count} additives")
+        
+        cache = self.description_template.cache_info()
+        logger.info(f"Description templates: {cache.currsize} cached, {cache.hits} hits, {cache.misses} misses")
+        
+        return rows
+    
+    def build_rows(self, additives_list: List[Dict[str, Any]]) -> List[tuple]:
+        """
+        Build insert-ready row tuples with the configured (row-wise or columnar) builder.
+        Row-wise, each row is validated as it is built; the columnar builder produces all
+        rows at once, so they are validated right after. Rows with errors are left out,
+        and the violations are in self.validation_report.
+        """
+        validator = RowValidator()
+        if self.columnar:
+            # Imported lazily so pandas is only required for the columnar mode
+            import columnar_build
+            rows = columnar_build.build_additive_rows(additives_list, self.risk_classifier, self.ruleset)
+            rows = list(validator.filter(rows))
+        else:
+            rows = self.build_additive_rows(additives_list, validator)
+        
+        self.validation_report = validator.report
+        report = validator.report
+        if report.counts:
+            log = logger.error if report.errors else logger.warning
+            log(f"Validation: {report.errors} errors, {report.warnings} warnings in {report.rows_checked} rows "
+                f"({report.rows_rejected} rejected)\n{report.summary()}")
+        return rows
+    
+    def build_alias_rows(self, rows: List[tuple]) -> List[tuple]:
+        """
+        Precompute (alias, e_key, e_variant, kind) rows for every known spelling.
+        E-number spellings come first, then names; base E-numbers win name conflicts.
+        """
+        keys = sorted({(row[15], row[16]) for row in rows}, key=lambda key: (key[1] != "", key))
+        alias_rows = [
+            (alias, e_key, e_variant, "e_number")
+            for e_key, e_variant in keys
+            for alias in e_number_aliases(e_key, e_variant)
+        ]
+        for row in sorted(rows, key=lambda row: (row[16] != "", row[15], row[16])):
+            alias = name_alias(row[2])
+            if alias:
+                alias_rows.append((alias, row[15], row[16], "name"))
+        return alias_rows
+    
+    def write_additive_classes(self, cursor: sqlite3.Cursor, rows: List[tuple]):
+        """
+        Rebuild the classes and additive_classes tables from the additives_classes
+        column of rows (already in the additives table). Class ids stay stable across
+        incremental builds; classes no longer used by any additive are removed.
+        """
+        labels = load_class_labels(self.related_snapshots.get("additives_classes", {}).get("path"))
+        class_rows, links = build_class_rows(rows, self.ruleset, labels)
+        
+        cursor.executemany("INSERT OR IGNORE INTO classes (tag, name, category) VALUES (?, ?, ?)", class_rows)
+        if labels:
+            cursor.executemany("UPDATE classes SET name = ?, category = ? WHERE tag = ?",
+                               [(name, category, tag) for tag, name, category in class_rows])
+        else:
+            # Keep labels from an earlier build that had the additives_classes taxonomy
+            cursor.executemany("UPDATE classes SET category = ? WHERE tag = ?",
+                               [(category, tag) for tag, _, category in class_rows])
+        
+        class_ids = dict(cursor.execute("SELECT tag, id FROM classes"))
+        additive_ids = dict(cursor.execute("SELECT taxonomy_id, id FROM additives"))
+        cursor.execute("DELETE FROM additive_classes")
+        cursor.executemany(
+            "INSERT INTO additive_classes (additive_id, class_id, position) VALUES (?, ?, ?)",
+            [(additive_ids[taxonomy_id], class_ids[tag], position)
+             for taxonomy_id, tag, position in links if taxonomy_id in additive_ids]
+        )
+        cursor.execute("DELETE FROM classes WHERE id NOT IN (SELECT class_id FROM additive_classes)")
+        logger.info(f"Linked {len(links)} additive classes ({len(class_rows)} distinct)")
+    
+    def write_field_sources(self, cursor: sqlite3.Cursor, additives_list: List[Dict[str, Any]]):
+        """
+        Rebuild the field_sources provenance table from the field_sources of merged
+        additives (see merge_sources), and the data_sources metadata from the sources used.
+        """
+        names = list(dict.fromkeys(
+            source for additive in additives_list for source in additive.get("field_sources", {}).values()
+        ))
+        cursor.executemany("INSERT OR IGNORE INTO sources (name) VALUES (?)", [(name,) for name in names])
+        source_ids = dict(cursor.execute("SELECT name, id FROM sources"))
+        additive_ids = dict(cursor.execute("SELECT taxonomy_id, id FROM additives"))
+        cursor.execute("DELETE FROM field_sources")
+        cursor.executemany(
+            "INSERT INTO field_sources (additive_id, field, source_id) VALUES (?, ?, ?)",
+            [(additive_ids[additive["taxonomy_id"]], field, source_ids[source])
+             for additive in additives_list if additive.get("taxonomy_id") in additive_ids
+             for field, source in additive.get("field_sources", {}).items()]
+        )
+        cursor.execute("DELETE FROM sources WHERE id NOT IN (SELECT source_id FROM field_sources)")
+        if names:
+            cursor.execute(
+                '''
+                UPDATE metadata SET value = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE key = 'data_sources' AND value IS NOT ?
+                ''', (", ".join(names),) * 2
+            )
+    
+    def write_synonym_index(self, cursor: sqlite3.Cursor, additives_list: List[Dict[str, Any]]):
+        """Rebuild the synonym_words and synonym_trie tables from the names of the loaded additives."""
+        additive_ids = dict(cursor.execute("SELECT taxonomy_id, id FROM additives"))
+        automaton = build_synonym_automaton(additives_list, additive_ids)
+        word_rows, trie_rows = automaton.rows()
+        cursor.execute("DELETE FROM synonym_words")
+        cursor.execute("DELETE FROM synonym_trie")
+        cursor.executemany("INSERT INTO synonym_words (word, id) VALUES (?, ?)", word_rows)
+        cursor.executemany(
+            "INSERT INTO synonym_trie (parent, word_id, state, fail, additive_id) VALUES (?, ?, ?, ?, ?)",
+            trie_rows
+        )
+        logger.info(f"Synonym index: {len(word_rows)} words, {automaton.state_count} states")
+    
+    def refresh_stats(self, cursor: sqlite3.Cursor):
+        """
+        Recompute the aggregate tables (risk_stats, category_risk_stats, diet_stats)
+        from the additives table, so statistics never scan it at query time.
+        """
+        cursor.execute("DELETE FROM risk_stats")
         cursor.execute('''
-        UPDATE metadata SET value = ?, updated_at = CURRENT_TIMESTAMP 
-        WHERE key = 'total_additives'
-        ''', (str(inserted_count),))
+        INSERT INTO risk_stats (risk_level, risk_color, count)
+        SELECT risk_level, MIN(risk_color), COUNT(*) FROM additives GROUP BY risk_level
+        ''')
+        cursor.execute("DELETE FROM category_risk_stats")
+        cursor.execute('''
+        INSERT INTO category_risk_stats (category, risk_level, count)
+        SELECT COALESCE(category, ''), risk_level, COUNT(*) FROM additives GROUP BY 1, 2
+        ''')
+        cursor.execute("DELETE FROM diet_stats")
+        cursor.execute('''
+        INSERT INTO diet_stats (diet, status, count)
+        SELECT 'vegetarian', COALESCE(vegetarian, ''), COUNT(*) FROM additives GROUP BY 2
+        UNION ALL
+        SELECT 'vegan', COALESCE(vegan, ''), COUNT(*) FROM additives GROUP BY 2
+        ''')
+    
+    def read_tombstones(self) -> Dict[str, int]:
+        """
+        Tombstones a full rebuild must keep: those of the existing database, plus
+        each of its additives at the new revision (dropped again if the additive is
+        still there). Empty without an existing database.
+        """
+        if not os.path.exists(self.db_path):
+            return {}
         
-        conn.commit()
-        conn.close()
+        tombstones: Dict[str, int] = {}
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+                if "deleted_additives" in tables:
+                    tombstones.update(conn.execute("SELECT taxonomy_id, revision FROM deleted_additives"))
+                if "additives" in tables:
+                    tombstones.update((taxonomy_id, self.revision)
+                                      for taxonomy_id, in conn.execute("SELECT taxonomy_id FROM additives"))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read the additives of {self.db_path}: {e}")
+        return tombstones
+    
+    def insert_additives_data(self, additives_list: List[Dict[str, Any]], rows: Optional[List[tuple]] = None,
+                              tombstones: Optional[Dict[str, int]] = None):
+        """
+        Bulk-load additives data into the database.
+        All rows are inserted with a single executemany in one transaction with
+        journaling and syncing disabled, and secondary indexes are built afterwards.
+        Pass rows (from build_rows) to load rows that were already built, and the
+        tombstones of the replaced database (see read_tombstones) so clients syncing
+        by revision also learn about the additives this build removed.
+        """
+        logger.info(f"Inserting {len(additives_list)} additives into database...")
         
-        logger.info(f"Successfully inserted {inserted_count} additives")
-        if error_count > 0:
-            logger.warning(f"Failed to insert {error_count} additives")
+        if rows is None:
+            rows = self.build_rows(additives_list)
+        
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        cursor = conn.cursor()
+        
+        # Build-time pragmas: the file is rebuilt from scratch, so a crash only loses the build
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        
+        try:
+            cursor.execute("BEGIN")
+            cursor.executemany('''
+            INSERT OR REPLACE INTO additives (
+                taxonomy_id, e_number, name, risk_level, risk_color,
+                category, description, vegetarian, vegan,
+                efsa_evaluation, efsa_url, efsa_date, additives_classes,
+                sources, last_updated, e_key, e_variant, content_hash, revision
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [row + (row_content_hash(row), self.revision) for row in rows])
+            
+            if tombstones:
+                loaded = {row[0] for row in rows}
+                cursor.executemany(
+                    "INSERT INTO deleted_additives (taxonomy_id, revision) VALUES (?, ?)",
+                    [(taxonomy_id, revision) for taxonomy_id, revision in tombstones.items()
+                     if taxonomy_id not in loaded]
+                )
+            
+            cursor.executemany(
+                "INSERT OR IGNORE INTO e_number_aliases (alias, e_key, e_variant, kind) VALUES (?, ?, ?, ?)",
+                self.build_alias_rows(rows)
+            )
+            self.write_additive_classes(cursor, rows)
+            self.write_field_sources(cursor, additives_list)
+            self.write_synonym_index(cursor, additives_list)
+            self.refresh_stats(cursor)
+            
+            # Update metadata
+            cursor.execute('''
+            UPDATE metadata SET value = ?, updated_at = CURRENT_TIMESTAMP 
+            WHERE key = 'total_additives'
+            ''', (str(len(rows)),))
+            cursor.execute(
+                "UPDATE metadata SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = 'revision'",
+                (str(self.revision),)
+            )
+            
+            self.create_indexes(cursor)
+            self.create_search_index(cursor)
+            cursor.execute("COMMIT")
+            
+            # Ship the file with default durability settings
+            cursor.execute("PRAGMA journal_mode=DELETE")
+            cursor.execute("PRAGMA synchronous=FULL")
+        finally:
+            # No ROLLBACK without a journal: a failed load is discarded with the build
+            conn.close()
+        
+        logger.info(f"Successfully inserted {len(rows)} additives")
+    
+    def has_incremental_schema(self) -> bool:
+        """Whether the existing database can be updated in place (has content hashes and revisions)."""
+        if not os.path.exists(self.db_path):
+            return False
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(additives)")}
+                tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+                return ({"content_hash", "revision"} <= columns
+                        and {"deleted_additives", "classes", "additive_classes", "risk_stats", "field_sources",
+                             "synonym_trie"} <= tables)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not inspect {self.db_path}: {e}")
+            return False
+    
+    def upsert_additives_data(self, additives_list: List[Dict[str, Any]], rows: Optional[List[tuple]] = None):
+        """
+        Incrementally apply additives data to the existing database.
+        Rows are matched on taxonomy_id and compared by content hash; only new,
+        changed and removed additives are written, so unchanged rows keep their
+        id, created_at and revision. Written rows and tombstones get the new revision;
+        when nothing changed, self.revision stays at the database's revision.
+        Pass rows (from build_rows) to apply rows that were already built.
+        """
+        logger.info(f"Diffing {len(additives_list)} additives against {self.db_path}...")
+        
+        if rows is None:
+            rows = self.build_rows(additives_list)
+        new_rows = {row[0]: row for row in rows}
+        
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        cursor = conn.cursor()
+        
+        try:
+            existing = dict(cursor.execute("SELECT taxonomy_id, content_hash FROM additives"))
+            
+            inserts, updates = [], []
+            for taxonomy_id, row in new_rows.items():
+                content_hash = row_content_hash(row)
+                if taxonomy_id not in existing:
+                    inserts.append(row + (content_hash,))
+                elif existing[taxonomy_id] != content_hash:
+                    updates.append(row + (content_hash,))
+            deletes = [(taxonomy_id,) for taxonomy_id in existing if taxonomy_id not in new_rows]
+            
+            # Only a change gets a new revision
+            if not (inserts or updates or deletes):
+                current, = cursor.execute("SELECT value FROM metadata WHERE key = 'revision'").fetchone() or ("0",)
+                self.revision = int(current or 0)
+            inserts = [row + (self.revision,) for row in inserts]
+            updates = [row[1:] + (self.revision, row[0]) for row in updates]
+            
+            cursor.execute("BEGIN")
+            try:
+                # Deletes and updates first, so an E-number freed by them can be reused by an insert
+                if deletes:
+                    cursor.executemany('''
+                    DELETE FROM localized_names
+                    WHERE additive_id = (SELECT id FROM additives WHERE taxonomy_id = ?)
+                    ''', deletes)
+                    cursor.executemany("DELETE FROM additives WHERE taxonomy_id = ?", deletes)
+                    cursor.executemany(
+                        "INSERT OR REPLACE INTO deleted_additives (taxonomy_id, revision) VALUES (?, ?)",
+                        [(taxonomy_id, self.revision) for taxonomy_id, in deletes]
+                    )
+                
+                if updates:
+                    cursor.executemany('''
+                    UPDATE additives SET
+                        e_number = ?, name = ?, risk_level = ?, risk_color = ?,
+                        category = ?, description = ?, vegetarian = ?, vegan = ?,
+                        efsa_evaluation = ?, efsa_url = ?, efsa_date = ?, additives_classes = ?,
+                        sources = ?, last_updated = ?, e_key = ?, e_variant = ?,
+                        content_hash = ?, revision = ?
+                    WHERE taxonomy_id = ?
+                    ''', updates)
+                
+                if inserts:
+                    cursor.executemany('''
+                    INSERT INTO additives (
+                        taxonomy_id, e_number, name, risk_level, risk_color,
+                        category, description, vegetarian, vegan,
+                        efsa_evaluation, efsa_url, efsa_date, additives_classes,
+                        sources, last_updated, e_key, e_variant, content_hash, revision
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', inserts)
+                    # Re-added additives are no longer deleted
+                    cursor.executemany("DELETE FROM deleted_additives WHERE taxonomy_id = ?",
+                                       [(row[0],) for row in inserts])
+                
+                if inserts or updates or deletes:
+                    cursor.execute(
+                        "UPDATE metadata SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = 'revision'",
+                        (str(self.revision),)
+                    )
+                
+                # Aliases and localized names are derived data: rebuild them rather than
+                # diffing (localized names and their aliases are merged back in afterwards)
+                cursor.execute("DELETE FROM e_number_aliases")
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO e_number_aliases (alias, e_key, e_variant, kind) VALUES (?, ?, ?, ?)",
+                    self.build_alias_rows(list(new_rows.values()))
+                )
+                self.write_additive_classes(cursor, list(new_rows.values()))
+                self.write_field_sources(cursor, additives_list)
+                self.write_synonym_index(cursor, additives_list)
+                self.refresh_stats(cursor)
+                cursor.execute("DELETE FROM localized_names")
+                
+                cursor.execute('''
+                UPDATE metadata SET value = ?, updated_at = CURRENT_TIMESTAMP 
+                WHERE key = 'total_additives'
+                ''', (str(len(new_rows)),))
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        
+        if inserts or updates or deletes:
+            logger.info(f"Incremental update to revision {self.revision}: {len(inserts)} inserted, "
+                        f"{len(updates)} updated, {len(deletes)} deleted")
+        else:
+            logger.info(f"Incremental update: no additives changed (revision {self.revision})")
+    
+    def insert_localized_data(self, additives_list: List[Dict[str, Any]], load: Optional[Any] = None):
+        """
+        Insert additives and build localized names in parallel.
+        Each language is processed into a locale shard by a worker process while the
+        main table is loaded here (with load, default insert_additives_data); the
+        shards are then merged into localized_names.
+        """
+        # Imported lazily, like the columnar mode (concurrent.futures included)
+        import localized_build
+        from concurrent.futures import ProcessPoolExecutor
+        
+        languages = localized_build.locale_languages(additives_list, self.languages)
+        logger.info(f"Building {len(languages)} locale shards: {', '.join(languages)}")
+        
+        futures = []
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = localized_build.submit_locale_shards(
+                    executor, self.db_path, additives_list, languages, self.risk_classifier, self.ruleset
+                )
+                (load or self.insert_additives_data)(additives_list)
+                shards = [future.result() for future in futures]
+            
+            for lang, _, count in shards:
+                logger.info(f"  {lang}: {count} localized names")
+            total = localized_build.merge_locale_shards(self.db_path, [path for _, path, _ in shards])
+            logger.info(f"Merged {total} localized names from {len(shards)} locale shards")
+        finally:
+            for lang in languages:
+                path = localized_build.shard_path(self.db_path, lang)
+                if os.path.exists(path):
+                    os.remove(path)
     
     def generate_statistics(self):
         """Generate and display database statistics."""
@@ -671,33 +1304,28 @@ class AdditivesSQLiteCreator:
         cursor = conn.cursor()
         
         # Total count
-        cursor.execute("SELECT COUNT(*) FROM additives")
+        # Read from the precomputed aggregate tables (see refresh_stats)
+        cursor.execute("SELECT COALESCE(SUM(count), 0) FROM risk_stats")
         total_count = cursor.fetchone()[0]
         
         # Risk level distribution
-        cursor.execute('''
-        SELECT risk_level, COUNT(*) 
-        FROM additives 
-        GROUP BY risk_level 
-        ORDER BY COUNT(*) DESC
-        ''')
+        cursor.execute("SELECT risk_level, count FROM risk_stats ORDER BY count DESC")
         risk_distribution = cursor.fetchall()
         
         # Category distribution
         cursor.execute('''
-        SELECT category, COUNT(*) 
-        FROM additives 
+        SELECT category, SUM(count) 
+        FROM category_risk_stats 
         GROUP BY category 
-        ORDER BY COUNT(*) DESC
+        ORDER BY SUM(count) DESC
         ''')
         category_distribution = cursor.fetchall()
         
         # Vegetarian/Vegan stats
-        cursor.execute("SELECT COUNT(*) FROM additives WHERE vegetarian = 'yes'")
-        vegetarian_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM additives WHERE vegan = 'yes'")
-        vegan_count = cursor.fetchone()[0]
+        cursor.execute("SELECT diet, count FROM diet_stats WHERE status = 'yes'")
+        diet_counts = dict(cursor.fetchall())
+        vegetarian_count = diet_counts.get("vegetarian", 0)
+        vegan_count = diet_counts.get("vegan", 0)
         
         conn.close()
         
@@ -733,10 +1361,12 @@ FROM additives
 WHERE risk_color = 'red' 
 ORDER BY e_number;
 
--- 2. Search for additives by name (case-insensitive)
-SELECT e_number, name, risk_level
-FROM additives 
-WHERE LOWER(name) LIKE LOWER('%curcumin%');
+-- 2. Search for additives by name (ranked full-text search)
+SELECT a.e_number, a.name, a.risk_level
+FROM additives_fts 
+JOIN additives a ON a.id = additives_fts.rowid
+WHERE additives_fts MATCH 'curcumin'
+ORDER BY bm25(additives_fts, 10.0, 1.0, 2.0, 5.0);
 
 -- 3. Get vegetarian-friendly additives
 SELECT e_number, name, risk_level
@@ -744,9 +1374,9 @@ FROM additives
 WHERE vegetarian = 'yes' 
 ORDER BY risk_color, e_number;
 
--- 4. Get additives by category
-SELECT category, COUNT(*) as count
-FROM additives 
+-- 4. Get additives by category (precomputed category x risk counts)
+SELECT category, SUM(count) as count
+FROM category_risk_stats 
 GROUP BY category 
 ORDER BY count DESC;
 
@@ -756,26 +1386,131 @@ FROM additives
 WHERE efsa_evaluation != '' 
 ORDER BY e_number;
 
--- 6. Risk level summary
+-- 6. Risk level summary (precomputed)
 SELECT 
     risk_level,
     risk_color,
-    COUNT(*) as count,
-    ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM additives), 2) as percentage
-FROM additives 
-GROUP BY risk_level, risk_color 
+    count,
+    ROUND(count * 100.0 / (SELECT SUM(count) FROM risk_stats), 2) as percentage
+FROM risk_stats 
 ORDER BY count DESC;
 
--- 7. Search additives for ingredient scanning (by E-number)
-SELECT e_number, name, risk_level, risk_color
-FROM additives 
-WHERE e_number = ?;  -- Parameter for E-number lookup
+-- 7. Search additives for ingredient scanning (by E-number, any spelling)
+-- Fold the scanned text to lowercase alphanumerics first: 'E 160a (ii)' -> 'e160aii'
+SELECT a.e_key, a.e_variant, a.name, a.risk_level, a.risk_color, a.category
+FROM e_number_aliases x
+JOIN additives a ON a.e_key = x.e_key AND a.e_variant = x.e_variant
+WHERE x.alias = ?;  -- Parameter: folded E-number or name
 
 -- 8. Get all safe additives (Green)
 SELECT e_number, name, risk_level
 FROM additives 
 WHERE risk_color = 'green' 
 ORDER BY risk_level, e_number;
+
+-- 9. Search by taxonomy ID (exact match for variants)
+SELECT taxonomy_id, e_number, name, risk_level, risk_color
+FROM additives 
+WHERE taxonomy_id = ?;  -- Parameter for exact taxonomy lookup (e.g., 'en:e420i')
+
+-- 10. Get all variants of a specific E-number
+SELECT taxonomy_id, e_key, e_variant, name, risk_level, risk_color
+FROM additives 
+WHERE e_key = '420'  -- Shows E420, E420i, E420ii
+ORDER BY e_variant;
+
+-- 11. Compare risk levels within same E-number family
+SELECT 
+    e_number,
+    COUNT(*) as variant_count,
+    COUNT(DISTINCT risk_level) as different_risk_levels,
+    GROUP_CONCAT(DISTINCT risk_level) as risk_levels
+FROM additives 
+GROUP BY e_number 
+HAVING COUNT(*) > 1 AND COUNT(DISTINCT risk_level) > 1
+ORDER BY different_risk_levels DESC;
+
+-- 12. Find potentially risky variants within safe E-numbers
+SELECT 
+    a1.e_number,
+    a1.taxonomy_id as safe_variant,
+    a1.risk_level as safe_risk,
+    a2.taxonomy_id as risky_variant,
+    a2.risk_level as risky_risk
+FROM additives a1
+JOIN additives a2 ON a1.e_number = a2.e_number
+WHERE a1.risk_color = 'green' 
+  AND a2.risk_color IN ('orange', 'red')
+ORDER BY a1.e_number;
+
+-- 13. Search-as-you-type (prefix match on every term, best matches first)
+-- Quote each typed term and append *, e.g. 'tartra yell' -> '"tartra"* "yell"*'
+SELECT a.e_number, a.name, a.risk_level, a.risk_color
+FROM additives_fts 
+JOIN additives a ON a.id = additives_fts.rowid
+WHERE additives_fts MATCH ?  -- Parameter: prefix query
+ORDER BY bm25(additives_fts, 10.0, 1.0, 2.0, 5.0)
+LIMIT 20;
+
+-- 14. Ranked search across name, description and classes with highlighted names
+SELECT 
+    a.e_number,
+    highlight(additives_fts, 0, '[', ']') as name_match,
+    snippet(additives_fts, 1, '[', ']', '...', 12) as description_match,
+    a.risk_level
+FROM additives_fts 
+JOIN additives a ON a.id = additives_fts.rowid
+WHERE additives_fts MATCH ?  -- Parameter: search query
+ORDER BY bm25(additives_fts, 10.0, 1.0, 2.0, 5.0)
+LIMIT 20;
+
+-- 15. Additives with their names in the user's language (built with --languages)
+SELECT a.e_number, COALESCE(l.name, a.name) as name, COALESCE(l.description, a.description) as description,
+       a.risk_level, a.risk_color
+FROM additives a
+LEFT JOIN localized_names l ON l.additive_id = a.id AND l.lang = ?  -- Parameter: language code, e.g. 'de'
+ORDER BY a.e_number;
+
+-- 16. Localized name prefix search (uses idx_localized_lang_name)
+SELECT a.e_number, l.name, a.risk_level
+FROM localized_names l
+JOIN additives a ON a.id = l.additive_id
+WHERE l.lang = ? AND l.name >= ? AND l.name < ? || char(1114111)  -- Parameters: language, prefix, prefix
+ORDER BY l.name;
+
+-- 17. Sync: additives added or changed since the client's last revision
+SELECT * FROM additives
+WHERE revision > ?  -- Parameter: client's last synced revision (metadata 'revision')
+ORDER BY revision;
+
+-- 18. Sync: additives deleted since the client's last revision
+SELECT taxonomy_id FROM deleted_additives
+WHERE revision > ?;  -- Parameter: client's last synced revision
+
+-- 19. Additives having any class in a category (indexed joins, e.g. every stabiliser)
+SELECT a.e_number, a.name, a.risk_level, c.name as class_name
+FROM classes c
+JOIN additive_classes ac ON ac.class_id = c.id
+JOIN additives a ON a.id = ac.additive_id
+WHERE c.category = ?  -- Parameter: category, e.g. 'Stabilizers'
+ORDER BY a.e_key, a.e_variant;
+
+-- 20. Number of additives per class
+SELECT c.tag, c.name, c.category, COUNT(*) as count
+FROM additive_classes ac
+JOIN classes c ON c.id = ac.class_id
+GROUP BY ac.class_id
+ORDER BY count DESC;
+
+-- 21. Risk levels within each category (precomputed)
+SELECT category, risk_level, count
+FROM category_risk_stats
+ORDER BY category, risk_level;
+
+-- 22. Vegetarian/vegan status counts (precomputed)
+SELECT diet, status, count
+FROM diet_stats
+ORDER BY diet, count DESC;
         '''
         
         with open("sample_queries.sql", "w", encoding="utf-8") as f:
@@ -784,7 +1519,11 @@ ORDER BY risk_level, e_number;
         logger.info("Sample queries exported to sample_queries.sql")
     
     def validate_database(self):
-        """Validate the created database structure and data."""
+        """
+        Validate the created database structure and aggregates. Rows were validated
+        as they were built (see build_rows) and the schema constraints enforce the same
+        rules, so this does not rescan the additives for bad data.
+        """
         logger.info("Validating database...")
         
         conn = sqlite3.connect(self.db_path)
@@ -795,86 +1534,337 @@ ORDER BY risk_level, e_number;
         if not cursor.fetchone():
             raise Exception("Additives table not found!")
         
-        # Check for duplicate E-numbers
+        # Check the aggregate tables agree with the additives table
         cursor.execute('''
-        SELECT e_number, COUNT(*) 
-        FROM additives 
-        GROUP BY e_number 
-        HAVING COUNT(*) > 1
+        SELECT (SELECT COUNT(*) FROM additives),
+               (SELECT COALESCE(SUM(count), 0) FROM risk_stats),
+               (SELECT COALESCE(SUM(count), 0) FROM category_risk_stats)
         ''')
-        duplicates = cursor.fetchall()
-        if duplicates:
-            logger.warning(f"Found {len(duplicates)} duplicate E-numbers")
+        total, risk_total, category_total = cursor.fetchone()
+        if not total == risk_total == category_total:
+            logger.warning(f"Aggregate tables out of date: {total} additives, "
+                           f"risk_stats {risk_total}, category_risk_stats {category_total}")
         
-        # Check for missing required fields
-        cursor.execute("SELECT COUNT(*) FROM additives WHERE e_number = '' OR name = ''")
-        missing_required = cursor.fetchone()[0]
-        if missing_required > 0:
-            logger.warning(f"Found {missing_required} records with missing required fields")
+        conn.close()
+        logger.info("Database validation completed")
+    
+    def write_delta_patch(self, base_db: str) -> bool:
+        """Write and verify the delta patch from the previous database to the new one."""
+        # Imported lazily: only needed when shipping delta updates
+        import delta_patch
         
-        # Check risk level distribution
-        cursor.execute("SELECT DISTINCT risk_level FROM additives")
-        risk_levels = [row[0] for row in cursor.fetchall()]
-        expected_levels = ["GREEN", "YELLOW", "ORANGE", "RED"]
+        try:
+            path, header = delta_patch.write_patch(base_db, self.db_path, self.delta_dir)
+        except ValueError as e:
+            logger.warning(f"No delta patch written: {e}")
+            return True
         
-        for level in risk_levels:
-            if level not in expected_levels:
-                logger.warning(f"Unexpected risk level found: {level}")
+        if not delta_patch.verify_patch(base_db, self.db_path, path):
+            logger.error(f"Delta patch {path} does not reproduce {self.db_path}; removed it")
+            os.remove(path)
+            return False
         
-        conn.close()
-        logger.info("Database validation completed")
+        logger.info(f"Delta patch revision {header['base_revision']} -> {header['target_revision']}: "
+                    f"{path} ({os.path.getsize(path)} bytes, verified)")
+        return True
+    
+    def export_compact_artifacts(self):
+        """Write the compact read-only database, the binary E-number index and/or the binary synonym index."""
+        # Imported lazily: only needed for bundle exports
+        import compact_export
+        
+        if self.compact_path:
+            result = compact_export.export_compact_db(self.db_path, self.compact_path)
+            logger.info(f"Compact export: {self.compact_path} ({result['bytes']} bytes, "
+                        f"page size {result['page_size']})")
+        if self.binary_index_path:
+            count = compact_export.write_binary_index(self.db_path, self.binary_index_path)
+            logger.info(f"Binary index: {self.binary_index_path} ({count} E-numbers, "
+                        f"{os.path.getsize(self.binary_index_path)} bytes)")
+        if self.synonym_index_path:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                automaton = SynonymAutomaton.from_db(conn)
+            finally:
+                conn.close()
+            automaton.write(self.synonym_index_path)
+            logger.info(f"Synonym index: {self.synonym_index_path} ({automaton.state_count} states, "
+                        f"{os.path.getsize(self.synonym_index_path)} bytes)")
     
     def create_kmp_ready_database(self):
         """Main method to create KMP-ready SQLite database."""
         logger.info("Starting SQLite database creation for KMP project...")
         
+        self.metrics.start()
+        success = False
         try:
-            # Step 1: Download data from Open Food Facts
-            raw_data = self.download_openfoodfacts_data()
-            if not raw_data:
-                logger.error("Failed to download data. Exiting.")
-                return False
+            success = self.run_build_stages()
+            return success
+        except Exception as e:
+            logger.error(f"Failed to create database: {e}")
+            return False
+        finally:
+            self.metrics.finish(success)
+            self.write_metrics()
+    
+    def run_build_stages(self) -> bool:
+        """Run the build steps, each measured as a stage of self.metrics."""
+        stage = self.metrics.stage
+        
+        # Step 1: Fetch the taxonomy (local file or conditional download)
+        with stage("fetch"):
+            previous = self.read_existing_metadata()
+            base_revision = int(previous.get("revision") or 0)
+            self.revision = base_revision + 1
+            builder_sha256 = self.builder_fingerprint()
+            if builder_sha256 != previous.get("builder_sha256") or self.force:
+                # Builder code changed: the cached validators no longer describe our output
+                previous = {}
             
-            # Step 2: Process the data
+            snapshot = self.fetch_taxonomy(self.source, previous)
+        if not snapshot:
+            logger.error("Failed to download data. Exiting.")
+            return False
+        
+        if snapshot["unchanged"]:
+            logger.info(f"Input unchanged (sha256 {snapshot['sha256'][:12]}); skipping rebuild of {self.db_path}")
+            return self.write_cached_outputs(previous)
+        
+        snapshot["builder_sha256"] = builder_sha256
+        self.source_snapshot = snapshot
+        
+        # Streaming parses lazily, so its parse time is part of the process stage
+        with stage("parse"):
+            if self.streaming:
+                raw_data = self.stream_openfoodfacts_data(snapshot["path"])
+            else:
+                with open(snapshot["path"], "r", encoding="utf-8") as f:
+                    raw_data = json.load(f)
+        
+        # Step 2: Process the data
+        with stage("process") as process_stage:
             processed_additives = self.process_openfoodfacts_data(raw_data)
             
-            # Step 3: Add manual additives for completeness
-            manual_additives = self.add_manual_additives()
-            all_additives = processed_additives + manual_additives
-            
-            # Step 4: Create database schema
-            self.create_database_schema()
-            
-            # Step 5: Insert data
-            self.insert_additives_data(all_additives)
-            
-            # Step 6: Validate database
+            # Step 3: Merge in manual additives and other sources by E-number
+            all_additives = self.merge_additive_sources(processed_additives)
+            process_stage.rows = len(all_additives)
+        
+        # Step 4: Build and validate the rows before anything is written
+        with stage("build") as build_stage:
+            rows = self.build_rows(all_additives)
+            build_stage.rows = len(rows)
+        if self.validation_report_path:
+            self.validation_report.write_json(self.validation_report_path)
+            logger.info(f"Validation report written to {self.validation_report_path}")
+        if self.strict and self.validation_report.errors:
+            logger.error(f"Validation failed with {self.validation_report.errors} errors (strict); "
+                         f"{self.db_path} was not modified")
+            return False
+        
+        # Keep the previous database to diff the new one against
+        base_db = None
+        if self.delta_dir and os.path.exists(self.db_path):
+            base_db = f"{self.db_path}.base"
+            shutil.copyfile(self.db_path, base_db)
+        
+        # Step 5: Create database schema (or keep it for an incremental update)
+        with stage("schema"):
+            if self.incremental and self.has_incremental_schema():
+                load = self.upsert_additives_data
+            else:
+                if self.incremental:
+                    logger.info(f"No incremental-ready database at {self.db_path}; doing a full build")
+                # Read before the schema step replaces the file
+                tombstones = self.read_tombstones()
+                self.create_database_schema()
+                load = functools.partial(self.insert_additives_data, tombstones=tombstones)
+            load = functools.partial(load, rows=rows)
+        
+        # Step 6: Insert data
+        with stage("insert") as insert_stage:
+            if self.localized:
+                self.insert_localized_data(all_additives, load)
+            else:
+                load(all_additives)
+            self.record_source_metadata()
+            insert_stage.rows = len(rows)
+        
+        # Step 7: Validate database
+        with stage("validate"):
             self.validate_database()
-            
-            # Step 7: Generate statistics
+        
+        # Step 8: Generate statistics
+        with stage("stats"):
             self.generate_statistics()
-            
-            # Step 8: Export sample queries
+        
+        # Step 9: Export sample queries
+        with stage("sample_queries"):
             self.export_sample_queries()
-            
-            logger.info(f"Successfully created SQLite database: {self.db_path}")
-            logger.info("Database is ready for import into KMP project!")
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to create database: {e}")
-            return False
+        
+        # Step 10: Delta patch for clients on the previous version
+        if base_db:
+            try:
+                if self.revision == base_revision:
+                    logger.info(f"No changes since revision {base_revision}; no delta patch written")
+                else:
+                    with stage("delta_patch"):
+                        if not self.write_delta_patch(base_db):
+                            return False
+            finally:
+                os.remove(base_db)
+        
+        # Step 11: Compact read-only exports for app bundles
+        if self.compact_path or self.binary_index_path or self.synonym_index_path:
+            with stage("compact_export"):
+                self.export_compact_artifacts()
+        
+        logger.info(f"Successfully created SQLite database: {self.db_path}")
+        logger.info("Database is ready for import into KMP project!")
+        
+        return True
+    
+    def write_cached_outputs(self, metadata: Dict[str, str]) -> bool:
+        """
+        Write the requested report and exports from the existing database when the
+        rebuild is skipped. The validation report is the one stored by the build.
+        """
+        report = json.loads(metadata.get("validation_report") or "null")
+        if self.validation_report_path or self.strict:
+            if report is None:
+                logger.error(f"{self.db_path} has no stored validation report; rebuild with --force")
+                return False
+            if self.validation_report_path:
+                with open(self.validation_report_path, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=2, ensure_ascii=False)
+                logger.info(f"Validation report written to {self.validation_report_path}")
+            if self.strict and report["errors"]:
+                logger.error(f"Validation failed with {report['errors']} errors (strict)")
+                return False
+        
+        if self.compact_path or self.binary_index_path or self.synonym_index_path:
+            with self.metrics.stage("compact_export"):
+                self.export_compact_artifacts()
+        return True
+    
+    def write_metrics(self):
+        """Write the build metrics to the configured JSON, Prometheus and profile outputs."""
+        outputs = (
+            (self.metrics_json_path, "write_json"),
+            (self.metrics_prometheus_path, "write_prometheus"),
+            (self.profile_path, "write_profile"),
+        )
+        for path, writer in outputs:
+            if not path:
+                continue
+            try:
+                getattr(self.metrics, writer)(path)
+                logger.info(f"Build metrics written to {path}")
+            except (OSError, AttributeError) as e:
+                logger.warning(f"Could not write build metrics to {path}: {e}")
+
+def configure_logging():
+    """Log to a dated log file and stdout (for command-line runs; importing the module configures nothing)."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(f"additives_sqlite_creation_{datetime.now().strftime('%Y%m%d')}.log"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 
 def main():
     """Main function to run the script."""
+    configure_logging()
+    
     print("Food Additives SQLite Database Creator for KMP Projects")
     print("=" * 60)
     
-    # Allow custom database path via command line argument
-    db_path = sys.argv[1] if len(sys.argv) > 1 else "additives.db"
+    parser = argparse.ArgumentParser(description="Create a KMP-ready SQLite database of food additives")
+    parser.add_argument("db_path", nargs="?", default="additives.db",
+                        help="Path of the SQLite database to create (default: additives.db)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse the taxonomy incrementally instead of loading it into memory")
+    parser.add_argument("--source", metavar="PATH",
+                        help="Build offline from a local additives.json instead of downloading it")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild even if the input is unchanged since the last build")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Classify and describe additives with vectorized pandas/NumPy operations")
+    parser.add_argument("--fts-tokenizer", choices=sorted(FTS_TOKENIZERS), default="unicode61",
+                        help="Tokenizer for the full-text search index (trigram enables substring search)")
+    parser.add_argument("--languages", metavar="LANGS", default="en",
+                        help="Comma-separated languages for the localized_names table, or 'all' (default: en)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Update an existing database in place, writing only changed additives")
+    parser.add_argument("--delta-dir", metavar="DIR",
+                        help="Also write a verified delta patch from the previous database into DIR")
+    parser.add_argument("--compact", metavar="PATH",
+                        help="Also write a compact read-only copy of the database (VACUUMed, ANALYZEd) to PATH")
+    parser.add_argument("--binary-index", metavar="PATH",
+                        help="Also write an mmappable binary E-number index to PATH")
+    parser.add_argument("--synonym-index", metavar="PATH",
+                        help="Also write the binary synonym automaton (ingredient names -> additives) to PATH")
+    parser.add_argument("--rules", metavar="PATH",
+                        help="Ruleset file with risk, category and description rules (default: additive_rules.json)")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes for the localized build (default: number of CPUs)")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="Write per-stage build metrics (wall/CPU time, peak RSS, rows/s) as JSON to PATH")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="Write the build metrics as a Prometheus textfile to PATH")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="Profile the build with cProfile and write the stats to PATH")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record the peak Python allocations of each stage with tracemalloc")
+    parser.add_argument("--taxonomies", metavar="NAMES", default="",
+                        help="Related OFF taxonomies to fetch alongside additives.json: "
+                             f"{', '.join(RELATED_TAXONOMIES)} ('all' for every one); "
+                             "NAME=PATH uses a local file")
+    parser.add_argument("--taxonomy-base-url", metavar="URL",
+                        help="Base URL of the taxonomy downloads (default: Open Food Facts)")
+    parser.add_argument("--fetch-concurrency", type=int, default=4,
+                        help="Maximum number of concurrent taxonomy downloads (default: 4)")
+    parser.add_argument("--strict", action="store_true",
+                        help="Fail the build (exit status 1, database untouched) if any row fails validation")
+    parser.add_argument("--validation-report", metavar="PATH",
+                        help="Write the row validation report (violation counts and samples) as JSON to PATH")
+    parser.add_argument("--merge-source", metavar="KIND=PATH", action="append", default=[],
+                        help="Merge additives from a local CSV/JSON export by E-number; KIND is manual "
+                             "(replaces the built-in manual additives), efsa or codex. Repeatable")
+    args = parser.parse_args()
+    db_path = args.db_path
+    languages = None if args.languages == "all" else [lang.strip() for lang in args.languages.split(",") if lang.strip()]
+    
+    related_taxonomies: Dict[str, Optional[str]] = {}
+    for entry in args.taxonomies.split(","):
+        name, _, path = entry.strip().partition("=")
+        if name == "all":
+            related_taxonomies.update((related, None) for related in RELATED_TAXONOMIES)
+        elif name in RELATED_TAXONOMIES:
+            related_taxonomies[name] = path or None
+        elif name:
+            parser.error(f"unknown taxonomy {name!r} (expected {', '.join(RELATED_TAXONOMIES)} or all)")
+    
+    try:
+        extra_sources = [open_source(spec) for spec in args.merge_source]
+    except ValueError as e:
+        parser.error(str(e))
     
-    creator = AdditivesSQLiteCreator(db_path)
+    creator = AdditivesSQLiteCreator(db_path, streaming=args.stream, languages=languages, source=args.source,
+                                     force=args.force, columnar=args.columnar, fts_tokenizer=args.fts_tokenizer,
+                                     workers=args.workers, incremental=args.incremental,
+                                     delta_dir=args.delta_dir, compact_path=args.compact,
+                                     binary_index_path=args.binary_index,
+                                     ruleset=load_ruleset(args.rules) if args.rules else None,
+                                     metrics=BuildMetrics(profile=bool(args.profile), trace_memory=args.trace_memory),
+                                     metrics_json_path=args.metrics_json, metrics_prometheus_path=args.metrics_prom,
+                                     profile_path=args.profile, related_taxonomies=related_taxonomies,
+                                     taxonomy_base_url=args.taxonomy_base_url,
+                                     fetch_concurrency=args.fetch_concurrency,
+                                     extra_sources=extra_sources, strict=args.strict,
+                                     validation_report_path=args.validation_report,
+                                     synonym_index_path=args.synonym_index)
     success = creator.create_kmp_ready_database()
     
     if success:
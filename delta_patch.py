@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Delta Patches Between Two Versions of the Additives Database
+
+A patch is a gzip-compressed SQL script that turns one database into another:
+rows are diffed table by table on their primary keys and only deletes,
+column-level updates and inserts are emitted. The header records the schema
+version and the base/target revisions from the metadata table, plus content
+digests of both databases, so a client can check that a patch applies to the
+database it has. Every statement is on its own line, so clients without a
+script executor can apply it line by line inside a transaction.
+
+FTS index tables are not diffed: the sync triggers on additives rebuild the
+affected index entries when the patch is applied.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+PATCH_MAGIC = "-- additives delta patch"
+
+
+def sql_literal(value: Any) -> str:
+    """Render a value as an SQL literal that fits on one line."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    quoted = "'" + str(value).replace("'", "''") + "'"
+    # Keep one statement per line: splice line breaks back in with char()
+    return quoted.replace("\r", "' || char(13) || '").replace("\n", "' || char(10) || '")
+
+
+def quote_identifier(name: str) -> str:
+    """Quote an SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def data_tables(conn: sqlite3.Connection) -> List[str]:
+    """Ordinary tables holding data, excluding virtual (FTS) tables and their shadow tables."""
+    tables = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' ORDER BY name").fetchall()
+    virtual = [name for name, sql in tables if sql and sql.upper().startswith("CREATE VIRTUAL TABLE")]
+    names = [
+        name for name, _ in tables
+        if name not in virtual
+        and not any(name.startswith(f"{table}_") for table in virtual)
+        and name != "sqlite_sequence"
+    ]
+    # AUTOINCREMENT counters last, after the inserts that would otherwise bump them
+    if any(name == "sqlite_sequence" for name, _ in tables):
+        names.append("sqlite_sequence")
+    return names
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> Tuple[List[str], List[str]]:
+    """(columns, primary key columns) of a table; tables without a primary key are keyed by all columns."""
+    info = conn.execute(f"PRAGMA table_info({quote_identifier(table)})").fetchall()
+    columns = [row[1] for row in info]
+    key = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+    if table == "sqlite_sequence":
+        key = ["name"]
+    return columns, key or columns
+
+
+def unique_columns(conn: sqlite3.Connection, table: str) -> set:
+    """Columns taking part in a UNIQUE index (other than the primary key)."""
+    columns = set()
+    for _, index_name, unique, origin, _ in conn.execute(f"PRAGMA index_list({quote_identifier(table)})"):
+        if unique and origin != "pk":
+            columns.update(row[2] for row in conn.execute(f"PRAGMA index_info({quote_identifier(index_name)})"))
+    return columns
+
+
+def read_rows(conn: sqlite3.Connection, table: str, columns: List[str], key: List[str]) -> Dict[tuple, tuple]:
+    """All rows of a table keyed by their primary key values."""
+    key_positions = [columns.index(column) for column in key]
+    column_list = ", ".join(quote_identifier(column) for column in columns)
+    rows = conn.execute(f"SELECT {column_list} FROM {quote_identifier(table)}")
+    return {tuple(row[i] for i in key_positions): row for row in rows}
+
+
+def content_digest(conn: sqlite3.Connection) -> str:
+    """SHA-256 over the content of every data table, independent of page layout."""
+    digest = hashlib.sha256()
+    for table in data_tables(conn):
+        columns, key = table_columns(conn, table)
+        digest.update(json.dumps([table, columns]).encode("utf-8"))
+        rows = read_rows(conn, table, columns, key)
+        for row_key in sorted(rows, key=repr):
+            digest.update(json.dumps(rows[row_key], ensure_ascii=False, default=repr).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def read_metadata(conn: sqlite3.Connection) -> Dict[str, str]:
+    """The metadata table as a dict."""
+    return dict(conn.execute("SELECT key, value FROM metadata").fetchall())
+
+
+def diff_table(old: sqlite3.Connection, new: sqlite3.Connection, table: str) -> Tuple[List[str], List[str], List[str]]:
+    """(deletes, updates, inserts) statements turning the old table into the new one."""
+    columns, key = table_columns(new, table)
+    old_columns, _ = table_columns(old, table)
+    if columns != old_columns:
+        raise ValueError(f"Schema of table {table} changed; ship the full database instead")
+
+    old_rows = read_rows(old, table, columns, key)
+    new_rows = read_rows(new, table, columns, key)
+    unique = unique_columns(new, table)
+    name = quote_identifier(table)
+    column_list = ", ".join(quote_identifier(column) for column in columns)
+
+    def where(row_key: tuple) -> str:
+        return " AND ".join(f"{quote_identifier(column)} = {sql_literal(value)}" for column, value in zip(key, row_key))
+
+    def insert(row: tuple) -> str:
+        return f"INSERT INTO {name} ({column_list}) VALUES ({', '.join(sql_literal(value) for value in row)});"
+
+    deletes, updates, inserts = [], [], []
+    for row_key in old_rows:
+        if row_key not in new_rows:
+            deletes.append(f"DELETE FROM {name} WHERE {where(row_key)};")
+
+    for row_key, row in new_rows.items():
+        old_row = old_rows.get(row_key)
+        if old_row is None:
+            inserts.append(insert(row))
+        elif old_row != row:
+            changed = [(column, value) for column, value, old_value in zip(columns, row, old_row) if value != old_value]
+            if unique.intersection(column for column, _ in changed):
+                # A unique value may move between rows: delete first, reinsert with the inserts
+                deletes.append(f"DELETE FROM {name} WHERE {where(row_key)};")
+                inserts.append(insert(row))
+            else:
+                assignments = ", ".join(f"{quote_identifier(column)} = {sql_literal(value)}" for column, value in changed)
+                updates.append(f"UPDATE {name} SET {assignments} WHERE {where(row_key)};")
+    return deletes, updates, inserts
+
+
+def generate_patch(old_db: str, new_db: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Build the SQL patch turning old_db into new_db.
+    Returns (patch text, header fields).
+    """
+    old = sqlite3.connect(f"file:{old_db}?mode=ro", uri=True)
+    new = sqlite3.connect(f"file:{new_db}?mode=ro", uri=True)
+    try:
+        old_metadata, new_metadata = read_metadata(old), read_metadata(new)
+        if old_metadata.get("version") != new_metadata.get("version"):
+            raise ValueError("Schema versions differ; ship the full database instead")
+        if set(data_tables(old)) != set(data_tables(new)):
+            raise ValueError("Table sets differ; ship the full database instead")
+
+        header = {
+            "schema_version": new_metadata.get("version", ""),
+            "base_revision": old_metadata.get("revision", "0"),
+            "target_revision": new_metadata.get("revision", "0"),
+            "base_sha256": content_digest(old),
+            "target_sha256": content_digest(new),
+        }
+
+        deletes, updates, inserts = [], [], []
+        for table in data_tables(new):
+            table_deletes, table_updates, table_inserts = diff_table(old, new, table)
+            deletes += table_deletes
+            updates += table_updates
+            inserts += table_inserts
+    finally:
+        old.close()
+        new.close()
+
+    lines = [PATCH_MAGIC] + [f"-- {field}: {value}" for field, value in header.items()]
+    lines += ["BEGIN;"] + deletes + updates + inserts + ["COMMIT;"]
+    return "\n".join(lines) + "\n", header
+
+
+def write_patch(old_db: str, new_db: str, output_dir: str = ".") -> Tuple[str, Dict[str, str]]:
+    """Write the gzip patch between two databases, named after their revisions. Returns (path, header)."""
+    patch, header = generate_patch(old_db, new_db)
+    path = os.path.join(
+        output_dir, f"additives_delta_r{header['base_revision']}_r{header['target_revision']}.sql.gz"
+    )
+    os.makedirs(output_dir, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=9) as f:
+        f.write(patch)
+    return path, header
+
+
+def read_patch(path: str) -> Tuple[str, Dict[str, str]]:
+    """Read a gzip patch and parse its header."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        patch = f.read()
+    lines = patch.splitlines()
+    if not lines or lines[0] != PATCH_MAGIC:
+        raise ValueError(f"{path} is not an additives delta patch")
+
+    header = {}
+    for line in lines[1:]:
+        if not line.startswith("-- "):
+            break
+        field, _, value = line[3:].partition(": ")
+        header[field] = value
+    return patch, header
+
+
+def apply_patch(db_path: str, patch_path: str, check_digest: bool = False):
+    """
+    Apply a patch to a database in place.
+    Refuses patches for another schema version or base revision; with check_digest
+    the database content must also match the patch's base digest exactly.
+    """
+    patch, header = read_patch(patch_path)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        metadata = read_metadata(conn)
+        if metadata.get("version") != header.get("schema_version"):
+            raise ValueError("Patch is for a different schema version")
+        if metadata.get("revision", "0") != header.get("base_revision"):
+            raise ValueError(f"Patch applies to revision {header.get('base_revision')}, "
+                             f"database is at revision {metadata.get('revision', '0')}")
+        if check_digest and content_digest(conn) != header.get("base_sha256"):
+            raise ValueError("Database content does not match the patch base")
+
+        try:
+            conn.executescript(patch)
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def verify_patch(old_db: str, new_db: str, patch_path: str) -> bool:
+    """Apply the patch to a copy of old_db and check the result has exactly new_db's content."""
+    _, header = read_patch(patch_path)
+    handle, scratch = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    try:
+        shutil.copyfile(old_db, scratch)
+        apply_patch(scratch, patch_path, check_digest=True)
+        conn = sqlite3.connect(scratch)
+        try:
+            digest = content_digest(conn)
+            for (table,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%fts5%'"
+            ).fetchall():
+                # Raises if the FTS index no longer matches its content table
+                conn.execute(f"INSERT INTO {quote_identifier(table)}({quote_identifier(table)}) VALUES('integrity-check')")
+        finally:
+            conn.close()
+        return digest == header["target_sha256"]
+    finally:
+        os.remove(scratch)
+
+
+def main():
+    """Generate, verify or apply delta patches between additives databases."""
+    parser = argparse.ArgumentParser(description="Delta patches between versions of the additives database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = subparsers.add_parser("diff", help="Write the patch turning OLD_DB into NEW_DB")
+    diff_parser.add_argument("old_db")
+    diff_parser.add_argument("new_db")
+    diff_parser.add_argument("--output-dir", default=".", help="Directory for the patch file (default: .)")
+
+    apply_parser = subparsers.add_parser("apply", help="Apply a patch to a database in place")
+    apply_parser.add_argument("db_path")
+    apply_parser.add_argument("patch")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "diff":
+            path, header = write_patch(args.old_db, args.new_db, args.output_dir)
+            if not verify_patch(args.old_db, args.new_db, path):
+                print(f"Patch verification failed: {path}", file=sys.stderr)
+                sys.exit(1)
+            print(f"{path} (revision {header['base_revision']} -> {header['target_revision']}, "
+                  f"{os.path.getsize(path)} bytes, verified)")
+        else:
+            apply_patch(args.db_path, args.patch)
+            print(f"Applied {args.patch} to {args.db_path}")
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+E-number Normalization
+
+Canonical keys for food additive E-numbers: uppercase, no "E"/"INS" prefix,
+with the roman-numeral sub-variant split out, e.g. "E 160a (ii)" -> ("160A", "II").
+Free-form spellings are folded into alias keys (lowercase, alphanumerics only)
+for the e_number_aliases lookup table, so clients only need to apply the same
+fold before an exact lookup.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# digits, optional letter sub-class (a-h, j), optional roman-numeral variant
+_E_NUMBER_PATTERN = re.compile(r"^(?:e|ins)?(\d{3,4})([a-hj])?(i{1,3}|iv|vi{0,3}|ix|x)?$")
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+# "E420ii - Sorbitol syrup" -> "Sorbitol syrup"
+_NAME_E_NUMBER_PREFIX = re.compile(r"^\s*e\s*\d{3,4}[\w()]*\s*[-–:]\s*", re.IGNORECASE)
+
+
+def fold_alias(text: str) -> str:
+    """Fold a spelling into its alias key: lowercase with all non-alphanumerics removed."""
+    return _NON_ALPHANUMERIC.sub("", str(text).lower())
+
+
+def normalize_e_number(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Parse an E-number spelling into its canonical (e_key, e_variant) pair.
+    Returns None if text is not an E-number.
+
+    >>> normalize_e_number("E 160a (ii)")
+    ('160A', 'II')
+    >>> normalize_e_number("e330")
+    ('330', '')
+    """
+    match = _E_NUMBER_PATTERN.match(fold_alias(text))
+    if not match:
+        return None
+    digits, letter, variant = match.groups()
+    return digits + (letter or "").upper(), (variant or "").upper()
+
+
+def additive_e_key(additive: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Canonical (e_key, e_variant) for a processed additive record.
+    The OFF taxonomy id carries the sub-variant ("en:e420ii") while e_number does
+    not ("420"), so the id is preferred and e_number is the fallback.
+    """
+    taxonomy_id = str(additive.get("taxonomy_id", ""))
+    e_number = str(additive.get("e_number", ""))
+
+    candidates = [taxonomy_id.split(":", 1)[1]] if taxonomy_id.startswith("en:") else []
+    candidates.append(e_number)
+
+    for candidate in candidates:
+        key = normalize_e_number(candidate)
+        if key:
+            return key
+
+    return fold_alias(e_number).upper(), ""
+
+
+def e_number_aliases(e_key: str, e_variant: str) -> List[str]:
+    """Alias keys for every spelling of an E-number (with or without E/INS prefix)."""
+    body = (e_key + e_variant).lower()
+    return [body, "e" + body, "ins" + body]
+
+
+def strip_e_number_label(name: str) -> str:
+    """An additive name without any leading "E123 - " label ("E420ii - Sorbitol syrup" -> "Sorbitol syrup")."""
+    return _NAME_E_NUMBER_PREFIX.sub("", name)
+
+
+def name_alias(name: str) -> str:
+    """Alias key for an additive name, without any leading "E123 - " label."""
+    return fold_alias(strip_e_number_label(name))
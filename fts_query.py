@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search Queries
+
+Builds the FTS5 MATCH expressions used for search-as-you-type on the
+additives_fts index. Shared by the builder and the lookup service, so a
+service can build queries without importing the builder.
+"""
+
+
+def build_fts_query(text: str) -> str:
+    """
+    Turn free search text into an FTS5 MATCH expression for search-as-you-type.
+    Every whitespace-separated term is quoted (so punctuation is literal) and
+    prefix-matched, e.g. 'tartra yell' -> '"tartra"* "yell"*'.
+    """
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " ".join(f'"{term}"*' for term in terms)
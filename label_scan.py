@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Batch Label Scanner for the Food Additives Database
+
+Resolves raw ingredient lists against a generated additives.db. E-number
+spellings are found with a regex and folded into e_number_aliases keys.
+Additive names ("sodium benzoate", or "Natriumbenzoat" in a database built
+with --languages de) are found in one pass over the label with the synonym
+automaton stored in the database (see synonym_index); databases without one
+fall back to trying every ingredient segment as a name alias. All candidates
+of a whole batch of labels, aliases and matched ids alike, are resolved with
+a single query (IN lists for small batches, temp tables for large ones). Each
+label gets its per-additive risk plus a worst-risk verdict.
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Any, Iterable, Tuple, Union
+
+from e_numbers import fold_alias
+from risk_classifier import RISK_COLORS, RISK_ORDER
+from synonym_index import SynonymAutomaton
+
+# "E330", "e 160a(ii)", "INS 211", "E-471"
+_E_NUMBER_TOKEN = re.compile(
+    r"\b(?:e|ins)\s*-?\s*\d{3,4}[a-hj]?(?:\s*\(?\s*(?:i{1,3}|iv|vi{0,3}|ix|x)\s*\)?(?![a-z]))?",
+    re.IGNORECASE
+)
+# Ingredient separators; names are matched per segment
+_SEGMENT_SEPARATOR = re.compile(r"[,;:()\[\]{}.*/•|]+|\s+(?:and|&)\s+", re.IGNORECASE)
+
+# Largest IN (...) list before switching to a temp table join
+# (SQLite's default host-parameter limit is 999 on older builds)
+MAX_IN_PARAMETERS = 500
+
+_SELECT_COLUMNS = "a.id, a.e_key, a.e_variant, a.e_number, a.name, a.risk_level, a.risk_color, a.category"
+_RESULT_FIELDS = ("e_key", "e_variant", "e_number", "name", "risk_level", "risk_color", "category")
+
+
+def extract_candidates(text: str, automaton: Optional[SynonymAutomaton] = None) -> List[Tuple[str, Union[str, int]]]:
+    """
+    Tokenize an ingredient list into (token, key) candidates in label order.
+    E-number spellings are found anywhere in the text, keyed by their folded alias.
+    Names outside them are found with the automaton, keyed by additive id; without
+    one, every ingredient segment is tried as a name alias. Duplicate keys are dropped.
+    """
+    found: List[Tuple[int, str, Union[str, int]]] = []
+    for match in _E_NUMBER_TOKEN.finditer(text):
+        token = match.group(0).strip()
+        found.append((match.start(), token, fold_alias(token)))
+
+    # Blank out the E-numbers so "E 160a(ii)" is not also matched as names
+    masked = _E_NUMBER_TOKEN.sub(lambda match: "," * len(match.group(0)), text)
+    if automaton is not None:
+        for start, end, additive_id in automaton.find(masked):
+            found.append((start, masked[start:end], additive_id))
+    else:
+        start = 0
+        for separator in _SEGMENT_SEPARATOR.finditer(masked + ","):
+            token = masked[start:separator.start()].strip()
+            found.append((start, token, fold_alias(token)))
+            start = separator.end()
+
+    candidates = []
+    seen = set()
+    for _, token, key in sorted(found, key=lambda item: item[0]):
+        if key and key not in seen:
+            seen.add(key)
+            candidates.append((token, key))
+    return candidates
+
+
+def worst_risk(risk_levels: Iterable[str]) -> Optional[str]:
+    """Most severe risk level among risk_levels, or None if there are none."""
+    severities = [RISK_ORDER.index(level) for level in risk_levels if level in RISK_ORDER]
+    return RISK_ORDER[max(severities)] if severities else None
+
+
+class LabelScanner:
+    """Scans ingredient labels against the e_number_aliases table of an additives database."""
+
+    def __init__(self, db_path: str = "additives.db", synonym_index: Optional[str] = None):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self._temp_tables_ready = False
+        # From the binary synonym index file if given, else from the database (None for older databases)
+        self.automaton = SynonymAutomaton.read(synonym_index) if synonym_index else SynonymAutomaton.from_db(self.conn)
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def resolve(self, aliases: Iterable[str], additive_ids: Iterable[int] = ()) -> Dict[Union[str, int], Dict[str, Any]]:
+        """
+        Resolve folded aliases and additive ids (names matched by the synonym automaton)
+        to additive records with a single query, keyed by alias or id. When an E-number
+        has several rows (e.g. curated and Open Food Facts), the first one wins.
+        """
+        aliases = list(dict.fromkeys(aliases))
+        additive_ids = list(dict.fromkeys(additive_ids))
+        if not aliases and not additive_ids:
+            return {}
+
+        if len(aliases) + len(additive_ids) <= MAX_IN_PARAMETERS:
+            rows = self.conn.execute(f'''
+            SELECT x.alias, {_SELECT_COLUMNS}
+            FROM e_number_aliases x
+            JOIN additives a ON a.e_key = x.e_key AND a.e_variant = x.e_variant
+            WHERE x.alias IN ({", ".join("?" * len(aliases))})
+            UNION ALL
+            SELECT a.id, {_SELECT_COLUMNS}
+            FROM additives a
+            WHERE a.id IN ({", ".join("?" * len(additive_ids))})
+            ORDER BY 2
+            ''', aliases + additive_ids).fetchall()
+        else:
+            rows = self._resolve_with_temp_tables(aliases, additive_ids)
+
+        resolved: Dict[Union[str, int], Dict[str, Any]] = {}
+        for key, _, *fields in rows:
+            if key not in resolved:
+                resolved[key] = dict(zip(_RESULT_FIELDS, fields))
+        return resolved
+
+    def _resolve_with_temp_tables(self, aliases: List[str], additive_ids: List[int]) -> List[tuple]:
+        """Join a large batch through in-memory temp tables of its aliases and ids."""
+        cursor = self.conn.cursor()
+        if not self._temp_tables_ready:
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_aliases (alias TEXT PRIMARY KEY) WITHOUT ROWID")
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_ids (id INTEGER PRIMARY KEY)")
+            self._temp_tables_ready = True
+
+        cursor.execute("BEGIN")
+        try:
+            cursor.executemany("INSERT OR IGNORE INTO scan_aliases (alias) VALUES (?)", ((alias,) for alias in aliases))
+            cursor.executemany("INSERT OR IGNORE INTO scan_ids (id) VALUES (?)", ((i,) for i in additive_ids))
+            rows = cursor.execute(f'''
+            SELECT x.alias, {_SELECT_COLUMNS}
+            FROM scan_aliases s
+            JOIN e_number_aliases x ON x.alias = s.alias
+            JOIN additives a ON a.e_key = x.e_key AND a.e_variant = x.e_variant
+            UNION ALL
+            SELECT a.id, {_SELECT_COLUMNS}
+            FROM scan_ids s
+            JOIN additives a ON a.id = s.id
+            ORDER BY 2
+            ''').fetchall()
+            cursor.execute("DELETE FROM scan_aliases")
+            cursor.execute("DELETE FROM scan_ids")
+        finally:
+            cursor.execute("COMMIT")
+        return rows
+
+    def scan_batch(self, texts: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Scan many ingredient lists, resolving all of their candidates in one query.
+        Each result has the matched additives (one per E-number, in label order)
+        and the worst risk level among them (None when no additive was found).
+        """
+        labels = [extract_candidates(text, self.automaton) for text in texts]
+        keys = [key for candidates in labels for _, key in candidates]
+        resolved = self.resolve((key for key in keys if isinstance(key, str)),
+                                (key for key in keys if isinstance(key, int)))
+
+        results = []
+        for candidates in labels:
+            items = []
+            seen_keys = set()
+            for token, candidate_key in candidates:
+                additive = resolved.get(candidate_key)
+                if additive is None:
+                    continue
+                key = (additive["e_key"], additive["e_variant"])
+                if key in seen_keys:
+                    continue
+                seen_keys.add(key)
+                items.append({"token": token, **additive})
+
+            verdict = worst_risk(item["risk_level"] for item in items)
+            results.append({
+                "items": items,
+                "verdict": verdict,
+                "verdict_color": RISK_COLORS.get(verdict),
+            })
+        return results
+
+    def scan(self, text: str) -> Dict[str, Any]:
+        """Scan a single ingredient list."""
+        return self.scan_batch([text])[0]
+
+
+def main():
+    """Scan ingredient lists given as arguments or one per line on stdin; prints JSON lines."""
+    parser = argparse.ArgumentParser(description="Resolve additives and risk verdicts for ingredient lists")
+    parser.add_argument("labels", nargs="*", help="Ingredient lists to scan (default: read lines from stdin)")
+    parser.add_argument("--db", default="additives.db", help="Path of the additives database (default: additives.db)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of labels resolved per database query (default: 1000)")
+    parser.add_argument("--synonym-index", metavar="PATH",
+                        help="Binary synonym index to match names with (default: the one in the database)")
+    args = parser.parse_args()
+
+    labels = args.labels or (line.rstrip("\n") for line in sys.stdin)
+
+    with LabelScanner(args.db, args.synonym_index) as scanner:
+        batch: List[str] = []
+        for label in labels:
+            batch.append(label)
+            if len(batch) >= args.batch_size:
+                for result in scanner.scan_batch(batch):
+                    print(json.dumps(result, ensure_ascii=False))
+                batch = []
+        if batch:
+            for result in scanner.scan_batch(batch):
+                print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Parallel Localized Names Build for the Food Additives Database
+
+Each requested language is processed in its own worker process: the worker
+takes the additives that have a name in that language, generates their
+descriptions with the localized name and writes them to a locale shard (a
+small standalone SQLite file). The shards are then merged into the
+localized_names table of the main database, and localized names are added to
+e_number_aliases so label scans also resolve them.
+"""
+
+import os
+import sqlite3
+from concurrent.futures import Executor, Future
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from e_numbers import name_alias
+from additive_rules import CompiledRuleset
+from risk_classifier import RiskClassifier
+
+
+def locale_languages(additives_list: List[Dict[str, Any]], languages: Optional[Iterable[str]] = None) -> List[str]:
+    """Languages to build, in order: the requested ones, or every language present (English first)."""
+    if languages is not None:
+        return list(dict.fromkeys(languages))
+    found = {lang for additive in additives_list for lang in additive.get("localized_names", {})}
+    return sorted(found, key=lambda lang: (lang != "en", lang))
+
+
+def shard_path(db_path: str, lang: str) -> str:
+    """Path of the locale shard for lang, next to the main database."""
+    return f"{db_path}.{lang}.shard"
+
+
+def build_locale_shard(path: str, lang: str, additives_list: List[Dict[str, Any]],
+                       risk_classifier: RiskClassifier, ruleset: CompiledRuleset) -> Tuple[str, str, int]:
+    """
+    Worker: write the localized names and descriptions for one language to a shard.
+    Risk level and category come from the English record, since the rules are keyed
+    on English classes and names; only the displayed name is localized.
+    Returns (lang, shard path, row count).
+    """
+    # Imported here so the worker does not import the builder at module load
+    from create_additives_sqlite import AdditivesSQLiteCreator
+    creator = AdditivesSQLiteCreator(path, risk_classifier=risk_classifier, ruleset=ruleset)
+
+    rows = []
+    for additive in additives_list:
+        localized_name = additive.get("localized_names", {}).get(lang, "").strip()
+        if not localized_name:
+            continue
+        risk_level, _ = creator.classify_risk_level(additive)
+        category = creator.get_additive_category(additive)
+        description = creator.create_detailed_description(dict(additive, name=localized_name), risk_level, category)
+        rows.append((additive["taxonomy_id"], lang, localized_name, description, name_alias(localized_name)))
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute('''
+        CREATE TABLE localized_names (
+            taxonomy_id TEXT NOT NULL,
+            lang TEXT NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            alias TEXT NOT NULL
+        )
+        ''')
+        conn.executemany("INSERT INTO localized_names VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return lang, path, len(rows)
+
+
+def submit_locale_shards(executor: Executor, db_path: str, additives_list: List[Dict[str, Any]],
+                         languages: Iterable[str], risk_classifier: RiskClassifier,
+                         ruleset: CompiledRuleset) -> List[Future]:
+    """Submit one shard build per language; each worker only receives the records it needs."""
+    futures = []
+    for lang in languages:
+        records = [additive for additive in additives_list if lang in additive.get("localized_names", {})]
+        futures.append(executor.submit(build_locale_shard, shard_path(db_path, lang), lang, records,
+                                       risk_classifier, ruleset))
+    return futures
+
+
+def merge_locale_shards(db_path: str, shard_paths: Iterable[str]) -> int:
+    """
+    Merge locale shards into localized_names and e_number_aliases, then index (lang, name).
+    Shards are merged in order, so earlier languages win alias conflicts. Returns the row count.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        for path in shard_paths:
+            # ATTACH is not allowed inside a transaction; attach one shard at a time
+            # (SQLite limits attached databases to 10 by default)
+            cursor.execute("ATTACH DATABASE ? AS shard", (path,))
+            cursor.execute("BEGIN")
+            cursor.execute('''
+            INSERT OR REPLACE INTO localized_names (additive_id, lang, name, description)
+            SELECT a.id, s.lang, s.name, s.description
+            FROM shard.localized_names s
+            JOIN additives a ON a.taxonomy_id = s.taxonomy_id
+            ''')
+            cursor.execute('''
+            INSERT OR IGNORE INTO e_number_aliases (alias, e_key, e_variant, kind)
+            SELECT s.alias, a.e_key, a.e_variant, 'localized_name'
+            FROM shard.localized_names s
+            JOIN additives a ON a.taxonomy_id = s.taxonomy_id
+            WHERE s.alias != ''
+            ORDER BY a.e_variant != '', a.id
+            ''')
+            cursor.execute("COMMIT")
+            cursor.execute("DETACH DATABASE shard")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_localized_lang_name ON localized_names(lang, name)")
+        return cursor.execute("SELECT COUNT(*) FROM localized_names").fetchone()[0]
+    finally:
+        conn.close()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+HTTP Lookup Service for the Food Additives Database
+
+A small JSON service over a generated additives.db, for backends that would
+otherwise open the database on every request:
+
+- every additive is preloaded into memory, keyed by id, taxonomy id and every
+  E-number spelling (e_number_aliases), so lookups never touch SQLite
+- full-text search runs on a pool of read-only connections (memory-mapped, so
+  worker processes share the database pages through the OS page cache)
+- the database file is checked at most every check_interval seconds; when its
+  metadata version or revision changes (a rebuild or incremental update), the
+  data is reloaded and swapped in without a restart
+- --workers N pre-forks N processes serving the same listening socket
+
+Endpoints (all responses are JSON):
+
+    GET  /health                      database version, revision and size
+    GET  /additives/<e-number>        one additive by E-number spelling or taxonomy id
+    POST /additives/batch             {"e_numbers": [...]} -> {"results": {spelling: additive or null}}
+    GET  /search?q=<text>&limit=<n>   ranked search-as-you-type
+    POST /search/batch                {"queries": [...], "limit": n} -> {"results": {query: [...]}}
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import queue
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from e_numbers import fold_alias
+from fts_query import build_fts_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+DEFAULT_POOL_SIZE = 4
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_BATCH_SIZE = 1000
+MAX_REQUEST_BYTES = 1024 * 1024
+# Memory-mapped I/O for the read-only connections (shared page cache across workers)
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Additive fields served by the API
+ADDITIVE_FIELDS = (
+    "id", "taxonomy_id", "e_number", "name", "risk_level", "risk_color", "category", "description",
+    "vegetarian", "vegan", "efsa_evaluation", "efsa_url", "efsa_date", "additives_classes", "revision"
+)
+
+
+class ConnectionPool:
+    """A fixed set of read-only connections to one database file, shared by request threads."""
+
+    def __init__(self, db_path: str, size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection (waiting for one if all are busy)."""
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def close(self):
+        """Close idle connections now and borrowed ones when they are returned."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def read_db_version(conn: sqlite3.Connection) -> Tuple[str, str]:
+    """(metadata version, metadata revision) of a database."""
+    metadata = dict(conn.execute("SELECT key, value FROM metadata WHERE key IN ('version', 'revision')"))
+    return metadata.get("version", ""), metadata.get("revision", "")
+
+
+class AdditivesSnapshot:
+    """
+    One version of the database: every additive preloaded, plus a connection pool for search.
+    users counts the requests holding the snapshot (see AdditivesService.use); a retired
+    snapshot is closed when the last of them is done.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.users = 0
+        self.retired = False
+        self.pool = ConnectionPool(db_path, pool_size)
+        with self.pool.connection() as conn:
+            self.version, self.revision = read_db_version(conn)
+            self.additives: List[Dict[str, Any]] = [
+                dict(zip(ADDITIVE_FIELDS, row))
+                for row in conn.execute(f"SELECT {', '.join(ADDITIVE_FIELDS)} FROM additives ORDER BY id")
+            ]
+            self.by_id = {additive["id"]: additive for additive in self.additives}
+            # Every spelling -> additive; the first row of an E-number wins, as in label_scan
+            self.by_alias: Dict[str, Dict[str, Any]] = {}
+            for alias, additive_id in conn.execute('''
+            SELECT x.alias, a.id
+            FROM e_number_aliases x
+            JOIN additives a ON a.e_key = x.e_key AND a.e_variant = x.e_variant
+            ORDER BY a.id
+            '''):
+                self.by_alias.setdefault(alias, self.by_id[additive_id])
+            self.by_taxonomy_id = {}
+            for additive in self.additives:
+                self.by_taxonomy_id.setdefault(additive["taxonomy_id"].lower(), additive)
+            self.has_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'additives_fts'"
+            ).fetchone() is not None
+
+    def lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        """The additive for an E-number spelling ("E 160a(ii)"), name or taxonomy id ("en:e330")."""
+        text = str(text).strip()
+        return self.by_taxonomy_id.get(text.lower()) or self.by_alias.get(fold_alias(text))
+
+    def search(self, text: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        """Ranked prefix search on names, descriptions, classes and E-numbers."""
+        match = build_fts_query(text)
+        if not match:
+            return []
+        if not self.has_fts:
+            needle = text.strip().lower()
+            return [additive for additive in self.additives if needle in additive["name"].lower()][:limit]
+        with self.pool.connection() as conn:
+            rows = conn.execute('''
+            SELECT rowid FROM additives_fts
+            WHERE additives_fts MATCH ?
+            ORDER BY bm25(additives_fts, 10.0, 1.0, 2.0, 5.0)
+            LIMIT ?
+            ''', (match, limit)).fetchall()
+        return [self.by_id[additive_id] for additive_id, in rows if additive_id in self.by_id]
+
+    def close(self):
+        self.pool.close()
+
+
+class AdditivesService:
+    """
+    Serves the current snapshot of a database file and reloads it when the database
+    changes. The file is checked at most every check_interval seconds; a snapshot
+    that fails to load is logged and the previous one stays in service.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = DEFAULT_POOL_SIZE, check_interval: float = 1.0):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # Guards the current snapshot and the users counts; held only briefly, never while loading
+        self._users_lock = threading.Lock()
+        self._stat = self._file_stat()
+        self._checked_at = time.monotonic()
+        self.snapshot = AdditivesSnapshot(db_path, pool_size)
+        logger.info(f"Loaded {len(self.snapshot.additives)} additives from {db_path} "
+                    f"(version {self.snapshot.version}, revision {self.snapshot.revision})")
+
+    def _file_stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextlib.contextmanager
+    def use(self) -> Iterator[AdditivesSnapshot]:
+        """
+        The current snapshot (reloading first if the database changed), kept open until
+        the block exits even if a reload retires it meanwhile.
+        """
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload_if_changed()
+        with self._users_lock:
+            snapshot = self.snapshot
+            snapshot.users += 1
+        try:
+            yield snapshot
+        finally:
+            with self._users_lock:
+                snapshot.users -= 1
+                done = snapshot.retired and snapshot.users == 0
+            if done:
+                snapshot.close()
+
+    def reload_if_changed(self) -> bool:
+        """Reload if the database version changed (or the file was replaced); returns True on a swap."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stat = self._file_stat()
+            if stat is None or stat == self._stat:
+                return False
+            replaced = self._stat is None or stat[0] != self._stat[0]
+            self._stat = stat
+
+            current = self.snapshot
+            try:
+                if not replaced:
+                    with current.pool.connection() as conn:
+                        if read_db_version(conn) == (current.version, current.revision):
+                            return False
+                snapshot = AdditivesSnapshot(self.db_path, self.pool_size)
+            except sqlite3.Error as e:
+                logger.warning(f"Keeping revision {current.revision}: could not reload {self.db_path}: {e}")
+                return False
+            if not snapshot.additives:
+                # A build in progress (the schema is written before the data); its commit changes the file again
+                logger.warning(f"Keeping revision {current.revision}: {self.db_path} has no additives yet")
+                return False
+
+            with self._users_lock:
+                self.snapshot = snapshot
+                current.retired = True
+                done = current.users == 0
+            # Otherwise the last request still using it closes it
+            if done:
+                current.close()
+            logger.info(f"Reloaded {self.db_path}: revision {current.revision} -> {snapshot.revision} "
+                        f"({len(snapshot.additives)} additives)")
+            return True
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over the service attached to the server (server.service)."""
+
+    protocol_version = "HTTP/1.1"
+    # Keep-alive responses are written as headers + body; without TCP_NODELAY each waits for a delayed ACK
+    disable_nagle_algorithm = True
+    server_version = "AdditivesLookup/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        with self.server.service.use() as snapshot:
+            if url.path == "/health":
+                self.send_json({"version": snapshot.version, "revision": snapshot.revision,
+                                "additives": len(snapshot.additives), "pid": os.getpid()})
+            elif url.path.startswith("/additives/") and url.path != "/additives/batch":
+                additive = snapshot.lookup(unquote(url.path[len("/additives/"):]))
+                if additive is None:
+                    self.send_error_json(HTTPStatus.NOT_FOUND, "additive not found")
+                else:
+                    self.send_json(additive)
+            elif url.path == "/search":
+                params = parse_qs(url.query)
+                limit = self.parse_limit(params.get("limit", [None])[0])
+                if limit is None:
+                    return
+                try:
+                    self.send_json({"results": snapshot.search(params.get("q", [""])[0], limit)})
+                except sqlite3.OperationalError as e:
+                    self.send_error_json(HTTPStatus.BAD_REQUEST, f"invalid search: {e}")
+            else:
+                self.send_error_json(HTTPStatus.NOT_FOUND, "no such endpoint")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.read_json()
+        if body is None:
+            return
+        with self.server.service.use() as snapshot:
+            if url.path == "/additives/batch":
+                e_numbers = self.batch_items(body, "e_numbers")
+                if e_numbers is not None:
+                    self.send_json({"results": {text: snapshot.lookup(text) for text in e_numbers}})
+            elif url.path == "/search/batch":
+                queries = self.batch_items(body, "queries")
+                limit = self.parse_limit(body.get("limit"))
+                if queries is not None and limit is not None:
+                    try:
+                        self.send_json({"results": {text: snapshot.search(text, limit) for text in queries}})
+                    except sqlite3.OperationalError as e:
+                        self.send_error_json(HTTPStatus.BAD_REQUEST, f"invalid search: {e}")
+            else:
+                self.send_error_json(HTTPStatus.NOT_FOUND, "no such endpoint")
+
+    def parse_limit(self, value: Any) -> Optional[int]:
+        if value is None:
+            return DEFAULT_SEARCH_LIMIT
+        try:
+            limit = int(value)
+        except (TypeError, ValueError):
+            limit = 0
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+            return None
+        return limit
+
+    def batch_items(self, body: Dict[str, Any], key: str) -> Optional[List[str]]:
+        items = body.get(key)
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            self.send_error_json(HTTPStatus.BAD_REQUEST, f"{key} must be a list of strings")
+            return None
+        if len(items) > MAX_BATCH_SIZE:
+            self.send_error_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"at most {MAX_BATCH_SIZE} {key} per request")
+            return None
+        return items
+
+    def read_json(self) -> Optional[Dict[str, Any]]:
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_REQUEST_BYTES:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+            return None
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            self.send_error_json(HTTPStatus.BAD_REQUEST, "request body must be a JSON object")
+            return None
+        return body
+
+    def send_json(self, payload: Any, status: HTTPStatus = HTTPStatus.OK):
+        content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_error_json(self, status: HTTPStatus, message: str):
+        self.send_json({"error": message}, status)
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def serve_worker(server: ThreadingHTTPServer, db_path: str, pool_size: int, check_interval: float):
+    """Load the database and serve requests on server until interrupted."""
+    server.service = AdditivesService(db_path, pool_size, check_interval)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.snapshot.close()
+
+
+def serve(db_path: str = "additives.db", host: str = "127.0.0.1", port: int = DEFAULT_PORT, workers: int = 1,
+          pool_size: int = DEFAULT_POOL_SIZE, check_interval: float = 1.0):
+    """
+    Serve the lookup API. With workers > 1 (where fork is available) the listening
+    socket is opened once and shared by that many forked worker processes, each
+    with its own preloaded snapshot and connection pool.
+    """
+    server = ThreadingHTTPServer((host, port), LookupRequestHandler)
+    server.daemon_threads = True
+    logger.info(f"Serving {db_path} on http://{host}:{server.server_address[1]} with {workers} worker(s)")
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        serve_worker(server, db_path, pool_size, check_interval)
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # SQLite connections are opened after the fork, so no handle is shared
+            try:
+                serve_worker(server, db_path, pool_size, check_interval)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    server.server_close()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Stop the workers with the parent, whether interrupted or terminated by a service manager
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            with contextlib.suppress(OSError):
+                os.kill(pid, signal.SIGTERM)
+        for pid in children:
+            with contextlib.suppress(OSError):
+                os.waitpid(pid, 0)
+
+
+def main():
+    """Run the lookup service."""
+    parser = argparse.ArgumentParser(description="Serve additive lookups and search over HTTP/JSON")
+    parser.add_argument("--db", default="additives.db", help="Path of the additives database (default: additives.db)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes sharing the socket (default: 1)")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"Read-only connections per worker (default: {DEFAULT_POOL_SIZE})")
+    parser.add_argument("--check-interval", type=float, default=1.0,
+                        help="Seconds between checks of the database for a new version (default: 1)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    serve(args.db, args.host, args.port, args.workers, args.pool_size, args.check_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Batch Scoring of Open Food Facts Products
+
+Scores a product export (JSONL or CSV/TSV, optionally gzipped, e.g. the OFF
+products.jsonl.gz dump) against a generated additives.db. Each product's
+additives_tags ("en:e330", "en:e322i") are joined against an in-memory index
+built once per worker from the database, and the product gets its worst risk
+level plus the number of its additives at each risk level.
+
+The input is read line by line in chunks; chunks are scored by worker
+processes, with a bounded number of chunks in flight so memory stays flat
+whatever the input size. Results are written to an SQLite output database in
+input order, one transaction per chunk, together with the input offset
+reached, so an interrupted run resumes from the last written chunk. The
+checkpoint also records the input's size, mtime and a hash of its first bytes;
+a different file at the same path (a new dump) is scored from the start.
+"""
+
+import argparse
+import collections
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from e_numbers import fold_alias
+from risk_classifier import RISK_ORDER
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_LINES = 2000
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+# Chunks submitted but not yet written, per worker
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+# Bytes of the input hashed into its checkpoint fingerprint
+FINGERPRINT_HEAD_BYTES = 64 * 1024
+
+CODE_FIELD = "code"
+TAGS_FIELD = "additives_tags"
+
+# Set in each worker process by _init_worker
+_index: Optional["AdditiveIndex"] = None
+
+
+class AdditiveIndex:
+    """Risk levels by additive tag, loaded once from an additives database."""
+
+    def __init__(self, db_path: str):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            self.by_tag: Dict[str, str] = {}
+            for taxonomy_id, risk_level in conn.execute("SELECT taxonomy_id, risk_level FROM additives ORDER BY id"):
+                self.by_tag.setdefault(taxonomy_id.lower(), risk_level)
+            # Other spellings of the same E-number ("xx:e150d", "en:e-150d"); the first row wins, as in label_scan
+            self.by_alias: Dict[str, str] = {}
+            for alias, risk_level in conn.execute('''
+            SELECT x.alias, a.risk_level
+            FROM e_number_aliases x
+            JOIN additives a ON a.e_key = x.e_key AND a.e_variant = x.e_variant
+            WHERE x.kind = 'e_number'
+            ORDER BY a.id
+            '''):
+                self.by_alias.setdefault(alias, risk_level)
+        finally:
+            conn.close()
+
+    def risk_level(self, tag: str) -> Optional[str]:
+        """Risk level of an additives tag, or None for tags not in the database."""
+        tag = tag.strip().lower()
+        risk_level = self.by_tag.get(tag)
+        if risk_level is None:
+            risk_level = self.by_alias.get(fold_alias(tag.split(":", 1)[-1]))
+        return risk_level
+
+    def score(self, code: str, tags: List[str]) -> tuple:
+        """Output row (code, worst_risk, additives, green, yellow, orange, red, unknown) of one product."""
+        counts = [0] * len(RISK_ORDER)
+        unknown = 0
+        for tag in dict.fromkeys(tag for tag in tags if tag.strip()):
+            risk_level = self.risk_level(tag)
+            if risk_level in RISK_ORDER:
+                counts[RISK_ORDER.index(risk_level)] += 1
+            else:
+                unknown += 1
+        worst = next((RISK_ORDER[i] for i in reversed(range(len(counts))) if counts[i]), None)
+        return (code, worst, sum(counts) + unknown, *counts, unknown)
+
+
+def detect_format(path: str) -> str:
+    """'jsonl' or 'csv' from the file name (a trailing .gz is ignored)."""
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return "csv" if name.endswith((".csv", ".tsv")) else "jsonl"
+
+
+def open_input(path: str) -> BinaryIO:
+    """Open a product export for binary line reading, decompressing .gz files."""
+    return gzip.open(path, "rb") if path.lower().endswith(".gz") else open(path, "rb")
+
+
+def input_fingerprint(path: str) -> str:
+    """Size, mtime and SHA-256 of the first bytes of a file: changes when a new export replaces it."""
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        head = hashlib.sha256(f.read(FINGERPRINT_HEAD_BYTES)).hexdigest()
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{head}"
+
+
+def split_fields(line: str, delimiter: str) -> List[str]:
+    """
+    Fields of a CSV/TSV line. OFF's tab-separated exports are not quoted (fields may
+    contain a bare '"'), so tab-separated lines are split on tabs as they are.
+    """
+    if delimiter == "\t":
+        return line.split("\t")
+    return next(csv.reader([line], delimiter=delimiter))
+
+
+def read_csv_header(path: str) -> Tuple[str, Dict[str, int]]:
+    """(delimiter, column index by name) of a CSV/TSV export; OFF exports are tab-separated."""
+    with open_input(path) as f:
+        header = f.readline().decode("utf-8").rstrip("\r\n")
+    delimiter = "\t" if "\t" in header else ","
+    columns = {name: i for i, name in enumerate(split_fields(header, delimiter))}
+    for field in (CODE_FIELD, TAGS_FIELD):
+        if field not in columns:
+            raise ValueError(f"{path}: no {field} column in the header")
+    return delimiter, columns
+
+
+def read_chunks(path: str, offset: int = 0, skip_header: bool = False,
+                chunk_lines: int = DEFAULT_CHUNK_LINES,
+                chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Iterator[Tuple[List[bytes], int]]:
+    """
+    Yield (lines, end offset) chunks of the input from offset on. Offsets are positions
+    in the (decompressed) input, so a chunk's end offset is where to resume after it.
+    """
+    with open_input(path) as f:
+        if skip_header:
+            f.readline()
+        if offset > f.tell():
+            f.seek(offset)
+        lines: List[bytes] = []
+        size = 0
+        for line in iter(f.readline, b""):
+            lines.append(line)
+            size += len(line)
+            if len(lines) >= chunk_lines or size >= chunk_bytes:
+                yield lines, f.tell()
+                lines, size = [], 0
+        if lines:
+            yield lines, f.tell()
+
+
+def _init_worker(db_path: str):
+    global _index
+    _index = AdditiveIndex(db_path)
+
+
+def score_lines(lines: List[bytes], input_format: str,
+                csv_layout: Optional[Tuple[str, Dict[str, int]]] = None) -> Tuple[List[tuple], int]:
+    """Worker: score a chunk of input lines. Returns (output rows, number of unreadable lines)."""
+    rows = []
+    errors = 0
+    for line in lines:
+        try:
+            if input_format == "csv":
+                delimiter, columns = csv_layout
+                fields = split_fields(line.decode("utf-8").rstrip("\r\n"), delimiter)
+                code = fields[columns[CODE_FIELD]]
+                tags = fields[columns[TAGS_FIELD]].split(",") if len(fields) > columns[TAGS_FIELD] else []
+            else:
+                if not line.strip():
+                    continue
+                product = json.loads(line)
+                code = product.get(CODE_FIELD) or product.get("_id")
+                tags = product.get(TAGS_FIELD) or []
+        except (ValueError, IndexError, StopIteration, AttributeError):
+            errors += 1
+            continue
+        if not code:
+            errors += 1
+            continue
+        rows.append(_index.score(str(code), tags))
+    return rows, errors
+
+
+def open_output(path: str) -> sqlite3.Connection:
+    """Open (creating if needed) the output database of product scores and checkpoints."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    # WAL with NORMAL sync: each chunk commit is cheap, and a crash loses at most uncommitted chunks
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS product_scores (
+        code TEXT PRIMARY KEY,
+        worst_risk TEXT,
+        additives INTEGER NOT NULL,
+        green INTEGER NOT NULL,
+        yellow INTEGER NOT NULL,
+        orange INTEGER NOT NULL,
+        red INTEGER NOT NULL,
+        unknown INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS scoring_checkpoints (
+        input TEXT PRIMARY KEY,
+        offset INTEGER NOT NULL,
+        products INTEGER NOT NULL,
+        errors INTEGER NOT NULL,
+        fingerprint TEXT NOT NULL DEFAULT '',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID
+    ''')
+    # Checkpoints written before fingerprints: their empty fingerprint never matches, so those inputs restart
+    if "fingerprint" not in {row[1] for row in conn.execute("PRAGMA table_info(scoring_checkpoints)")}:
+        conn.execute("ALTER TABLE scoring_checkpoints ADD COLUMN fingerprint TEXT NOT NULL DEFAULT ''")
+    return conn
+
+
+def score_products(input_path: str, db_path: str = "additives.db", output_path: str = "product_scores.db",
+                   workers: Optional[int] = None, chunk_lines: int = DEFAULT_CHUNK_LINES,
+                   chunk_bytes: int = DEFAULT_CHUNK_BYTES, input_format: Optional[str] = None,
+                   restart: bool = False) -> Dict[str, Any]:
+    """
+    Score every product of input_path into output_path, resuming from the input's
+    checkpoint unless restart or the file changed since. Returns {"products", "errors", "offset", "resumed_from"}.
+    """
+    input_format = input_format or detect_format(input_path)
+    csv_layout = read_csv_header(input_path) if input_format == "csv" else None
+    checkpoint_key = os.path.abspath(input_path)
+    fingerprint = input_fingerprint(input_path)
+
+    conn = open_output(output_path)
+    try:
+        if restart:
+            conn.execute("DELETE FROM scoring_checkpoints WHERE input = ?", (checkpoint_key,))
+        checkpoint = conn.execute(
+            "SELECT offset, products, errors, fingerprint FROM scoring_checkpoints WHERE input = ?", (checkpoint_key,)
+        ).fetchone()
+        if checkpoint and checkpoint[3] != fingerprint:
+            logger.warning(f"{input_path} changed since its checkpoint; scoring it from the start")
+            checkpoint = None
+        offset, products, errors = checkpoint[:3] if checkpoint else (0, 0, 0)
+        resumed_from = offset
+        if offset:
+            logger.info(f"Resuming {input_path} at offset {offset} ({products} products already scored)")
+
+        workers = workers or os.cpu_count() or 1
+        pending: collections.deque = collections.deque()
+
+        def write_oldest():
+            nonlocal offset, products, errors
+            future, end_offset = pending.popleft()
+            rows, chunk_errors = future.result()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO product_scores VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                products += len(rows)
+                errors += chunk_errors
+                offset = end_offset
+                conn.execute('''
+                INSERT OR REPLACE INTO scoring_checkpoints (input, offset, products, errors, fingerprint, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (checkpoint_key, offset, products, errors, fingerprint))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_path,)) as executor:
+            chunks = read_chunks(input_path, offset, csv_layout is not None, chunk_lines, chunk_bytes)
+            for lines, end_offset in chunks:
+                pending.append((executor.submit(score_lines, lines, input_format, csv_layout), end_offset))
+                # Results are written in input order, so the checkpoint never skips a chunk
+                if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                    write_oldest()
+            while pending:
+                write_oldest()
+    finally:
+        conn.close()
+
+    logger.info(f"Scored {products} products from {input_path} into {output_path} ({errors} unreadable lines)")
+    return {"products": products, "errors": errors, "offset": offset, "resumed_from": resumed_from}
+
+
+def main():
+    """Score a product export and print a JSON summary."""
+    parser = argparse.ArgumentParser(description="Score Open Food Facts products by the risk of their additives")
+    parser.add_argument("input", help="Product export: JSONL or CSV/TSV, optionally .gz (e.g. products.jsonl.gz)")
+    parser.add_argument("--db", default="additives.db", help="Path of the additives database (default: additives.db)")
+    parser.add_argument("--output", default="product_scores.db",
+                        help="SQLite database for the scores and checkpoints (default: product_scores.db)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Input format (default: from the file name)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--chunk-lines", type=int, default=DEFAULT_CHUNK_LINES,
+                        help=f"Maximum products per chunk/transaction (default: {DEFAULT_CHUNK_LINES})")
+    parser.add_argument("--chunk-bytes", type=int, default=DEFAULT_CHUNK_BYTES,
+                        help=f"Maximum input bytes per chunk (default: {DEFAULT_CHUNK_BYTES})")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    summary = score_products(args.input, args.db, args.output, args.workers, args.chunk_lines,
+                             args.chunk_bytes, args.format, args.restart)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compiled Risk Classifier for Food Additives
+
+The risk rules are plain data tables (E-number tiers and keyword rules, loaded
+from the ruleset file by additive_rules) compiled once: exact E-number matches
+go through a single dict, and keyword rules are resolved with one precompiled
+regex pass per field. The classifier is shared by the database builder and can
+be reused at ingredient-scan time.
+"""
+
+import re
+from typing import Dict, List, Optional, Any, FrozenSet, Iterable, Sequence, Tuple
+
+RISK_COLORS = {
+    "GREEN": "green",
+    "YELLOW": "yellow",
+    "ORANGE": "orange",
+    "RED": "red",
+}
+
+# Least to most severe
+RISK_ORDER = ("GREEN", "YELLOW", "ORANGE", "RED")
+
+DEFAULT_RISK_LEVEL = "YELLOW"
+
+# E-number tiers are (risk_level, e_numbers) in precedence order (first listed wins
+# on overlap). Keyword rules are applied in order when there is no exact E-number
+# match; each is (field, keywords, risk_level, escalation), where escalation is an
+# optional (field, keywords, risk_level) that overrides the rule's result.
+
+
+class KeywordMatcher:
+    """Finds every keyword occurring as a substring of a text in a single regex pass."""
+
+    def __init__(self, keywords: Iterable[str]):
+        # Longest first so overlapping keywords starting at the same position resolve
+        # to the longest one; shorter prefixes of it are implied.
+        ordered = sorted(set(keywords), key=len, reverse=True)
+        self.pattern = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in ordered) + "))")
+        self.implied = {
+            keyword: frozenset(other for other in ordered if other != keyword and keyword.startswith(other))
+            for keyword in ordered
+        }
+
+    def find(self, text: str) -> FrozenSet[str]:
+        """Return the set of keywords contained in text."""
+        found = set()
+        for match in self.pattern.finditer(text):
+            keyword = match.group(1)
+            found.add(keyword)
+            found.update(self.implied[keyword])
+        return frozenset(found)
+
+
+class RiskClassifier:
+    """Table-driven risk classifier compiled once from E-number tiers and keyword rules."""
+
+    def __init__(self, e_number_tiers: Sequence[Tuple[str, Iterable[str]]],
+                 keyword_rules: Sequence[tuple],
+                 default_risk_level: str = DEFAULT_RISK_LEVEL):
+        self.default_risk_level = default_risk_level
+
+        # Single exact-match dict; lower tiers are written first so higher precedence wins
+        self.e_number_risks: Dict[str, str] = {}
+        for risk_level, e_numbers in reversed(e_number_tiers):
+            for e_number in e_numbers:
+                self.e_number_risks[e_number] = risk_level
+
+        field_keywords: Dict[str, set] = {}
+        self.rules: List[Tuple[str, FrozenSet[str], str, Optional[Tuple[str, FrozenSet[str], str]]]] = []
+        for field, keywords, risk_level, escalation in keyword_rules:
+            field_keywords.setdefault(field, set()).update(keywords)
+            compiled_escalation = None
+            if escalation:
+                escalation_field, escalation_keywords, escalation_level = escalation
+                field_keywords.setdefault(escalation_field, set()).update(escalation_keywords)
+                compiled_escalation = (escalation_field, frozenset(escalation_keywords), escalation_level)
+            self.rules.append((field, frozenset(keywords), risk_level, compiled_escalation))
+
+        self.matchers = {field: KeywordMatcher(keywords) for field, keywords in field_keywords.items()}
+
+    @staticmethod
+    def e_number_lookup_key(e_number: Any) -> str:
+        """Key into the E-number tiers: lowercase without the "E" prefix ("E160a" -> "160a")."""
+        key = str(e_number).strip().lower()
+        return key[1:] if key.startswith("e") else key
+
+    def classify_level(self, additive: Dict[str, Any]) -> str:
+        """Return the risk level (GREEN/YELLOW/ORANGE/RED) for a single additive record."""
+        risk_level = self.e_number_risks.get(self.e_number_lookup_key(additive.get("e_number", "")))
+        if risk_level is not None:
+            return risk_level
+
+        matches = {
+            field: matcher.find(str(additive.get(field, "")).lower())
+            for field, matcher in self.matchers.items()
+        }
+
+        for field, keywords, risk_level, escalation in self.rules:
+            if keywords.isdisjoint(matches[field]):
+                continue
+            if escalation and not escalation[1].isdisjoint(matches[escalation[0]]):
+                return escalation[2]
+            return risk_level
+
+        return self.default_risk_level
+
+    def classify(self, additive: Dict[str, Any]) -> Tuple[str, str]:
+        """Return the (risk_level, risk_color) tuple for a single additive record."""
+        risk_level = self.classify_level(additive)
+        return risk_level, RISK_COLORS[risk_level]
+
+    def classify_batch(self, records: Iterable[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Classify many additive records, returning (risk_level, risk_color) tuples in order."""
+        classify = self.classify
+        return [classify(record) for record in records]
+
+
+def __getattr__(name: str) -> Any:
+    # DEFAULT_CLASSIFIER is compiled from the default ruleset file on first use
+    if name == "DEFAULT_CLASSIFIER":
+        from additive_rules import default_ruleset
+        return default_ruleset().classifier
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def classify_batch(records: Iterable[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Classify many additive records with the default rule set."""
+    from additive_rules import default_ruleset
+    return default_ruleset().classifier.classify_batch(records)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Load-Time Validation of Additive Rows
+
+RowValidator checks each insert-ready additive row (see build_additive_rows)
+once, as the rows are produced, before anything is written to the database.
+Duplicates are detected with hash sets of the keys seen so far, so validation
+is a single linear pass. Rows with errors are dropped from the load; warnings
+are reported but the row is kept. Every violation is counted in a
+ValidationReport, which keeps the first few offending rows of each rule and
+can be written as JSON.
+
+The same invariants are enforced by the schema (CHECK constraints on the risk
+columns and required fields, UNIQUE (e_key, e_variant)), so rows that bypass
+the validator cannot be stored either.
+"""
+
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+
+from e_numbers import normalize_e_number
+from risk_classifier import RISK_COLORS
+
+# Positions in an additive row tuple
+TAXONOMY_ID, E_NUMBER, NAME, RISK_LEVEL, RISK_COLOR = 0, 1, 2, 3, 4
+VEGETARIAN, VEGAN = 7, 8
+E_KEY, E_VARIANT = 15, 16
+
+DIET_STATUSES = frozenset({"", "yes", "no", "maybe"})
+
+# Rule -> severity; rows violating an error rule are not loaded
+RULES = {
+    "missing_field": "error",
+    "invalid_risk_level": "error",
+    "invalid_risk_color": "error",
+    "duplicate_taxonomy_id": "error",
+    "duplicate_e_number": "error",
+    "unparsable_e_number": "warning",
+    "invalid_diet_status": "warning",
+}
+
+DEFAULT_MAX_SAMPLES = 20
+
+
+class ValidationReport:
+    """Violation counts by rule, with the first offending rows of each rule."""
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.rows_checked = 0
+        self.rows_rejected = 0
+        self.counts: Dict[str, int] = {}
+        self.samples: Dict[str, List[Dict[str, Any]]] = {}
+
+    def add(self, rule: str, row: tuple, detail: str):
+        self.counts[rule] = self.counts.get(rule, 0) + 1
+        samples = self.samples.setdefault(rule, [])
+        if len(samples) < self.max_samples:
+            samples.append({"taxonomy_id": row[TAXONOMY_ID], "e_number": row[E_NUMBER], "detail": detail})
+
+    @property
+    def errors(self) -> int:
+        return sum(count for rule, count in self.counts.items() if RULES[rule] == "error")
+
+    @property
+    def warnings(self) -> int:
+        return sum(count for rule, count in self.counts.items() if RULES[rule] == "warning")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows_checked": self.rows_checked,
+            "rows_rejected": self.rows_rejected,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "violations": {
+                rule: {"severity": RULES[rule], "count": count, "samples": self.samples[rule]}
+                for rule, count in sorted(self.counts.items())
+            },
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def summary(self) -> str:
+        """One line per violated rule, e.g. "duplicate_e_number (error): 2"."""
+        return "\n".join(f"{rule} ({RULES[rule]}): {count}" for rule, count in sorted(self.counts.items()))
+
+
+class RowValidator:
+    """Streaming validator of additive rows; see the module docstring."""
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.report = ValidationReport(max_samples)
+        self.taxonomy_ids = set()
+        self.e_keys = set()
+
+    def check(self, row: tuple) -> bool:
+        """Record the violations of row; True if it can be loaded."""
+        report = self.report
+        report.rows_checked += 1
+        errors = report.errors
+
+        missing = [field for field, i in (("taxonomy_id", TAXONOMY_ID), ("e_number", E_NUMBER), ("name", NAME))
+                   if not str(row[i] or "").strip()]
+        if missing:
+            report.add("missing_field", row, ", ".join(missing))
+        if row[RISK_LEVEL] not in RISK_COLORS:
+            report.add("invalid_risk_level", row, str(row[RISK_LEVEL]))
+        elif row[RISK_COLOR] != RISK_COLORS[row[RISK_LEVEL]]:
+            report.add("invalid_risk_color", row, f"{row[RISK_COLOR]} for {row[RISK_LEVEL]}")
+
+        if row[TAXONOMY_ID] in self.taxonomy_ids:
+            report.add("duplicate_taxonomy_id", row, str(row[TAXONOMY_ID]))
+        e_key = (row[E_KEY], row[E_VARIANT])
+        if e_key in self.e_keys:
+            report.add("duplicate_e_number", row, "".join(e_key))
+
+        if not normalize_e_number(str(row[E_NUMBER] or "")):
+            report.add("unparsable_e_number", row, str(row[E_NUMBER]))
+        for field, i in (("vegetarian", VEGETARIAN), ("vegan", VEGAN)):
+            if (row[i] or "") not in DIET_STATUSES:
+                report.add("invalid_diet_status", row, f"{field}={row[i]}")
+
+        if report.errors > errors:
+            report.rows_rejected += 1
+            return False
+        # Only loaded rows claim their keys, so a rejected row never hides a later valid one
+        self.taxonomy_ids.add(row[TAXONOMY_ID])
+        self.e_keys.add(e_key)
+        return True
+
+    def filter(self, rows: Iterable[tuple]) -> Iterator[tuple]:
+        """The rows that pass validation, checked one at a time as they are consumed."""
+        return (row for row in rows if self.check(row))
@@ -8,10 +8,12 @@ FROM additives
 WHERE risk_color = 'red' 
 ORDER BY e_number;
 
--- 2. Search for additives by name (case-insensitive)
-SELECT e_number, name, risk_level
-FROM additives 
-WHERE LOWER(name) LIKE LOWER('%curcumin%');
+-- 2. Search for additives by name (ranked full-text search)
+SELECT a.e_number, a.name, a.risk_level
+FROM additives_fts 
+JOIN additives a ON a.id = additives_fts.rowid
+WHERE additives_fts MATCH 'curcumin'
+ORDER BY bm25(additives_fts, 10.0, 1.0, 2.0, 5.0);
 
 -- 3. Get vegetarian-friendly additives
 SELECT e_number, name, risk_level
@@ -19,9 +21,9 @@ FROM additives
 WHERE vegetarian = 'yes' 
 ORDER BY risk_color, e_number;
 
--- 4. Get additives by category
-SELECT category, COUNT(*) as count
-FROM additives 
+-- 4. Get additives by category (precomputed category x risk counts)
+SELECT category, SUM(count) as count
+FROM category_risk_stats 
 GROUP BY category 
 ORDER BY count DESC;
 
@@ -31,20 +33,21 @@ FROM additives
 WHERE efsa_evaluation != '' 
 ORDER BY e_number;
 
--- 6. Risk level summary
+-- 6. Risk level summary (precomputed)
 SELECT 
     risk_level,
     risk_color,
-    COUNT(*) as count,
-    ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM additives), 2) as percentage
-FROM additives 
-GROUP BY risk_level, risk_color 
+    count,
+    ROUND(count * 100.0 / (SELECT SUM(count) FROM risk_stats), 2) as percentage
+FROM risk_stats 
 ORDER BY count DESC;
 
--- 7. Search additives for ingredient scanning (by E-number)
-SELECT e_number, name, risk_level, risk_color
-FROM additives 
-WHERE e_number = ?;  -- Parameter for E-number lookup
+-- 7. Search additives for ingredient scanning (by E-number, any spelling)
+-- Fold the scanned text to lowercase alphanumerics first: 'E 160a (ii)' -> 'e160aii'
+SELECT a.e_key, a.e_variant, a.name, a.risk_level, a.risk_color, a.category
+FROM e_number_aliases x
+JOIN additives a ON a.e_key = x.e_key AND a.e_variant = x.e_variant
+WHERE x.alias = ?;  -- Parameter: folded E-number or name
 
 -- 8. Get all safe additives (Green)
 SELECT e_number, name, risk_level
@@ -58,10 +61,10 @@ FROM additives
 WHERE taxonomy_id = ?;  -- Parameter for exact taxonomy lookup (e.g., 'en:e420i')
 
 -- 10. Get all variants of a specific E-number
-SELECT taxonomy_id, e_number, name, risk_level, risk_color
+SELECT taxonomy_id, e_key, e_variant, name, risk_level, risk_color
 FROM additives 
-WHERE e_number = '420'  -- Shows E420, E420i, E420ii
-ORDER BY taxonomy_id;
+WHERE e_key = '420'  -- Shows E420, E420i, E420ii
+ORDER BY e_variant;
 
 -- 11. Compare risk levels within same E-number family
 SELECT 
@@ -86,4 +89,73 @@ JOIN additives a2 ON a1.e_number = a2.e_number
 WHERE a1.risk_color = 'green' 
   AND a2.risk_color IN ('orange', 'red')
 ORDER BY a1.e_number;
+
+-- 13. Search-as-you-type (prefix match on every term, best matches first)
+-- Quote each typed term and append *, e.g. 'tartra yell' -> '"tartra"* "yell"*'
+SELECT a.e_number, a.name, a.risk_level, a.risk_color
+FROM additives_fts 
+JOIN additives a ON a.id = additives_fts.rowid
+WHERE additives_fts MATCH ?  -- Parameter: prefix query
+ORDER BY bm25(additives_fts, 10.0, 1.0, 2.0, 5.0)
+LIMIT 20;
+
+-- 14. Ranked search across name, description and classes with highlighted names
+SELECT 
+    a.e_number,
+    highlight(additives_fts, 0, '[', ']') as name_match,
+    snippet(additives_fts, 1, '[', ']', '...', 12) as description_match,
+    a.risk_level
+FROM additives_fts 
+JOIN additives a ON a.id = additives_fts.rowid
+WHERE additives_fts MATCH ?  -- Parameter: search query
+ORDER BY bm25(additives_fts, 10.0, 1.0, 2.0, 5.0)
+LIMIT 20;
+
+-- 15. Additives with their names in the user's language (built with --languages)
+SELECT a.e_number, COALESCE(l.name, a.name) as name, COALESCE(l.description, a.description) as description,
+       a.risk_level, a.risk_color
+FROM additives a
+LEFT JOIN localized_names l ON l.additive_id = a.id AND l.lang = ?  -- Parameter: language code, e.g. 'de'
+ORDER BY a.e_number;
+
+-- 16. Localized name prefix search (uses idx_localized_lang_name)
+SELECT a.e_number, l.name, a.risk_level
+FROM localized_names l
+JOIN additives a ON a.id = l.additive_id
+WHERE l.lang = ? AND l.name >= ? AND l.name < ? || char(1114111)  -- Parameters: language, prefix, prefix
+ORDER BY l.name;
+
+-- 17. Sync: additives added or changed since the client's last revision
+SELECT * FROM additives
+WHERE revision > ?  -- Parameter: client's last synced revision (metadata 'revision')
+ORDER BY revision;
+
+-- 18. Sync: additives deleted since the client's last revision
+SELECT taxonomy_id FROM deleted_additives
+WHERE revision > ?;  -- Parameter: client's last synced revision
+
+-- 19. Additives having any class in a category (indexed joins, e.g. every stabiliser)
+SELECT a.e_number, a.name, a.risk_level, c.name as class_name
+FROM classes c
+JOIN additive_classes ac ON ac.class_id = c.id
+JOIN additives a ON a.id = ac.additive_id
+WHERE c.category = ?  -- Parameter: category, e.g. 'Stabilizers'
+ORDER BY a.e_key, a.e_variant;
+
+-- 20. Number of additives per class
+SELECT c.tag, c.name, c.category, COUNT(*) as count
+FROM additive_classes ac
+JOIN classes c ON c.id = ac.class_id
+GROUP BY ac.class_id
+ORDER BY count DESC;
+
+-- 21. Risk levels within each category (precomputed)
+SELECT category, risk_level, count
+FROM category_risk_stats
+ORDER BY category, risk_level;
+
+-- 22. Vegetarian/vegan status counts (precomputed)
+SELECT diet, status, count
+FROM diet_stats
+ORDER BY diet, count DESC;
         
\ No newline at end of file
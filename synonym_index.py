@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Ingredient-Name Synonym Index
+
+Labels name additives ("sodium benzoate", "colour: tartrazine") far more often
+than by E-number. Every name of every additive, in the languages the database
+is built for (--languages), is compiled into a word-level Aho-Corasick
+automaton: names are
+split into folded words (casefolded, without diacritics), the words of all
+names form a trie, and failure links let a matcher find every name occurring
+in a text in one pass over its words. Names only match on word boundaries,
+and overlapping matches resolve to the leftmost, then longest, name.
+
+The automaton is stored in the database (synonym_words: word -> id, and
+synonym_trie: one row per trie edge, keyed by (parent, word_id), with the
+target state's failure link and additive id). Word and state ids in the
+database are stable hashes of the word and of the word path from the root
+(the root is 0), so a taxonomy update only changes the rows of the names it
+touches and delta patches stay small. The compact export leaves these tables
+out; the automaton is written instead to a flat binary file, with dense ids,
+that clients can mmap:
+
+    header   magic "ADSY", format version u16, reserved u16, word count u32,
+             state count u32, edge count u32, words offset u32,
+             states offset u32, edges offset u32, strings offset u32
+    words    u32 offset + u16 length + u16 reserved into the string table,
+             sorted by UTF-8 bytes (a word's id is its position)
+    states   first edge u32, edge count u32, failure state u32, additive id u32
+             (0: no name ends here), in breadth-first order (root = 0)
+    edges    word id u32 + target state u32, sorted by word id within a state
+    strings  UTF-8 words
+
+All integers are little-endian.
+"""
+
+import functools
+import hashlib
+import re
+import sqlite3
+import struct
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from e_numbers import additive_e_key, strip_e_number_label
+
+SYNONYM_INDEX_MAGIC = b"ADSY"
+SYNONYM_INDEX_VERSION = 1
+HEADER_FORMAT = struct.Struct("<4sHHIIIIIII")
+WORD_FORMAT = struct.Struct("<IHH")
+STATE_FORMAT = struct.Struct("<IIII")
+EDGE_FORMAT = struct.Struct("<II")
+
+# Width of the stable word and state ids of the database tables (SQLite stores them in 6 bytes)
+STABLE_ID_BITS = 48
+
+_WORD = re.compile(r"\w+")
+
+
+@functools.lru_cache(maxsize=65536)
+def fold_word(word: str) -> str:
+    """Matching form of a word: casefolded, without diacritics ("Éthyl" -> "ethyl")."""
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def text_words(text: str) -> List[Tuple[str, int, int]]:
+    """(folded word, start, end) of every word of text, in order."""
+    return [(fold_word(match.group(0)), match.start(), match.end()) for match in _WORD.finditer(text)]
+
+
+def name_words(name: str) -> Tuple[str, ...]:
+    """Folded words of an additive name, without any leading "E123 - " label."""
+    return tuple(word for word, _, _ in text_words(strip_e_number_label(name)))
+
+
+def stable_ids(keys: Iterable[Tuple[str, ...]]) -> Dict[Tuple[str, ...], int]:
+    """
+    Stable non-zero ids of keys (word tuples) from a hash of their words. Collisions
+    are resolved by probing the next id, in sorted key order, so ids are deterministic.
+    """
+    ids: Dict[Tuple[str, ...], int] = {}
+    used = set()
+    for key in sorted(keys):
+        digest = hashlib.blake2b("\x1f".join(key).encode("utf-8"), digest_size=STABLE_ID_BITS // 8).digest()
+        stable_id = int.from_bytes(digest, "little")
+        while not stable_id or stable_id in used:
+            stable_id = (stable_id + 1) % (1 << STABLE_ID_BITS)
+        used.add(stable_id)
+        ids[key] = stable_id
+    return ids
+
+
+def additive_names(additive: Dict[str, Any]) -> Iterator[Tuple[str, ...]]:
+    """Word sequences of every name of an additive record (its name and its names in the built languages)."""
+    for name in [additive.get("name", ""), *additive.get("names", {}).values()]:
+        words = name_words(name or "")
+        if words:
+            yield words
+
+
+class SynonymAutomaton:
+    """Word-level Aho-Corasick automaton from additive names to additive ids."""
+
+    def __init__(self, words: Dict[str, int], edges: List[Dict[int, int]], fail: List[int], output: List[int]):
+        self.words = words
+        self.edges = edges
+        self.fail = fail
+        self.output = output
+        # States are in breadth-first order, so parents and failure states come first
+        self.depth = [0] * len(edges)
+        self.output_link = [0] * len(edges)
+        for state, targets in enumerate(edges):
+            for target in targets.values():
+                self.depth[target] = self.depth[state] + 1
+            if state:
+                suffix = fail[state]
+                self.output_link[state] = suffix if output[suffix] else self.output_link[suffix]
+
+    @classmethod
+    def build(cls, patterns: Iterable[Tuple[Sequence[str], int]]) -> "SynonymAutomaton":
+        """Compile (words, additive id) patterns; the first pattern of a name wins."""
+        children: List[Dict[str, int]] = [{}]
+        values = [0]
+        for words, value in patterns:
+            state = 0
+            for word in words:
+                target = children[state].get(word)
+                if target is None:
+                    target = children[state][word] = len(children)
+                    children.append({})
+                    values.append(0)
+                state = target
+            if state and not values[state]:
+                values[state] = value
+
+        vocabulary = sorted({word for targets in children for word in targets}, key=lambda word: word.encode("utf-8"))
+        word_ids = {word: word_id for word_id, word in enumerate(vocabulary)}
+
+        # Renumber the trie breadth-first
+        order = [0]
+        numbers = {0: 0}
+        for state in order:
+            for word in sorted(children[state], key=word_ids.__getitem__):
+                numbers[children[state][word]] = len(order)
+                order.append(children[state][word])
+        edges = [{word_ids[word]: numbers[target] for word, target in children[state].items()} for state in order]
+        output = [values[state] for state in order]
+
+        fail = [0] * len(edges)
+        for state, targets in enumerate(edges):
+            for word_id, target in targets.items():
+                if not state:
+                    continue
+                suffix = fail[state]
+                while suffix and word_id not in edges[suffix]:
+                    suffix = fail[suffix]
+                fail[target] = edges[suffix].get(word_id, 0)
+        return cls(word_ids, edges, fail, output)
+
+    @property
+    def state_count(self) -> int:
+        return len(self.edges)
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """(start, end, additive id) of the names found in text, leftmost-longest and non-overlapping."""
+        tokens = text_words(text)
+        edges, fail, output, output_link, depth = self.edges, self.fail, self.output, self.output_link, self.depth
+        matches = []
+        state = 0
+        for i, (word, _, _) in enumerate(tokens):
+            word_id = self.words.get(word)
+            if word_id is None:
+                state = 0
+                continue
+            while state and word_id not in edges[state]:
+                state = fail[state]
+            state = edges[state].get(word_id, 0)
+            found = state if output[state] else output_link[state]
+            while found:
+                matches.append((i - depth[found] + 1, i, output[found]))
+                found = output_link[found]
+
+        results = []
+        next_free = 0
+        for first, last, additive_id in sorted(matches, key=lambda match: (match[0], -match[1])):
+            if first >= next_free:
+                results.append((tokens[first][1], tokens[last][2], additive_id))
+                next_free = last + 1
+        return results
+
+    def rows(self) -> Tuple[List[tuple], List[tuple]]:
+        """
+        (synonym_words rows (word, id), synonym_trie rows (parent, word_id, state, fail, additive_id)),
+        with stable word and state ids.
+        """
+        words_by_id = {word_id: word for word, word_id in self.words.items()}
+        word_ids = {word: stable_id for (word,), stable_id in stable_ids((word,) for word in self.words).items()}
+        paths: List[Tuple[str, ...]] = [()] * len(self.edges)
+        for state, targets in enumerate(self.edges):
+            for word_id, target in targets.items():
+                paths[target] = paths[state] + (words_by_id[word_id],)
+        path_ids = stable_ids(paths[1:])
+        state_ids = [path_ids[path] if state else 0 for state, path in enumerate(paths)]
+
+        word_rows = sorted(word_ids.items())
+        trie_rows = [
+            (state_ids[state], word_ids[words_by_id[word_id]], state_ids[target],
+             state_ids[self.fail[target]], self.output[target] or None)
+            for state, targets in enumerate(self.edges)
+            for word_id, target in targets.items()
+        ]
+        return word_rows, trie_rows
+
+    @classmethod
+    def from_rows(cls, word_rows: Iterable[tuple], trie_rows: Iterable[tuple]) -> "SynonymAutomaton":
+        """Automaton from synonym_words and synonym_trie rows (states are renumbered breadth-first)."""
+        children: Dict[int, List[Tuple[int, int]]] = {}
+        targets: Dict[int, Tuple[int, int]] = {}
+        for parent, word_id, state, state_fail, additive_id in trie_rows:
+            children.setdefault(parent, []).append((word_id, state))
+            targets[state] = (state_fail, additive_id or 0)
+
+        order = [0]
+        numbers = {0: 0}
+        for state in order:
+            for _, target in sorted(children.get(state, ())):
+                numbers[target] = len(order)
+                order.append(target)
+        edges = [{word_id: numbers[target] for word_id, target in children.get(state, ())} for state in order]
+        fail = [numbers[targets[state][0]] if state else 0 for state in order]
+        output = [targets[state][1] if state else 0 for state in order]
+        return cls(dict(word_rows), edges, fail, output)
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection) -> Optional["SynonymAutomaton"]:
+        """Load the automaton from an additives database (None if it has no synonym index)."""
+        try:
+            word_rows = conn.execute("SELECT word, id FROM synonym_words").fetchall()
+            trie_rows = conn.execute("SELECT parent, word_id, state, fail, additive_id FROM synonym_trie").fetchall()
+        except sqlite3.OperationalError:
+            return None
+        return cls.from_rows(word_rows, trie_rows) if trie_rows else None
+
+    def to_bytes(self) -> bytes:
+        """The automaton in the binary format of the module docstring."""
+        vocabulary = sorted(self.words, key=lambda word: word.encode("utf-8"))
+        positions = {self.words[word]: position for position, word in enumerate(vocabulary)}
+        strings = bytearray()
+        word_records = bytearray()
+        for word in vocabulary:
+            encoded = word.encode("utf-8")
+            word_records += WORD_FORMAT.pack(len(strings), len(encoded), 0)
+            strings += encoded
+
+        state_records = bytearray()
+        edge_records = bytearray()
+        edge_count = 0
+        for state, targets in enumerate(self.edges):
+            state_records += STATE_FORMAT.pack(edge_count, len(targets), self.fail[state], self.output[state])
+            for position, target in sorted((positions[word_id], target) for word_id, target in targets.items()):
+                edge_records += EDGE_FORMAT.pack(position, target)
+            edge_count += len(targets)
+
+        words_offset = HEADER_FORMAT.size
+        states_offset = words_offset + len(word_records)
+        edges_offset = states_offset + len(state_records)
+        strings_offset = edges_offset + len(edge_records)
+        header = HEADER_FORMAT.pack(SYNONYM_INDEX_MAGIC, SYNONYM_INDEX_VERSION, 0, len(vocabulary),
+                                    len(self.edges), edge_count, words_offset, states_offset,
+                                    edges_offset, strings_offset)
+        return header + bytes(word_records) + bytes(state_records) + bytes(edge_records) + bytes(strings)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SynonymAutomaton":
+        (magic, version, _, word_count, state_count, edge_count, words_offset, states_offset,
+         edges_offset, strings_offset) = HEADER_FORMAT.unpack_from(data, 0)
+        if magic != SYNONYM_INDEX_MAGIC or version != SYNONYM_INDEX_VERSION:
+            raise ValueError(f"Not a synonym index (magic {magic!r}, version {version})")
+
+        words = {}
+        for word_id, (offset, length, _) in enumerate(
+                WORD_FORMAT.iter_unpack(data[words_offset:words_offset + word_count * WORD_FORMAT.size])):
+            start = strings_offset + offset
+            words[data[start:start + length].decode("utf-8")] = word_id
+        edge_list = list(EDGE_FORMAT.iter_unpack(data[edges_offset:edges_offset + edge_count * EDGE_FORMAT.size]))
+
+        edges, fail, output = [], [], []
+        for first, count, state_fail, additive_id in STATE_FORMAT.iter_unpack(
+                data[states_offset:states_offset + state_count * STATE_FORMAT.size]):
+            edges.append(dict(edge_list[first:first + count]))
+            fail.append(state_fail)
+            output.append(additive_id)
+        return cls(words, edges, fail, output)
+
+    def write(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def read(cls, path: str) -> "SynonymAutomaton":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def build_synonym_automaton(additives: Iterable[Dict[str, Any]], additive_ids: Dict[str, int]) -> SynonymAutomaton:
+    """
+    Automaton over the names of additives, mapped to their ids (additive_ids: taxonomy_id -> id).
+    Base E-numbers win name conflicts over sub-variants, as in e_number_aliases.
+    """
+    keyed = [(additive_e_key(additive), additive) for additive in additives
+             if additive.get("taxonomy_id") in additive_ids]
+    keyed.sort(key=lambda item: (item[0][1] != "", item[0]))
+    return SynonymAutomaton.build(
+        (words, additive_ids[additive["taxonomy_id"]])
+        for _, additive in keyed
+        for words in additive_names(additive)
+    )
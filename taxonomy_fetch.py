@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Concurrent Downloads of Open Food Facts Taxonomies
+
+Fetches several taxonomies (additives.json plus related ones such as
+additives_classes.json) at the same time, so the total fetch time is that of
+the slowest download rather than the sum:
+
+- one shared requests.Session with a connection pool sized to the concurrency;
+  blocking requests run in worker threads driven by asyncio
+- a semaphore bounds the number of downloads in flight
+- failed attempts (connection errors, timeouts, 429/5xx) are retried with
+  exponential backoff and jitter, honoring Retry-After
+- bodies are streamed to a .part file while hashing; a retried or later
+  download resumes it with an HTTP Range request (If-Range guards against the
+  file having changed in between)
+- requests are conditional on the ETag/Last-Modified of the previous build
+
+The base URL is configurable, so the fetcher can be pointed at a local
+stand-in server.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+OPENFOODFACTS_TAXONOMY_BASE_URL = "https://static.openfoodfacts.org/data/taxonomies"
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 4
+DEFAULT_TIMEOUT = 30
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+CHUNK_SIZE = 64 * 1024
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class RetryableError(Exception):
+    """A failed attempt worth retrying (optionally after the server's Retry-After delay)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def taxonomy_url(name: str, base_url: str = OPENFOODFACTS_TAXONOMY_BASE_URL) -> str:
+    """Download URL of a taxonomy ("additives" -> .../additives.json)."""
+    return f"{base_url.rstrip('/')}/{name}.json"
+
+
+def create_session(pool_size: int = DEFAULT_CONCURRENCY) -> requests.Session:
+    """A session whose connection pool holds one keep-alive connection per concurrent download."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds to wait before retry number attempt (1-based): exponential with jitter, or Retry-After."""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    return delay * (0.5 + random.random() / 2)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _read_validators(path: str) -> Dict[str, str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def download_taxonomy(session: requests.Session, url: str, output_path: str,
+                      previous: Optional[Dict[str, str]] = None, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """
+    One download attempt of url to output_path, resuming output_path.part if present.
+    Returns a snapshot dict (path, sha256, etag, last_modified, unchanged, bytes, resumed);
+    path is "" when the content is unchanged since previous. Raises RetryableError
+    for transient failures and requests.RequestException for permanent ones.
+    """
+    previous = previous or {}
+    partial_path = output_path + ".part"
+    validators_path = partial_path + ".json"
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        partial_validators = _read_validators(validators_path)
+        if_range = partial_validators.get("etag") or partial_validators.get("last_modified")
+        if if_range:
+            headers["If-Range"] = if_range
+    else:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    try:
+        with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304:
+                return {
+                    "path": "",
+                    "sha256": previous.get("sha256", ""),
+                    "etag": previous.get("etag", ""),
+                    "last_modified": previous.get("last_modified", ""),
+                    "unchanged": True,
+                    "bytes": 0,
+                    "resumed": False,
+                }
+            if response.status_code == 416:
+                # The partial file does not fit the current resource: start over
+                os.remove(partial_path)
+                raise RetryableError(f"{url}: range not satisfiable, restarting download", retry_after=0)
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableError(f"{url}: HTTP {response.status_code}",
+                                     _parse_retry_after(response.headers.get("Retry-After")))
+            response.raise_for_status()
+
+            etag = response.headers.get("ETag", "")
+            last_modified = response.headers.get("Last-Modified", "")
+            resumed = response.status_code == 206 and offset > 0
+            digest = hashlib.sha256()
+            if resumed:
+                with open(partial_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+            else:
+                offset = 0
+                with open(validators_path, "w", encoding="utf-8") as f:
+                    json.dump({"etag": etag, "last_modified": last_modified}, f)
+
+            with open(partial_path, "ab" if resumed else "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+    except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+        # The .part file is kept and resumed by the next attempt
+        raise RetryableError(f"{url}: {e}") from e
+
+    size = os.path.getsize(partial_path)
+    sha256 = digest.hexdigest()
+    unchanged = sha256 == previous.get("sha256")
+    # Only keep a raw dump when the content actually changed
+    if unchanged:
+        os.remove(partial_path)
+    else:
+        os.replace(partial_path, output_path)
+    if os.path.exists(validators_path):
+        os.remove(validators_path)
+
+    return {
+        "path": "" if unchanged else output_path,
+        "sha256": sha256,
+        "etag": etag,
+        "last_modified": last_modified,
+        "unchanged": unchanged,
+        "bytes": size,
+        "resumed": resumed,
+    }
+
+
+async def fetch_with_retry(session: requests.Session, semaphore: asyncio.Semaphore, name: str, url: str,
+                           output_path: str, previous: Optional[Dict[str, str]] = None,
+                           retries: int = DEFAULT_RETRIES, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """Download one taxonomy in a worker thread, retrying transient failures with backoff."""
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        async with semaphore:
+            try:
+                snapshot = await loop.run_in_executor(None, functools.partial(
+                    download_taxonomy, session, url, output_path, previous, timeout
+                ))
+                return dict(snapshot, name=name, url=url)
+            except RetryableError as e:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                delay = retry_delay(attempt, e.retry_after)
+                logger.warning(f"Fetching {name} failed ({e}); retry {attempt}/{retries} in {delay:.1f}s")
+        # Back off outside the semaphore so other downloads can proceed
+        await asyncio.sleep(delay)
+
+
+async def fetch_taxonomies_async(targets: Dict[str, Tuple[str, str]],
+                                 previous: Optional[Dict[str, Dict[str, str]]] = None,
+                                 concurrency: int = DEFAULT_CONCURRENCY, retries: int = DEFAULT_RETRIES,
+                                 timeout: float = DEFAULT_TIMEOUT,
+                                 session: Optional[requests.Session] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Download every target (name -> (url, output path)) concurrently.
+    Returns name -> snapshot, or None for downloads that failed after all retries.
+    """
+    previous = previous or {}
+    owned_session = session is None
+    session = session or create_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    names = list(targets)
+    try:
+        results = await asyncio.gather(*(
+            fetch_with_retry(session, semaphore, name, targets[name][0], targets[name][1],
+                             previous.get(name), retries, timeout)
+            for name in names
+        ), return_exceptions=True)
+    finally:
+        if owned_session:
+            session.close()
+
+    snapshots: Dict[str, Optional[Dict[str, Any]]] = {}
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to download taxonomy {name}: {result}")
+            snapshots[name] = None
+        else:
+            snapshots[name] = result
+    return snapshots
+
+
+def fetch_taxonomies(targets: Dict[str, Tuple[str, str]], previous: Optional[Dict[str, Dict[str, str]]] = None,
+                     concurrency: int = DEFAULT_CONCURRENCY, retries: int = DEFAULT_RETRIES,
+                     timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Blocking wrapper around fetch_taxonomies_async."""
+    return asyncio.run(fetch_taxonomies_async(targets, previous, concurrency, retries, timeout))
@@ -0,0 +1,129 @@
+"""
+Taxonomy fetcher against a local stand-in server (stdlib http.server) that
+answers 503, cuts a download off halfway and revalidates with the ETag.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import taxonomy_fetch
+
+
+class StandInTaxonomyHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.body as any taxonomy, with an ETag. Each request takes the next
+    behaviour from server.plan ("unavailable": 503 with Retry-After 0, "truncate":
+    a 200 cut off halfway; "serve" once the plan is used up), honoring Range/If-Range
+    and If-None-Match. The headers of every request are kept in server.requests.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append({name: self.headers.get(name, "") for name in ("Range", "If-Range", "If-None-Match")})
+        behaviour = server.plan.pop(0) if server.plan else "serve"
+        body, etag = server.body, server.etag
+
+        if behaviour == "unavailable":
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range", etag) == etag:
+            offset = int(match.group(1))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {offset}-{len(body) - 1}/{len(body)}")
+        else:
+            offset = 0
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body) - offset))
+        self.end_headers()
+        if behaviour == "truncate":
+            self.wfile.write(body[offset:offset + (len(body) - offset) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(body[offset:])
+
+    def log_message(self, format: str, *args):
+        pass
+
+
+class TaxonomyFetchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A few fetcher chunks, so a download cut off halfway has written part of the body
+        entries = {f"en:e{number}": {"name": {"en": f"Additive {number}"}} for number in range(100, 6100)}
+        cls.body = json.dumps(entries).encode("utf-8")
+        cls.sha256 = hashlib.sha256(cls.body).hexdigest()
+
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInTaxonomyHandler)
+        cls.server.daemon_threads = True
+        cls.server.body, cls.server.etag = cls.body, f'"{cls.sha256[:16]}"'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory(prefix="additives_fetch_")
+        self.addCleanup(workdir.cleanup)
+        self.output_path = os.path.join(workdir.name, "additives.json")
+
+    def fetch(self, plan: List[str], previous: Optional[Dict[str, str]] = None):
+        self.server.plan, self.server.requests = list(plan), []
+        snapshot = taxonomy_fetch.fetch_taxonomies(
+            {"additives": (taxonomy_fetch.taxonomy_url("additives", self.base_url), self.output_path)},
+            {"additives": previous} if previous else None, retries=2, timeout=10,
+        )["additives"]
+        return snapshot, self.server.requests
+
+    def test_unavailable_server_is_retried(self):
+        snapshot, requests_seen = self.fetch(["unavailable"])
+        self.assertTrue(snapshot)
+        self.assertEqual(snapshot["sha256"], self.sha256)
+        self.assertEqual(len(requests_seen), 2)
+
+    def test_truncated_download_is_resumed(self):
+        snapshot, requests_seen = self.fetch(["truncate"])
+        self.assertTrue(snapshot)
+        self.assertTrue(snapshot["resumed"])
+        self.assertEqual(snapshot["sha256"], self.sha256)
+        with open(self.output_path, "rb") as f:
+            self.assertEqual(f.read(), self.body)
+        # Resumed from the bytes written before the cut, not from the start
+        self.assertRegex(requests_seen[-1]["Range"], r"^bytes=[1-9]\d*-$")
+        self.assertEqual(requests_seen[-1]["If-Range"], self.server.etag)
+
+    def test_unchanged_taxonomy_gets_not_modified(self):
+        snapshot, _ = self.fetch([])
+        previous = {field: snapshot[field] for field in ("sha256", "etag", "last_modified")}
+
+        snapshot, requests_seen = self.fetch([], previous)
+        self.assertTrue(snapshot)
+        self.assertTrue(snapshot["unchanged"])
+        self.assertFalse(snapshot["path"])
+        self.assertEqual(requests_seen[-1]["If-None-Match"], self.server.etag)
+
+
+if __name__ == "__main__":
+    unittest.main()